@@ -1,3 +1,99 @@
-from django.test import TestCase
+"""
+Tests for App Settings app - reference data endpoints
+"""
+import pytest
+from django.urls import reverse
 
-# Create your tests here.
+from apps.app_settings.models import ChargeType, PriceGroup
+from conftest import (
+    CurrencyFactory, ExpenseCategoryFactory, PaymentMethodFactory, ProductCategoryFactory, UnitOfMeasureFactory
+)
+
+
+# ============= Query Budgets =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+@pytest.mark.slow
+class TestAppSettingsQueryBudget:
+    """Query counts of the settings endpoints do not grow with the data"""
+
+    def _price_groups(self, n):
+        return PriceGroup.objects.bulk_create([PriceGroup(name=f'Group {index}') for index in range(n)])
+
+    def _charge_types(self, n):
+        return ChargeType.objects.bulk_create([ChargeType(name=f'Charge {index}') for index in range(n)])
+
+    def test_product_category_list(self, query_budget, regular_user):
+        query_budget(
+            reverse('productcategory-list'),
+            lambda n: ProductCategoryFactory.create_batch(n, created_by=regular_user),
+            budget=2,
+        )
+
+    def test_product_category_detail(self, query_budget, regular_user):
+        query_budget(
+            lambda rows: reverse('productcategory-detail', args=[rows[-1].pk]),
+            lambda n: ProductCategoryFactory.create_batch(n, created_by=regular_user),
+            budget=1,
+        )
+
+    def test_expense_category_list(self, query_budget):
+        query_budget(reverse('expensecategory-list'), ExpenseCategoryFactory.create_batch, budget=2)
+
+    def test_expense_category_detail(self, query_budget):
+        query_budget(
+            lambda rows: reverse('expensecategory-detail', args=[rows[-1].pk]),
+            ExpenseCategoryFactory.create_batch,
+            budget=1,
+        )
+
+    def test_unit_of_measure_list(self, query_budget):
+        query_budget(reverse('unitofmeasure-list'), UnitOfMeasureFactory.create_batch, budget=2)
+
+    def test_unit_of_measure_detail(self, query_budget):
+        query_budget(
+            lambda rows: reverse('unitofmeasure-detail', args=[rows[-1].pk]),
+            UnitOfMeasureFactory.create_batch,
+            budget=1,
+        )
+
+    def test_currency_list(self, query_budget):
+        query_budget(reverse('currency-list'), CurrencyFactory.create_batch, budget=2)
+
+    def test_currency_detail(self, query_budget):
+        query_budget(
+            lambda rows: reverse('currency-detail', args=[rows[-1].pk]),
+            CurrencyFactory.create_batch,
+            budget=1,
+        )
+
+    def test_payment_method_list(self, query_budget):
+        query_budget(reverse('paymentmethod-list'), PaymentMethodFactory.create_batch, budget=2)
+
+    def test_payment_method_detail(self, query_budget):
+        query_budget(
+            lambda rows: reverse('paymentmethod-detail', args=[rows[-1].pk]),
+            PaymentMethodFactory.create_batch,
+            budget=1,
+        )
+
+    def test_price_group_list(self, query_budget):
+        query_budget(reverse('pricegroup-list'), self._price_groups, budget=2)
+
+    def test_price_group_detail(self, query_budget):
+        query_budget(
+            lambda rows: reverse('pricegroup-detail', args=[rows[-1].pk]),
+            self._price_groups,
+            budget=1,
+        )
+
+    def test_charge_type_list(self, query_budget):
+        query_budget(reverse('chargetype-list'), self._charge_types, budget=2)
+
+    def test_charge_type_detail(self, query_budget):
+        query_budget(
+            lambda rows: reverse('chargetype-detail', args=[rows[-1].pk]),
+            self._charge_types,
+            budget=1,
+        )
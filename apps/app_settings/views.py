@@ -12,7 +12,7 @@ from .serializers import (
 
 class ProductCategoryViewSet(viewsets.ModelViewSet):
     """API endpoint for product categories"""
-    queryset = ProductCategory.objects.all().order_by('name')
+    queryset = ProductCategory.objects.select_related('created_by').order_by('name')
     serializer_class = ProductCategorySerializer
     permission_classes = [IsAuthenticated]
 
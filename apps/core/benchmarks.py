@@ -0,0 +1,269 @@
+"""
+Benchmarks
+Seeds a synthetic dataset at production volume and times key endpoints in-process
+"""
+
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict, namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.caching import invalidate_tags
+from apps.dashboard.rollups import rebuild_daily_sales
+from apps.inventory.checkpoints import build_checkpoints
+from apps.inventory.models import Product, Stock, StockCard
+from apps.sales.models import Sale, SaleItem
+from apps.treasury.models import Account, AccountStatement
+
+
+# Prefix of every reference written by seed_dataset, so runs never collide with real documents
+BENCH_PREFIX = 'BENCH'
+
+SeedResult = namedtuple('SeedResult', ['counts', 'seconds'])
+
+Scenario = namedtuple('Scenario', ['name', 'method', 'url', 'params'])
+
+
+def seed_dataset(sales=10000, items_per_sale=3, products=500, clients=200, zones=3, days=365,
+                 batch_size=5000, seed=0, progress=None):
+    """
+    Generate a synthetic dataset and return SeedResult(counts, seconds).
+
+    Reference rows (zones, categories, units, clients, products) come from
+    the conftest factories; sales, sale items, stock cards and account
+    statements are built with the factories or plain models and written
+    with bulk_create, `batch_size` sales at a time. Sales spread over the
+    last `days` days with 1 to `items_per_sale` lines, a quarter of them
+    unpaid; every line has its stock card and every payment a statement on
+    a company account. The same `seed` gives the same dataset.
+    """
+    from conftest import (
+        AccountFactory, ClientFactory, CurrencyFactory, ProductCategoryFactory,
+        ProductFactory, SaleFactory, SaleItemFactory, UnitOfMeasureFactory, ZoneFactory
+    )
+    import factory.random
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    factory.random.reseed_random(seed)
+    today = date.today()
+
+    user, _ = User.objects.get_or_create(username=f'{BENCH_PREFIX.lower()}-seed')
+    currency = CurrencyFactory()
+    zone_rows = [ZoneFactory(name=f'{BENCH_PREFIX} Zone {index}') for index in range(zones)]
+    categories = ProductCategoryFactory.create_batch(max(1, products // 50))
+    units = UnitOfMeasureFactory.create_batch(3)
+    client_rows = ClientFactory.create_batch(clients, account__currency=currency)
+    company = AccountFactory(name=f'{BENCH_PREFIX} Caisse', currency=currency, initial_balance=0)
+
+    run = f'{BENCH_PREFIX}-{timezone.now():%y%m%d%H%M%S}'
+    product_rows = Product.objects.bulk_create([
+        ProductFactory.build(
+            reference=f'{run}-P{index:06d}', category=rng.choice(categories), unit=rng.choice(units),
+            selling_price=Decimal(rng.randrange(500, 50000)), purchase_price=Decimal(rng.randrange(300, 30000)),
+        )
+        for index in range(products)
+    ], batch_size=batch_size)
+    opening = Decimal(sales * items_per_sale)
+    StockCard.objects.bulk_create([
+        StockCard(product=product, zone=zone, date=today - timedelta(days=days), transaction_type='inventory',
+                  reference=f'{run}-INIT', quantity_in=opening)
+        for product in product_rows for zone in zone_rows
+    ], batch_size=batch_size)
+
+    counts = {'sales': 0, 'sale_items': 0, 'stock_cards': len(product_rows) * len(zone_rows), 'statements': 0}
+    balance = Decimal('0.00')
+    sold = defaultdict(Decimal)
+    for start in range(0, sales, batch_size):
+        sale_rows, lines = [], []
+        for index in range(start, min(start + batch_size, sales)):
+            sale_lines = [
+                (rng.choice(product_rows), Decimal(rng.randint(1, 10)))
+                for _ in range(rng.randint(1, items_per_sale))
+            ]
+            total = sum((product.selling_price * quantity for product, quantity in sale_lines), Decimal('0.00'))
+            paid = rng.choice([total, total, total / 2, Decimal('0.00')]).quantize(Decimal('0.01'))
+            sale_rows.append(SaleFactory.build(
+                reference=f'{run}-V{index:08d}', client=rng.choice(client_rows), zone=rng.choice(zone_rows),
+                created_by=user, date=today - timedelta(days=rng.randrange(days)), status='completed',
+                payment_status='paid' if paid == total else ('partially_paid' if paid else 'unpaid'),
+                subtotal=total, total_amount=total, paid_amount=paid, remaining_amount=total - paid,
+            ))
+            lines.append(sale_lines)
+
+        with transaction.atomic():
+            Sale.objects.bulk_create(sale_rows)
+            items, cards, statements = [], [], []
+            for sale, sale_lines in zip(sale_rows, lines):
+                for product, quantity in sale_lines:
+                    items.append(SaleItemFactory.build(
+                        sale=sale, product=product, quantity=quantity, unit_price=product.selling_price,
+                        total_price=product.selling_price * quantity,
+                    ))
+                    cards.append(StockCard(
+                        product=product, zone=sale.zone, date=sale.date, transaction_type='sale',
+                        reference=sale.reference, quantity_out=quantity,
+                    ))
+                    sold[(product.pk, sale.zone.pk)] += quantity
+                if sale.paid_amount:
+                    balance += sale.paid_amount
+                    statements.append(AccountStatement(
+                        account=company, date=sale.date, transaction_type='sale', reference=sale.reference,
+                        description=f'Vente {sale.reference}', credit=sale.paid_amount, balance=balance,
+                    ))
+            SaleItem.objects.bulk_create(items, batch_size=batch_size)
+            StockCard.objects.bulk_create(cards, batch_size=batch_size)
+            AccountStatement.objects.bulk_create(statements, batch_size=batch_size)
+
+        counts['sales'] += len(sale_rows)
+        counts['sale_items'] += len(items)
+        counts['stock_cards'] += len(cards)
+        counts['statements'] += len(statements)
+        if progress:
+            progress(counts['sales'], sales)
+
+    # Written last, net of the sales, so every Stock row equals the sum of its cards
+    Stock.objects.bulk_create([
+        Stock(product=product, zone=zone, quantity=opening - sold[(product.pk, zone.pk)])
+        for product in product_rows for zone in zone_rows
+    ], batch_size=batch_size)
+    Account.objects.filter(pk=company.pk).update(current_balance=balance)
+    rebuild_daily_sales()
+    build_checkpoints(rebuild=True)
+    invalidate_tags('sales', 'stock', 'treasury', 'partners')
+    counts.update(products=len(product_rows), clients=len(client_rows), zones=len(zone_rows))
+    return SeedResult(counts, round(time.perf_counter() - started, 1))
+
+
+def default_scenarios():
+    """The endpoints timed by run_benchmarks, resolved against the current data"""
+    account = Account.objects.filter(statements__isnull=False).order_by('-id').first()
+    stock = Stock.objects.filter(quantity__gt=0).select_related('product').order_by('-quantity', '-id')[:3]
+    zone_id = stock[0].zone_id if stock else None
+    lines = [row for row in stock if row.zone_id == zone_id]
+    total = str(sum((row.product.selling_price for row in lines), Decimal('0.00')))
+    sale = {
+        'client': Sale.objects.values_list('client_id', flat=True).order_by('-id').first(),
+        'zone': zone_id,
+        'date': str(date.today()),
+        'status': 'draft',
+        'subtotal': total,
+        'total_amount': total,
+        'items': [
+            {'product': row.product_id, 'quantity': '1.00', 'unit_price': str(row.product.selling_price),
+             'total_price': str(row.product.selling_price)}
+            for row in lines
+        ],
+    }
+    return [
+        Scenario('sale_create', 'post', reverse('sale-list'), sale),
+        Scenario('sale_list', 'get', reverse('sale-list'), {}),
+        Scenario('sale_list_keyset', 'get', reverse('sale-list'), {'cursor': ''}),
+        Scenario('ledger_list', 'get', reverse('accountstatement-list'), {'account': account.pk if account else ''}),
+        Scenario('stock_card_list', 'get', reverse('stock-card-list'), {}),
+        Scenario('stock_as_of', 'get', reverse('stock-as-of'),
+                 {'date': str(date.today() - timedelta(days=45)), 'zone': zone_id or ''}),
+        Scenario('dashboard_summary', 'get', reverse('dashboard-summary'), {'period': 'year'}),
+        Scenario('dashboard_inventory', 'get', reverse('dashboard-inventory'), {}),
+        Scenario('dashboard_aging', 'get', reverse('dashboard-aging'), {}),
+        Scenario('sales_report', 'get', reverse('sales-reports'), {'period': 'year'}),
+    ]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(client, scenario, repeat=5, warmup=1, warm_cache=False):
+    """
+    Time one scenario and return its result dict. Every call runs in a
+    transaction that is rolled back, so write scenarios leave no trace.
+    Unless `warm_cache`, the cache is cleared before each call so cached
+    endpoints are measured doing their work.
+    """
+    timings = []
+    queries = None
+    status_code = None
+    for run in range(warmup + repeat):
+        if not warm_cache:
+            cache.clear()
+        with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            if scenario.method == 'post':
+                response = client.post(scenario.url, scenario.params, format='json')
+            else:
+                response = client.get(scenario.url, scenario.params)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        status_code = response.status_code
+        if run >= warmup:
+            timings.append(elapsed * 1000)
+            queries = len(captured.captured_queries)
+    return {
+        'status': status_code,
+        'queries': queries,
+        'min_ms': round(min(timings), 2),
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(_percentile(timings, 0.95), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(user, scenarios=None, only=None, repeat=5, warmup=1, warm_cache=False):
+    """Run the scenarios as `user` and return a JSON-serialisable report"""
+    client = APIClient()
+    client.force_authenticate(user=user)
+    scenarios = scenarios or default_scenarios()
+    if only:
+        scenarios = [scenario for scenario in scenarios if scenario.name in only]
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': timezone.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'repeat': repeat,
+            'warm_cache': warm_cache,
+            'rows': {
+                'sales': Sale.objects.count(),
+                'stock_cards': StockCard.objects.count(),
+                'statements': AccountStatement.objects.count(),
+            },
+        },
+        'results': {
+            scenario.name: run_scenario(client, scenario, repeat, warmup, warm_cache)
+            for scenario in scenarios
+        },
+    }
+
+
+def compare(previous, current):
+    """Rows of (name, previous median, current median, ratio, previous queries, current queries)"""
+    rows = []
+    for name, result in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if before is None:
+            continue
+        ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else None
+        rows.append((name, before['median_ms'], result['median_ms'], ratio, before['queries'], result['queries']))
+    return rows
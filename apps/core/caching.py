@@ -0,0 +1,147 @@
+"""
+Response caching
+Cache-aside decorator for read endpoints with tag invalidation and hit/miss counters
+"""
+
+import functools
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .middleware import record_cache
+
+
+# Tags bumped whenever a row of these models is saved or deleted
+CACHE_TAGS = {
+    'sales.Sale': ['sales'],
+    'inventory.Stock': ['stock'],
+    'inventory.Product': ['stock'],
+    'inventory.StockSupply': ['supplies'],
+    'treasury.AccountStatement': ['treasury'],
+    'partners.Client': ['partners'],
+    'partners.Supplier': ['partners'],
+}
+
+DEFAULT_TIMEOUT = 60 * 5
+
+# Names of the views wrapped by cached_response, for cache_stats()
+_registry = set()
+
+
+def _tag_key(tag):
+    return f'cache_tag:{tag}'
+
+
+def _stat_key(name, outcome):
+    return f'cache_stats:{name}:{outcome}'
+
+
+def new_version():
+    """
+    A fresh version token. Versions are never counted up: a culled or lost
+    key gets a token no entry was ever stored under, never an older version
+    that would bring stale entries back, and concurrent bumps cannot cancel
+    each other out (FileBasedCache.incr is a read-modify-write).
+    """
+    return uuid.uuid4().hex
+
+
+def get_version(key):
+    """Current version token kept under `key`, created on first use"""
+    return cache.get_or_set(key, new_version, None)
+
+
+def bump_version(key):
+    cache.set(key, new_version(), None)
+
+
+def _count(name, outcome):
+    key = _stat_key(name, outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def invalidate_tags(*tags):
+    """
+    Retire every cached response carrying one of `tags` once the current
+    transaction commits. Bulk writes that bypass model signals (queryset
+    update, bulk_create, bulk_update) must call this themselves.
+    """
+    def bump():
+        for tag in tags:
+            bump_version(_tag_key(tag))
+
+    transaction.on_commit(bump)
+
+
+def _cache_key(name, tags, request, scope):
+    versions = cache.get_many([_tag_key(tag) for tag in tags])
+    for tag in tags:
+        if _tag_key(tag) not in versions:
+            versions[_tag_key(tag)] = get_version(_tag_key(tag))
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(repr((params, [versions[_tag_key(tag)] for tag in tags])).encode()).hexdigest()
+    owner = request.user.pk if scope == 'user' else 'all'
+    return f'cached_response:{name}:{owner}:{digest}'
+
+
+def cached_response(tags, timeout=DEFAULT_TIMEOUT, scope='user'):
+    """
+    Cache-aside for GET views returning a DRF Response.
+
+    The key combines the view, the requesting user (or nothing with
+    scope='global'), the query parameters and the current version of each
+    tag, so bumping a tag retires every entry built from it. Only
+    successful responses are stored. Works on function views (put it under
+    @api_view) and on viewset methods.
+    """
+    def decorator(view):
+        name = f'{view.__module__}.{view.__qualname__}'
+        _registry.add(name)
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = _cache_key(name, tags, request, scope)
+            cached = cache.get(key)
+            record_cache(request._request, cached is not None)
+            if cached is not None:
+                _count(name, 'hits')
+                return Response(cached)
+
+            _count(name, 'misses')
+            response = view(*args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout)
+            return response
+
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """Hits, misses and hit rate per cached view, across all workers"""
+    counters = cache.get_many([
+        _stat_key(name, outcome) for name in _registry for outcome in ('hits', 'misses')
+    ])
+    stats = {}
+    for name in sorted(_registry):
+        hits = counters.get(_stat_key(name, 'hits'), 0)
+        misses = counters.get(_stat_key(name, 'misses'), 0)
+        total = hits + misses
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else None,
+        }
+    return stats
@@ -0,0 +1,67 @@
+"""
+Sparse fieldsets
+?fields= and ?expand= query parameters trimming what a serializer renders
+"""
+
+from rest_framework import serializers
+
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def requested_names(params, name):
+    """Names listed in a comma separated query parameter, or None when it is absent"""
+    if name not in params:
+        return None
+    return {value.strip() for value in params[name].split(',') if value.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin honouring `?fields=` and `?expand=` on GET requests.
+
+    `?fields=id,reference,total_amount` keeps only the listed fields.
+    Expandable fields (nested serializers and SerializerMethodFields, or
+    Meta.expandable_fields when declared) are rendered by default; once
+    `?expand=` is present only those it names are, so a bare `?expand=`
+    drops them all. Dropped fields are never computed, their names are in
+    `omitted_fields`, and QueryProfileMixin skips their prefetches.
+
+    Only the top-level serializer (or the child of a top-level list) is
+    trimmed, and writes always see every field.
+    """
+    omitted_fields = frozenset()
+
+    def get_expandable_fields(self, fields):
+        expandable = getattr(self.Meta, 'expandable_fields', None)
+        if expandable is not None:
+            return set(expandable)
+        return {
+            name for name, field in fields.items()
+            if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField))
+        }
+
+    def _is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not self._is_top_level():
+            return fields
+
+        params = request.query_params
+        selected = requested_names(params, FIELDS_PARAM)
+        expanded = requested_names(params, EXPAND_PARAM)
+        omitted = set()
+        if selected is not None:
+            omitted |= {name for name in fields if name not in selected | (expanded or set())}
+        if expanded is not None:
+            omitted |= self.get_expandable_fields(fields) - expanded
+
+        self.omitted_fields = frozenset(omitted)
+        for name in omitted:
+            fields.pop(name, None)
+        return fields
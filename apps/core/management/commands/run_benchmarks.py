@@ -0,0 +1,55 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarks import compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time key endpoints in-process and write the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="JSON file to write (default: stdout)")
+        parser.add_argument('--compare', help="Previous results file to compare the medians with")
+        parser.add_argument('--only', nargs='+', help="Scenario names to run")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed calls per scenario")
+        parser.add_argument('--warmup', type=int, default=1, help="Untimed calls per scenario")
+        parser.add_argument('--warm-cache', action='store_true', help="Keep the response cache between calls")
+        parser.add_argument('--user', help="Username to run as (default: the first superuser)")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['user']) if options['user'] else \
+            User.objects.filter(is_superuser=True).order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to run the benchmarks as, create a superuser or pass --user")
+
+        report = run_benchmarks(
+            user,
+            only=options['only'],
+            repeat=options['repeat'],
+            warmup=options['warmup'],
+            warm_cache=options['warm_cache'],
+        )
+        content = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(content + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(report['results'])} results to {options['output']}"))
+        else:
+            self.stdout.write(content)
+
+        failed = [name for name, result in report['results'].items() if result['status'] >= 400]
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Scenarios answering with an error: {', '.join(failed)}"))
+
+        if options['compare']:
+            with open(options['compare']) as previous:
+                rows = compare(json.load(previous), report)
+            for name, before, after, ratio, queries_before, queries_after in rows:
+                change = f"x{ratio:.2f}" if ratio is not None else "n/a"
+                self.stdout.write(
+                    f"{name:<22} {before:>10.2f}ms -> {after:>10.2f}ms  {change:>7}  "
+                    f"queries {queries_before} -> {queries_after}"
+                )
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarks import seed_dataset
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic dataset (sales, stock cards, statements) for run_benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=10000, help="Sales to generate")
+        parser.add_argument('--items-per-sale', type=int, default=3, help="Maximum lines per sale")
+        parser.add_argument('--products', type=int, default=500, help="Products to generate")
+        parser.add_argument('--clients', type=int, default=200, help="Clients to generate")
+        parser.add_argument('--zones', type=int, default=3, help="Zones to generate")
+        parser.add_argument('--days', type=int, default=365, help="Days of history the sales spread over")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Sales written per transaction")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, the same seed gives the same data")
+        parser.add_argument('--force', action='store_true', help="Allow seeding when DEBUG is off")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG is off: this writes thousands of fake documents, pass --force if intended")
+
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total} sales written")
+
+        result = seed_dataset(
+            sales=options['sales'],
+            items_per_sale=options['items_per_sale'],
+            products=options['products'],
+            clients=options['clients'],
+            zones=options['zones'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            progress=progress,
+        )
+        summary = ', '.join(f"{count} {name}" for name, count in sorted(result.counts.items()))
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {result.seconds}s"))
@@ -0,0 +1,109 @@
+"""
+Request metrics
+Middleware reporting per-request SQL, cache and view timings as Server-Timing headers and log lines
+"""
+
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger('apps.core.requests')
+
+
+class RequestMetrics:
+    """Counters for one sampled request, reachable as request.metrics"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.view_started = None
+        self.view_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+
+    def record_cache(self, hit):
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+
+def record_cache(request, hit):
+    """Count a cache hit or miss on the request's metrics, when it is sampled"""
+    metrics = getattr(request, 'metrics', None)
+    if metrics is not None:
+        metrics.record_cache(hit)
+
+
+class RequestMetricsMiddleware:
+    """
+    Time a sample of requests and report query count, SQL time, cache hits
+    and view time, as a Server-Timing header (visible in the browser's
+    network panel) and as one JSON log line on 'apps.core.requests'.
+
+    REQUEST_METRICS_SAMPLE_RATE is the share of requests measured (0 to 1).
+    With REQUEST_METRICS_ENABLED off the middleware removes itself at
+    startup; unsampled requests cost one random() call.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        request.metrics = metrics = RequestMetrics()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        total = finished - started
+        if metrics.view_started is not None:
+            metrics.view_time = finished - metrics.view_started
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+            f'view;dur={metrics.view_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user': getattr(getattr(request, 'user', None), 'pk', None),
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'view_ms': round(metrics.view_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+        return None
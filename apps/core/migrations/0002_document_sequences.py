@@ -0,0 +1,69 @@
+import re
+
+from django.db import migrations
+
+
+# (table, code, yearly) of the documents numbered by apps.core.sequences
+NUMBERED_DOCUMENTS = [
+    ('gestion_api_sale', 'VNT', True),
+    ('gestion_api_quote', 'DEV', True),
+    ('gestion_api_expense', 'DEP', True),
+    ('gestion_api_accounttransfer', 'VIR', True),
+    ('gestion_api_cashreceipt', 'ENC', True),
+    ('gestion_api_product', 'PROD', False),
+]
+
+
+def sequence_name(prefix):
+    # Frozen copy of apps.core.sequences.sequence_name() at the time of this migration
+    return 'docseq_' + re.sub(r'[^a-z0-9]+', '_', prefix.lower()).strip('_')
+
+
+def create_sequences(apps, schema_editor):
+    """
+    Create a sequence for every reference prefix in use, starting after its
+    highest number. A table not created yet holds no reference: its
+    sequences are created on first use.
+    """
+    connection = schema_editor.connection
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+    for table, code, yearly in NUMBERED_DOCUMENTS:
+        if table not in tables:
+            continue
+        pattern = f"^{code}-{'[0-9]{4}-' if yearly else ''}[0-9]+$"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT substring(reference from '^(.*-)[0-9]+$'), max(substring(reference from '([0-9]+)$')::bigint) "
+                f"FROM {quote_name(table)} WHERE reference ~ %s GROUP BY 1",
+                [pattern],
+            )
+            prefixes = cursor.fetchall()
+        for prefix, last_value in prefixes:
+            schema_editor.execute(
+                f"CREATE SEQUENCE IF NOT EXISTS {quote_name(sequence_name(prefix))} START WITH {int(last_value) + 1}"
+            )
+
+
+def drop_sequences(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'S' AND relname LIKE %s AND pg_table_is_visible(oid)",
+            ['docseq\\_%'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    for name in names:
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {connection.ops.quote_name(name)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequences, drop_sequences),
+    ]
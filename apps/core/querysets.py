@@ -0,0 +1,58 @@
+"""
+Query profiles
+Declarative per-action select_related / prefetch_related for model viewsets
+"""
+
+from collections import namedtuple
+
+from django.db.models import Prefetch
+
+
+QueryProfile = namedtuple('QueryProfile', ['select_related', 'prefetch_related'], defaults=((), ()))
+
+
+class QueryProfileMixin:
+    """
+    Viewset mixin loading, for each action, the relations its serializer
+    walks and nothing else.
+
+    `query_profiles` maps an action name ('list', 'retrieve', 'destroy', a
+    custom @action...) to a QueryProfile; actions without an entry use the
+    'default' one. The profile is applied on top of `queryset`, which should
+    therefore only carry ordering and filters. Each profile is pinned by the
+    query budget tests of its app.
+
+    Prefetches feeding a field the serializer leaves out (see
+    fieldsets.SparseFieldsMixin) are skipped.
+    """
+    query_profiles = {}
+
+    def get_query_profile(self):
+        return self.query_profiles.get(self.action, self.query_profiles.get('default', QueryProfile()))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        profile = self.get_query_profile()
+        if profile.select_related:
+            queryset = queryset.select_related(*profile.select_related)
+        prefetches = profile.prefetch_related
+        if prefetches:
+            omitted = self.get_omitted_fields()
+            prefetches = [lookup for lookup in prefetches if _lookup_root(lookup) not in omitted]
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+    def get_omitted_fields(self):
+        """Serializer fields the request's ?fields= / ?expand= leave out"""
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET':
+            return frozenset()
+        serializer = self.get_serializer()
+        serializer.fields  # the fields are trimmed while they are built
+        return getattr(serializer, 'omitted_fields', frozenset())
+
+
+def _lookup_root(lookup):
+    path = lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+    return path.split('__')[0]
@@ -0,0 +1,115 @@
+"""
+Reference data cache
+Keeps the small lookup tables (app_settings models and Zone) in process memory
+"""
+
+import threading
+import time
+
+from django.apps import apps
+from django.db import transaction
+
+from .caching import bump_version, get_version
+
+
+REFERENCE_MODELS = [
+    'app_settings.ProductCategory',
+    'app_settings.ExpenseCategory',
+    'app_settings.UnitOfMeasure',
+    'app_settings.Currency',
+    'app_settings.PaymentMethod',
+    'app_settings.PriceGroup',
+    'app_settings.ChargeType',
+    'core.Zone',
+]
+
+# Seconds a process trusts its copy of a table before re-reading the shared version
+VERSION_CHECK_INTERVAL = 5
+
+_tables = {}   # label -> (version, {pk: instance})
+_checked = {}  # label -> time.monotonic() of the last version check
+_lock = threading.Lock()
+
+
+def _label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+def _version_key(label):
+    return f'reference_data_version:{label}'
+
+
+def _load(label, version):
+    with _lock:
+        rows = {obj.pk: obj for obj in apps.get_model(label).objects.all()}
+        _tables[label] = (version, rows)
+        _checked[label] = time.monotonic()
+    return rows
+
+
+def get_table(model):
+    """
+    Return {pk: instance} for a reference model.
+
+    The whole table is loaded once per process. Every VERSION_CHECK_INTERVAL
+    seconds the process compares its copy with the version kept in the shared
+    cache, which signals bump whenever a row is saved or deleted anywhere.
+    Instances are shared between callers and must be treated as read-only.
+    """
+    label = _label(model)
+    entry = _tables.get(label)
+    if entry is not None and time.monotonic() - _checked.get(label, 0) < VERSION_CHECK_INTERVAL:
+        return entry[1]
+
+    version = get_version(_version_key(label))
+    if entry is not None and entry[0] == version:
+        _checked[label] = time.monotonic()
+        return entry[1]
+    return _load(label, version)
+
+
+def get_reference(model, pk):
+    """Return the cached instance with this primary key, or None"""
+    if pk is None:
+        return None
+    rows = get_table(model)
+    if pk not in rows:
+        # Possibly created by another process since our last load
+        label = _label(model)
+        rows = _load(label, get_version(_version_key(label)))
+    return rows.get(pk)
+
+
+def reference_name(model, pk, default=None):
+    """Return the name of a cached reference row"""
+    obj = get_reference(model, pk)
+    return obj.name if obj else default
+
+
+def unit_symbol(product):
+    """Return the unit symbol of a product without querying UnitOfMeasure"""
+    if product is None:
+        return ""
+    unit = get_reference('app_settings.UnitOfMeasure', product.unit_id)
+    return unit.symbol if unit else ""
+
+
+def invalidate(model):
+    """
+    Drop this process's copy of a table now, and retire every other
+    process's copy once the current transaction commits.
+    """
+    label = _label(model)
+    _tables.pop(label, None)
+
+    def bump():
+        _tables.pop(label, None)
+        bump_version(_version_key(label))
+
+    transaction.on_commit(bump)
+
+
+def clear():
+    """Forget every cached table in this process"""
+    _tables.clear()
+    _checked.clear()
@@ -0,0 +1,109 @@
+"""
+Document reference allocation
+Hands out VNT/DEV/DEP/VIR/ENC numbers from a Postgres sequence per prefix
+"""
+
+import re
+
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+
+# unique_violation, duplicate_table, duplicate_object: the sequence was created concurrently
+ALREADY_EXISTS_CODES = ('23505', '42P07', '42710')
+
+
+def reference_prefix(code, yearly=True):
+    """Return the reference stem for a document code, e.g. 'VNT-2025-'"""
+    if yearly:
+        return f"{code}-{timezone.now().year}-"
+    return f"{code}-"
+
+
+def sequence_name(prefix):
+    """Name of the Postgres sequence numbering `prefix`, e.g. 'docseq_vnt_2025'"""
+    return 'docseq_' + re.sub(r'[^a-z0-9]+', '_', prefix.lower()).strip('_')
+
+
+def next_reference(model, code, width=3, yearly=True, field='reference'):
+    """Allocate a single reference for a new `model` instance"""
+    return reserve_references(model, code, 1, width=width, yearly=yearly, field=field)[0]
+
+
+def reserve_references(model, code, count, width=3, yearly=True, field='reference'):
+    """
+    Reserve `count` references with one nextval() round trip.
+
+    nextval() is not transactional: it takes no lock that outlives the call,
+    so concurrent checkouts never wait on each other, whatever transaction
+    they run in. The price is that numbers taken by a transaction that rolls
+    back are skipped, and a block is only consecutive when no other writer
+    draws from the same prefix at the same moment.
+
+    The first allocation under a new prefix creates its sequence, seeded
+    after the highest number already in the table.
+    """
+    prefix = reference_prefix(code, yearly)
+    name = sequence_name(prefix)
+    numbers = _nextval(name, count)
+    if numbers[0] is None:
+        _create_sequence(name, _last_used_number(model, field, prefix) + 1)
+        numbers = _nextval(name, count)
+        if numbers[0] is None:
+            raise DatabaseError(f"Reference sequence {name} for {prefix!r} does not exist and could not be created")
+    return [f"{prefix}{number:0{width}d}" for number in sorted(numbers)]
+
+
+def save_with_reference(instance, code, save, *args, width=3, yearly=True, field='reference', **kwargs):
+    """
+    Number `instance` and save it through `save` (the model's parent save).
+
+    A reference typed in by hand is unknown to the sequence, which hands the
+    same number out once it gets there: the insert therefore runs in a
+    savepoint and, when it collides on the reference, is retried with the
+    next number.
+    """
+    model = type(instance)
+    while True:
+        reference = next_reference(model, code, width=width, yearly=yearly, field=field)
+        setattr(instance, field, reference)
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            if not model._default_manager.filter(**{field: reference}).exists():
+                raise
+
+
+def _nextval(name, count):
+    # to_regclass() is NULL, and so is nextval(), until the sequence exists
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(to_regclass(%s)) FROM generate_series(1, %s)", [name, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _create_sequence(name, start):
+    """
+    Create a sequence in a savepoint. A concurrent creator waits for the
+    creating transaction to end, then fails here on the catalog's unique
+    index and uses its sequence. Any other failure is raised.
+    """
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE SEQUENCE IF NOT EXISTS {connection.ops.quote_name(name)} START WITH {int(start)}"
+            )
+    except DatabaseError as exc:
+        if getattr(exc.__cause__, 'pgcode', None) not in ALREADY_EXISTS_CODES:
+            raise
+
+
+def _last_used_number(model, field, prefix):
+    """Highest number already used under `prefix`, used to seed a new sequence"""
+    return model.objects.filter(
+        **{f'{field}__regex': rf'^{re.escape(prefix)}[0-9]+$'}
+    ).annotate(
+        number=Cast(Substr(field, len(prefix) + 1), BigIntegerField())
+    ).aggregate(last=Max('number'))['last'] or 0
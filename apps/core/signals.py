@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.db import IntegrityError
 from .models import UserProfile
+from . import caching, reference_data
 
 
 @receiver(post_save, sender=User)
@@ -36,3 +38,28 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
         print(f"⚠️  Profile already exists for {instance.username}, skipping creation")
     except Exception as e:
         print(f"❌ Error in create_or_update_user_profile signal: {e}")
+
+
+def invalidate_reference_data(sender, **kwargs):
+    """
+    Invalidate the cached copy of a reference table (units, categories,
+    currencies, zones...) when one of its rows is saved or deleted
+    """
+    reference_data.invalidate(sender)
+
+
+for label in reference_data.REFERENCE_MODELS:
+    model = apps.get_model(label)
+    post_save.connect(invalidate_reference_data, sender=model, dispatch_uid=f'reference_data_save_{label}')
+    post_delete.connect(invalidate_reference_data, sender=model, dispatch_uid=f'reference_data_delete_{label}')
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    """Retire the cached responses tagged with this model (see caching.CACHE_TAGS)"""
+    caching.invalidate_tags(*caching.CACHE_TAGS[sender._meta.label])
+
+
+for label in caching.CACHE_TAGS:
+    model = apps.get_model(label)
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'cache_tags_save_{label}')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'cache_tags_delete_{label}')
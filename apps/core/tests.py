@@ -1,15 +1,43 @@
 """
 Tests for Core app - UserProfile, Zone, Authentication
 """
+import csv
+import inspect
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from importlib import import_module
+
 import pytest
-from django.contrib.auth.models import User, Permission
+from io import StringIO
+from django.apps import apps as django_apps
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Sum
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from decimal import Decimal
 
+from apps.core import caching, middleware, reference_data
+from apps.core.benchmarks import seed_dataset
 from apps.core.models import UserProfile, Zone
-from conftest import UserFactory, ZoneFactory
+from apps.core.pagination import KeysetPagination
+from apps.core.sequences import next_reference, reference_prefix, reserve_references, sequence_name
+from apps.inventory.models import Stock, StockCard, StockSupply
+from apps.inventory.movements import StockMovement, apply_movements
+from apps.dashboard.models import DailySalesRollup
+from apps.sales.models import Quote, Sale, SaleItem
+from apps.sales.views import SaleViewSet
+from apps.treasury.ledger import LedgerEntry, post_entries
+from apps.treasury.models import AccountStatement, CashReceipt
+from conftest import ClientFactory, SaleFactory, StockFactory, SupplierFactory, UserFactory, ZoneFactory
 
 
 # ============= Model Tests =============
@@ -290,3 +318,763 @@ class TestUserProfileIntegration:
         
         assert profile1.zone == profile2.zone
         assert zone.core_users.count() == 2
+
+
+# ============= Document Sequence Tests =============
+
+def _create_quote(client):
+    return Quote.objects.create(
+        client=client,
+        date=date.today(),
+        expiry_date=date.today() + timedelta(days=30),
+        subtotal=Decimal('100.00'),
+        total_amount=Decimal('100.00')
+    )
+
+
+@pytest.mark.django_db
+class TestDocumentSequence:
+    """Test the shared document reference allocator"""
+
+    def test_consecutive_references(self, db):
+        """Test references are handed out consecutively from one counter row"""
+        first = next_reference(Quote, 'DEV')
+        second = next_reference(Quote, 'DEV')
+        prefix = reference_prefix('DEV')
+
+        assert first == f"{prefix}001"
+        assert second == f"{prefix}002"
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT last_value FROM {sequence_name(prefix)}")
+            assert cursor.fetchone()[0] == 2
+
+    def test_counter_seeded_from_existing_references(self, db):
+        """Test a new counter row continues after references already in the table"""
+        client = ClientFactory()
+        prefix = reference_prefix('DEV')
+        Quote.objects.create(
+            reference=f"{prefix}041",
+            client=client,
+            date=date.today(),
+            expiry_date=date.today(),
+            subtotal=Decimal('1.00'),
+            total_amount=Decimal('1.00')
+        )
+
+        assert _create_quote(client).reference == f"{prefix}042"
+
+    def test_reserve_block(self, db):
+        """Test reserving a block for bulk inserts"""
+        block = reserve_references(Quote, 'DEV', 5)
+        following = next_reference(Quote, 'DEV')
+
+        assert len(set(block)) == 5
+        assert block[-1].endswith('005')
+        assert following.endswith('006')
+
+    def test_allocation_query_count(self, db, django_assert_num_queries):
+        """Test steady-state allocation is a single nextval()"""
+        next_reference(Quote, 'DEV')
+        with django_assert_num_queries(1):
+            next_reference(Quote, 'DEV')
+
+    def test_explicit_reference_is_skipped(self, db):
+        """Test a number typed in by hand is skipped instead of failing the insert"""
+        client = ClientFactory()
+        prefix = reference_prefix('DEV')
+        assert _create_quote(client).reference == f"{prefix}001"
+        Quote.objects.create(
+            reference=f"{prefix}002",
+            client=client,
+            date=date.today(),
+            expiry_date=date.today(),
+            subtotal=Decimal('1.00'),
+            total_amount=Decimal('1.00')
+        )
+
+        assert _create_quote(client).reference == f"{prefix}003"
+
+    def test_sequence_creation_failure_is_raised(self, db):
+        """Test a sequence the user may not create is an error, not a skipped race"""
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE ROLE docseq_reader NOLOGIN")
+            cursor.execute("REVOKE CREATE ON SCHEMA public FROM docseq_reader, PUBLIC")
+            cursor.execute(f"GRANT SELECT ON {Quote._meta.db_table} TO docseq_reader")
+            cursor.execute("SET LOCAL ROLE docseq_reader")
+
+        with pytest.raises(DatabaseError, match='permission denied'):
+            next_reference(Quote, 'DEV')
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.slow
+class TestDocumentSequenceBenchmark:
+    """Concurrent quote inserts competing for references"""
+
+    WORKERS = 8
+    INSERTS_PER_WORKER = 10
+    # Time each checkout keeps its transaction open after taking its reference
+    HOLD = 0.02
+
+    @pytest.fixture(autouse=True)
+    def drop_sequence(self):
+        # The sequence is committed here, unlike in rolled-back tests
+        yield
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence_name(reference_prefix('DEV'))}")
+
+    def test_concurrent_inserts_get_unique_references(self):
+        """Test writers inside open transactions neither collide nor wait on each other"""
+        client = ClientFactory()
+        next_reference(Quote, 'DEV')  # create the sequence outside the measurement
+
+        def worker(_):
+            try:
+                references = []
+                for _ in range(self.INSERTS_PER_WORKER):
+                    with transaction.atomic():
+                        references.append(_create_quote(client).reference)
+                        time.sleep(self.HOLD)
+                return references
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            references = [ref for batch in pool.map(worker, range(self.WORKERS)) for ref in batch]
+        elapsed = time.perf_counter() - started
+
+        total = self.WORKERS * self.INSERTS_PER_WORKER
+        print(f"\n{total} inserts across {self.WORKERS} workers: "
+              f"{elapsed * 1000:.0f} ms ({total / elapsed:.0f} inserts/s)")
+        assert len(set(references)) == total
+        # Serialized on a lock held to commit, this would take total * HOLD
+        assert elapsed < total * self.HOLD / 2
+
+
+# ============= Reference Data Cache Tests =============
+
+@pytest.mark.django_db
+class TestReferenceData:
+    """Test the in-process cache of units, categories, zones..."""
+
+    def test_lookups_are_served_from_memory(self, product, django_assert_num_queries):
+        """Test the unit table is read once, then lookups cost nothing"""
+        assert reference_data.unit_symbol(product) == product.unit.symbol
+        with django_assert_num_queries(0):
+            for _ in range(10):
+                reference_data.unit_symbol(product)
+
+    def test_str_of_stock_lines_does_not_query_units(self, zone, django_assert_num_queries):
+        """Test __str__ of stock rows no longer looks the unit up per row"""
+        stocks = list(Stock.objects.select_related('product').filter(
+            pk__in=[StockFactory(zone=zone).pk for _ in range(5)]
+        ))
+        str(stocks[0])
+        with django_assert_num_queries(0):
+            labels = [str(stock) for stock in stocks]
+        assert all(zone.name in label for label in labels)
+
+    def test_saving_a_row_invalidates_the_table(self, product, django_capture_on_commit_callbacks):
+        """Test a renamed unit is seen locally at once and by other processes after commit"""
+        reference_data.unit_symbol(product)
+        unit = product.unit
+        unit.symbol = 'kg'
+        with django_capture_on_commit_callbacks(execute=True):
+            unit.save()
+        assert reference_data.unit_symbol(product) == 'kg'
+
+        # Another process holding an old copy notices the new shared version
+        label = 'app_settings.UnitOfMeasure'
+        stale = {unit.pk: type(unit)(pk=unit.pk, name=unit.name, symbol='old')}
+        reference_data._tables[label] = (-1, stale)
+        reference_data._checked[label] = 0
+        assert reference_data.unit_symbol(product) == 'kg'
+
+    def test_rows_created_elsewhere_are_found(self, zone):
+        """Test a primary key missing from the cached copy triggers a reload"""
+        reference_data.get_table(Zone)
+        # bulk_create sends no signals, like a row added by another process
+        other, = Zone.objects.bulk_create([Zone(name="Other Zone")])
+        assert reference_data.reference_name(Zone, other.pk) == "Other Zone"
+
+
+# ============= Keyset Pagination Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestKeysetPagination:
+    """Test the opt-in ?cursor= mode of the ledger viewsets"""
+
+    def _walk(self, client, url):
+        ids = []
+        while url:
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_cursor_walks_every_row_once(self, authenticated_client, zone):
+        """Test pages follow (-date, -id) without gaps or repeats across equal dates"""
+        today = date.today()
+        sales = [SaleFactory(zone=zone, date=today - timedelta(days=i % 3)) for i in range(7)]
+        expected = [s.pk for s in sorted(sales, key=lambda s: (s.date, s.pk), reverse=True)]
+
+        ids = self._walk(authenticated_client, reverse('sale-list') + '?cursor=&page_size=3')
+        assert ids == expected
+
+    def test_offset_mode_is_unchanged(self, authenticated_client, zone):
+        """Test requests without a cursor keep the count/next/previous page format"""
+        SaleFactory.create_batch(3, zone=zone)
+        response = authenticated_client.get(reverse('sale-list'))
+        assert response.data['count'] == 3
+        assert len(response.data['results']) == 3
+
+    def test_page_cost_does_not_depend_on_depth(self, authenticated_client, zone):
+        """Test a deep page is a single range read without COUNT or OFFSET"""
+        sales = SaleFactory.create_batch(30, zone=zone)
+        cursor = KeysetPagination().encode_cursor(sales[5].date, sales[5].pk)
+        url = reverse('sale-list') + f'?cursor={cursor}&page_size=5'
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = authenticated_client.get(url)
+        assert [row['id'] for row in response.data['results']] == [s.pk for s in sales[4::-1]]
+        assert response.data['next'] is None
+        page_queries = [q['sql'] for q in ctx.captured_queries if 'gestion_api_sale' in q['sql']]
+        assert not any('COUNT(' in sql or 'OFFSET' in sql for sql in page_queries)
+
+    def test_cursor_seeks_the_date_id_index(self, zone):
+        """Test the cursor is an index range start, not a filter over the ties on its date"""
+        last = SaleFactory.create_batch(5, zone=zone)[-1]
+        request = Request(APIRequestFactory().get('/', {'cursor': KeysetPagination().encode_cursor(last.date, last.pk)}))
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            KeysetPagination().paginate_queryset(Sale.objects.all(), request)
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + statements[0][0], statements[0][1])
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        assert 'sale_date_id_idx' in plan
+        assert 'Index Cond: (ROW(date, id) < ROW(' in plan, plan
+
+    def test_invalid_cursor(self, authenticated_client):
+        """Test a malformed cursor is a 404"""
+        response = authenticated_client.get(reverse('stock-card-list') + '?cursor=not-a-cursor')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# ============= Sparse Fieldset Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestSparseFieldsets:
+    """Test ?fields= and ?expand= on list and detail endpoints"""
+
+    def _get(self, client, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url, params)
+        assert response.status_code == status.HTTP_200_OK
+        return response.data, [q['sql'] for q in ctx.captured_queries]
+
+    def test_fields_selects_columns(self, authenticated_client, sale_with_items):
+        """Test ?fields= keeps only the listed fields and skips the items prefetch"""
+        data, queries = self._get(authenticated_client, reverse('sale-list'), {'fields': 'id,reference,total_amount'})
+        assert set(data['results'][0]) == {'id', 'reference', 'total_amount'}
+        assert not any('gestion_api_saleitem' in sql for sql in queries)
+
+    def test_expand_drops_unrequested_nested_fields(self, authenticated_client, sale_with_items):
+        """Test a bare ?expand= drops nested serializers but keeps plain fields"""
+        data, queries = self._get(authenticated_client, reverse('sale-detail', args=[sale_with_items.pk]), {'expand': ''})
+        assert 'items' not in data
+        assert data['reference'] == sale_with_items.reference
+        assert not any('gestion_api_saleitem' in sql for sql in queries)
+
+        data, _ = self._get(
+            authenticated_client, reverse('sale-detail', args=[sale_with_items.pk]),
+            {'fields': 'reference', 'expand': 'items'}
+        )
+        assert set(data) == {'reference', 'items'}
+        assert set(data['items'][0]) >= {'product', 'product_name', 'quantity'}
+
+    def test_default_response_is_unchanged(self, authenticated_client, sale_with_items):
+        """Test requests without the parameters render every field"""
+        data, _ = self._get(authenticated_client, reverse('sale-detail', args=[sale_with_items.pk]), {})
+        assert {'items', 'client', 'notes', 'created_by'} <= set(data)
+
+    def test_method_fields_are_not_computed(self, authenticated_client, account):
+        """Test leaving out sale_details skips the cash receipt lookup"""
+        post_entries([LedgerEntry(account=account, transaction_type='sale', reference='VNT-1', credit=Decimal('5'))])
+        data, queries = self._get(
+            authenticated_client, reverse('accountstatement-list'), {'account': account.pk, 'fields': 'id,balance'}
+        )
+        assert set(data['results'][0]) == {'id', 'balance'}
+        assert not any('gestion_api_cashreceipt' in sql for sql in queries)
+
+    def test_writes_ignore_fields(self, authenticated_client, account):
+        """Test ?fields= does not trim what a POST validates"""
+        url = reverse('client-list') + '?fields=id'
+        data = {
+            'name': 'Sparse', 'contact_person': 'Jane', 'phone': '600000000',
+            'email': 'sparse@example.com', 'address': 'Rue 1', 'account': account.id,
+        }
+        response = authenticated_client.post(url, data, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['name'] == 'Sparse'
+
+
+# ============= Streaming Export Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestStreamingExport:
+    """Test the export/ action of the ledger viewsets"""
+
+    def _content(self, response):
+        assert response.status_code == status.HTTP_200_OK
+        return b''.join(response.streaming_content).decode()
+
+    def test_sales_csv_uses_list_filters(self, authenticated_client, zone):
+        """Test the CSV export honours the date and zone filters"""
+        today = date.today()
+        kept = SaleFactory(zone=zone, date=today)
+        SaleFactory(zone=zone, date=today - timedelta(days=10))
+        SaleFactory(zone=ZoneFactory(), date=today)
+
+        response = authenticated_client.get(reverse('sale-export'), {
+            'zone': zone.id, 'date_after': (today - timedelta(days=1)).isoformat(),
+        })
+        assert response['Content-Type'].startswith('text/csv')
+        assert 'sale.csv' in response['Content-Disposition']
+        rows = list(csv.DictReader(self._content(response).splitlines()))
+        assert [row['reference'] for row in rows] == [kept.reference]
+        assert rows[0]['zone__name'] == zone.name
+
+    def test_detail_ignores_list_filters(self, authenticated_client, zone):
+        """Test a list filter on a detail URL does not 404 the row it names"""
+        sale = SaleFactory(zone=zone)
+        response = authenticated_client.get(
+            reverse('sale-detail', kwargs={'pk': sale.pk}), {'zone': ZoneFactory().id}
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_statements_ndjson(self, authenticated_client, account):
+        """Test the NDJSON export filters on account and keeps decimals exact"""
+        AccountStatement.objects.create(
+            account=account, date=date.today(), transaction_type='deposit',
+            reference='DEP-001', credit=Decimal('10.50'), balance=Decimal('10.50')
+        )
+        response = authenticated_client.get(
+            reverse('accountstatement-export'), {'account': account.id, 'format': 'ndjson'}
+        )
+        assert response['Content-Type'].startswith('application/x-ndjson')
+        rows = [json.loads(line) for line in self._content(response).splitlines()]
+        assert len(rows) == 1
+        assert rows[0]['reference'] == 'DEP-001'
+        assert rows[0]['credit'] == '10.50'
+
+    def test_stock_card_export_reads_rows_in_one_query(self, authenticated_client, product, zone):
+        """Test exporting many stock cards does not issue a query per row"""
+        StockCard.objects.bulk_create([
+            StockCard(product=product, zone=zone, date=date.today(), transaction_type='supply',
+                      reference=f'SUP-{i}', quantity_in=Decimal('1'))
+            for i in range(50)
+        ])
+        response = authenticated_client.get(reverse('stock-card-export'))
+        with CaptureQueriesContext(connection) as ctx:
+            content = self._content(response)
+        assert len(content.splitlines()) == 51
+        assert len(ctx.captured_queries) == 1
+
+
+# ============= Response Cache Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestCachedResponse:
+    """Test the cache-aside decorator, its tags and counters"""
+
+    def _stats(self, name):
+        return caching.cache_stats()[f'apps.dashboard.views.{name}']
+
+    def test_second_call_is_served_from_cache(self, authenticated_client, zone,
+                                              django_assert_num_queries):
+        """Test a repeated request is a hit and runs no query"""
+        SaleFactory(zone=zone)
+        url = reverse('dashboard-revenue-trend')
+        first = authenticated_client.get(url, {'period': 'month'})
+
+        with django_assert_num_queries(0):
+            second = authenticated_client.get(url, {'period': 'month'})
+        assert second.data == first.data
+        assert self._stats('revenue_trend') == {'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+        # Other parameters are another entry
+        authenticated_client.get(url, {'period': 'week'})
+        assert self._stats('revenue_trend')['misses'] == 2
+
+    def test_model_writes_retire_tagged_entries(self, authenticated_client, zone,
+                                                django_capture_on_commit_callbacks):
+        """Test saving a Sale bumps the 'sales' tag after commit"""
+        url = reverse('dashboard-stats')
+        assert authenticated_client.get(url).data['total_sales'] == 0
+
+        with django_capture_on_commit_callbacks(execute=True):
+            SaleFactory(zone=zone)
+        assert authenticated_client.get(url).data['total_sales'] == 1
+
+    def test_lost_tag_version_does_not_revive_old_entries(self, authenticated_client, zone,
+                                                          django_capture_on_commit_callbacks):
+        """Test a culled tag version never falls back to a version older entries were stored under"""
+        url = reverse('dashboard-stats')
+        assert authenticated_client.get(url).data['total_sales'] == 0
+        with django_capture_on_commit_callbacks(execute=True):
+            SaleFactory(zone=zone)
+
+        cache.delete(caching._tag_key('sales'))
+        assert authenticated_client.get(url).data['total_sales'] == 1
+
+    def test_bulk_stock_movements_retire_stock_entries(self, authenticated_client, product, zone,
+                                                       django_capture_on_commit_callbacks):
+        """Test apply_movements, which sends no signals, still bumps the 'stock' tag"""
+        url = reverse('dashboard-inventory')
+        assert authenticated_client.get(url).data['total_stock'] == 0
+
+        with django_capture_on_commit_callbacks(execute=True):
+            apply_movements([StockMovement(product, zone, Decimal('5'), 'supply', 'SUP-1')])
+        assert authenticated_client.get(url).data['total_stock'] == 1
+
+    def test_entries_are_per_user(self, api_client, regular_user, admin_user):
+        """Test another user does not get the first user's entry"""
+        url = reverse('dashboard-inventory')
+        for user in (regular_user, admin_user):
+            api_client.force_authenticate(user=user)
+            api_client.get(url)
+        assert self._stats('inventory_stats')['misses'] == 2
+
+    def test_stats_endpoint_is_admin_only(self, api_client, regular_user, admin_user):
+        """Test the counters are exposed to administrators"""
+        api_client.force_authenticate(user=regular_user)
+        assert api_client.get(reverse('cache-stats')).status_code == status.HTTP_403_FORBIDDEN
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get(reverse('cache-stats'))
+        assert response.status_code == status.HTTP_200_OK
+        assert 'apps.dashboard.views.dashboard_stats' in response.data
+
+
+# ============= Request Metrics Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestRequestMetrics:
+    """Test the Server-Timing / structured log middleware"""
+
+    def _client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def test_server_timing_and_log_line(self, settings, regular_user, zone, caplog, monkeypatch):
+        """A sampled request reports its queries, cache use and timings"""
+        settings.REQUEST_METRICS_ENABLED = True
+        monkeypatch.setattr(middleware.logger, 'propagate', True)
+        client = self._client(regular_user)
+
+        with caplog.at_level('INFO', logger='apps.core.requests'):
+            client.get(reverse('dashboard-pending-payments'))
+            response = client.get(reverse('dashboard-pending-payments'))
+
+        assert response.status_code == status.HTTP_200_OK
+        timing = response['Server-Timing']
+        assert 'db;dur=' in timing and 'view;dur=' in timing and 'total;dur=' in timing
+        assert 'cache;desc="1 hits, 0 misses"' in timing
+
+        first, second = [json.loads(record.getMessage()) for record in caplog.records]
+        assert first['path'] == reverse('dashboard-pending-payments')
+        assert first['status'] == 200
+        assert first['user'] == regular_user.pk
+        assert first['cache_misses'] == 1 and second['cache_hits'] == 1
+        assert first['queries'] > second['queries']
+
+    def test_sampling(self, settings, regular_user):
+        """Requests outside the sample are not instrumented"""
+        settings.REQUEST_METRICS_ENABLED = True
+        settings.REQUEST_METRICS_SAMPLE_RATE = 0
+
+        response = self._client(regular_user).get(reverse('zone-list'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'Server-Timing' not in response
+
+    def test_disabled(self, settings, regular_user):
+        """Disabled, the middleware is left out of the chain"""
+        settings.REQUEST_METRICS_ENABLED = False
+
+        response = self._client(regular_user).get(reverse('zone-list'))
+
+        assert 'Server-Timing' not in response
+
+
+# ============= Query Budgets =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+@pytest.mark.slow
+class TestCoreQueryBudget:
+    """Query counts of the core endpoints do not grow with the data"""
+
+    def _users(self, n):
+        start = User.objects.count()
+        users = User.objects.bulk_create([User(username=f'budget{start + index}') for index in range(n)])
+        zone = ZoneFactory()
+        UserProfile.objects.bulk_create([UserProfile(user=user, zone=zone) for user in users])
+        group = Group.objects.create(name=f'Group {start}')
+        group.user_set.add(*users)
+        return users
+
+    def _groups(self, n):
+        start = Group.objects.count()
+        permissions = list(Permission.objects.all()[:3])
+        groups = Group.objects.bulk_create([Group(name=f'Group {start + index}') for index in range(n)])
+        for group in groups:
+            group.permissions.add(*permissions)
+        return groups
+
+    def test_zone_list(self, query_budget):
+        query_budget(reverse('zone-list'), ZoneFactory.create_batch, budget=2)
+
+    def test_zone_detail(self, query_budget):
+        query_budget(lambda rows: reverse('zone-detail', args=[rows[-1].pk]), ZoneFactory.create_batch, budget=1)
+
+    def test_user_list(self, query_budget, admin_user):
+        query_budget(reverse('user-list'), self._users, budget=3, user=admin_user)
+
+    def test_user_detail(self, query_budget, admin_user):
+        query_budget(
+            lambda rows: reverse('user-detail', args=[rows[-1].pk]), self._users, budget=2, user=admin_user
+        )
+
+    def test_user_profile_list(self, query_budget, admin_user):
+        query_budget(reverse('userprofile-list'), self._users, budget=2, user=admin_user)
+
+    def test_user_profile_detail(self, query_budget, admin_user):
+        query_budget(
+            lambda users: reverse('userprofile-detail', args=[users[-1].core_profile.pk]),
+            self._users, budget=1, user=admin_user,
+        )
+
+    def test_group_list(self, query_budget):
+        query_budget(reverse('group-list'), self._groups, budget=3)
+
+    def test_group_detail(self, query_budget):
+        query_budget(lambda rows: reverse('group-detail', args=[rows[-1].pk]), self._groups, budget=2)
+
+    def test_permission_list(self, query_budget):
+        query_budget(reverse('permission-list'), lambda n: None, budget=2)
+
+    def test_permission_detail(self, query_budget):
+        permission = Permission.objects.first()
+        query_budget(reverse('permission-detail', args=[permission.pk]), lambda n: None, budget=1)
+
+
+def _router_routes():
+    """URL names of the list and detail routes registered by every app router"""
+    names = set()
+    for config in django_apps.get_app_configs():
+        router = getattr(_app_module(config, 'urls'), 'router', None)
+        for _, viewset, basename in getattr(router, 'registry', []):
+            for action, route in (('list', 'list'), ('retrieve', 'detail')):
+                if hasattr(viewset, action):
+                    names.add(f'{basename}-{route}')
+    return names
+
+
+def _budgeted_routes():
+    """URL names reversed by the TestXxxQueryBudget classes of every app"""
+    names = set()
+    for config in django_apps.get_app_configs():
+        module = _app_module(config, 'tests')
+        if module is None:
+            continue
+        for name, value in vars(module).items():
+            if name.endswith('QueryBudget') and inspect.isclass(value):
+                names.update(re.findall(r"reverse\('([\w-]+)'", inspect.getsource(value)))
+    return names
+
+
+def _app_module(config, name):
+    if not config.name.startswith('apps.'):
+        return None
+    try:
+        return import_module(f'{config.name}.{name}')
+    except ModuleNotFoundError:
+        return None
+
+
+@pytest.mark.unit
+class TestQueryBudgetCoverage:
+    """Every routed list and detail endpoint declares a query budget"""
+
+    def test_every_route_has_a_budget(self):
+        missing = sorted(_router_routes() - _budgeted_routes())
+        assert not missing, f"No query budget for {', '.join(missing)}: add one to the app's TestXxxQueryBudget"
+
+@pytest.mark.unit
+class TestQueryProfiles:
+    """Test per-action query profiles"""
+
+    def _lookups(self, action):
+        queryset = SaleViewSet(action=action).get_queryset()
+        return queryset.query.select_related, [
+            getattr(lookup, 'prefetch_to', lookup) for lookup in queryset._prefetch_related_lookups
+        ]
+
+    def test_action_profile(self):
+        """An action with a profile loads only its relations"""
+        assert self._lookups('pay_from_account') == ({'client': {}}, [])
+        assert self._lookups('destroy') == (False, [])
+
+    def test_default_profile(self):
+        """Actions without a profile fall back to 'default'"""
+        assert self._lookups('list') == (False, ['items'])
+        assert self._lookups('partial_update') == (False, ['items'])
+
+
+# ============= Query Plan Tests =============
+
+# Hot query shape -> (queryset built from the seeded rows, index it must use, leading column its
+# Index Cond must bound). Index names are regexes: Django suffixes its own with a hash
+HOT_QUERIES = {
+    'last_balance': (
+        lambda rows: AccountStatement.objects.filter(account=rows['account']).order_by('-date', '-id')[:1],
+        'accountstatement_account_idx', 'account_id',
+    ),
+    'stock_card_history': (
+        lambda rows: StockCard.objects.filter(
+            product=rows['product'], zone=rows['zone'], date__gte=date.today() - timedelta(days=30)
+        ),
+        'stockcard_product_zone_idx', 'product_id',
+    ),
+    'sales_by_date': (
+        lambda rows: Sale.objects.filter(date__range=[date.today() - timedelta(days=7), date.today()]),
+        'sale_date_id_idx', 'date',
+    ),
+    'client_outstanding': (
+        lambda rows: Sale.objects.filter(client=rows['client'], remaining_amount__gt=0),
+        'sale_client_remaining_idx', 'client_id',
+    ),
+    'sale_receipts': (
+        lambda rows: CashReceipt.objects.filter(sale=rows['sale']),
+        r'gestion_api_cashreceipt_sale_id_[0-9a-f]+', 'sale_id',
+    ),
+    'supplier_outstanding': (
+        lambda rows: StockSupply.objects.filter(
+            supplier=rows['supplier'], payment_status__in=['unpaid', 'partially_paid']
+        ),
+        'stocksupply_supplier_pay_idx', 'supplier_id',
+    ),
+    'supply_reference_prefix': (
+        lambda rows: StockSupply.objects.filter(reference__startswith='SUP-2026'),
+        # The varchar_pattern_ops index: the unique one cannot serve LIKE 'x%'
+        r'gestion_api_stocksupply_reference_[0-9a-f]+_like', 'reference',
+    ),
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.slow
+class TestQueryPlans:
+    """Hot query shapes are served by an index, not a sequential scan"""
+
+    def _seed(self):
+        seed_dataset(sales=200, products=20, clients=5, zones=2, days=60, batch_size=100)
+        sale = Sale.objects.order_by('id').first()
+        supplier = SupplierFactory()
+        for index in range(20):
+            StockSupply.objects.create(
+                reference=f'SUP-2026{index:04d}', supplier=supplier, zone=sale.zone, date=date.today(),
+                status='received', payment_status='unpaid', total_amount=Decimal('10.00')
+            )
+        card = StockCard.objects.filter(transaction_type='sale').first()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return {
+            'account': AccountStatement.objects.values_list('account_id', flat=True).first(),
+            'product': card.product_id,
+            'zone': card.zone_id,
+            'client': sale.client_id,
+            'sale': sale.pk,
+            'supplier': supplier.pk,
+        }
+
+    def test_hot_queries_use_their_index(self):
+        """
+        Sequential scans are priced out, so a plan without the expected
+        index means no index can serve the query anymore
+        """
+        rows = self._seed()
+        regressions = {}
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, (build, index, column) in HOT_QUERIES.items():
+            plan = build(rows).explain()
+            if not re.search(rf'(?:using|on) {index} .*\n\s*Index Cond: \(+{column}\b', plan):
+                regressions[name] = plan
+        assert not regressions, '\n\n'.join(
+            f'{name} does not seek {HOT_QUERIES[name][1]} on {HOT_QUERIES[name][2]}:\n{plan}'
+            for name, plan in regressions.items()
+        )
+
+
+# ============= Benchmark Harness Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.slow
+class TestBenchmarkHarness:
+    """Test the seeding and benchmark commands on a small dataset"""
+
+    def test_seed_and_run(self, admin_user, tmp_path):
+        """Seeding writes consistent data and every scenario answers successfully"""
+        out = StringIO()
+        call_command('seed_benchmark_data', '--sales', '30', '--products', '10', '--clients', '3',
+                     '--batch-size', '20', '--force', stdout=out)
+        assert 'Seeded' in out.getvalue()
+        assert Sale.objects.count() == 30
+        assert StockCard.objects.filter(transaction_type='sale').count() == SaleItem.objects.count()
+        assert DailySalesRollup.objects.aggregate(total=Sum('sales_count'))['total'] == 30
+        card_totals = {
+            (row['product_id'], row['zone_id']): row['net']
+            for row in StockCard.objects.values('product_id', 'zone_id').annotate(
+                net=Sum(F('quantity_in') - F('quantity_out'))
+            )
+        }
+        assert card_totals == {
+            (product_id, zone_id): quantity
+            for product_id, zone_id, quantity in Stock.objects.values_list('product_id', 'zone_id', 'quantity')
+        }
+
+        output = tmp_path / 'results.json'
+        call_command('run_benchmarks', '--repeat', '2', '--output', str(output), stdout=StringIO())
+        report = json.loads(output.read_text())
+        assert report['meta']['rows']['sales'] == 30
+        assert {result['status'] for result in report['results'].values()} <= {200, 201}
+        assert 'sale_create' in report['results'] and 'ledger_list' in report['results']
+        # Write scenarios are rolled back
+        assert Sale.objects.count() == 30
+
+        compared = StringIO()
+        call_command('run_benchmarks', '--only', 'sale_list', '--repeat', '1',
+                     '--compare', str(output), stdout=compared)
+        assert 'sale_list' in compared.getvalue()
+
+    def test_seed_refuses_without_debug(self, settings):
+        """Seeding a non-debug database needs --force"""
+        settings.DEBUG = False
+        with pytest.raises(CommandError):
+            call_command('seed_benchmark_data', '--sales', '1', stdout=StringIO())
@@ -11,4 +11,5 @@ router.register(r'permissions', views.PermissionViewSet, basename='permission')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('cache-stats/', views.cache_stats, name='cache-stats'),
 ]
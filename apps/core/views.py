@@ -1,9 +1,12 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth.models import User, Group, Permission
+from django.db.models import Prefetch
+from . import caching
 from .models import UserProfile, Zone
+from .querysets import QueryProfile, QueryProfileMixin
 from .serializers import (
     UserProfileSerializer, UserSerializer, ZoneSerializer,
     GroupSerializer, PermissionSerializer, PasswordChangeSerializer
@@ -34,11 +37,15 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for users management"""
     queryset = User.objects.all().order_by('-date_joined')
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(prefetch_related=['groups']),
+        'destroy': QueryProfile(),
+    }
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -93,18 +100,27 @@ class ZoneViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for user groups"""
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(prefetch_related=[
+            Prefetch('permissions', queryset=Permission.objects.select_related('content_type')),
+        ]),
+        'destroy': QueryProfile(),
+    }
 
 
-class PermissionViewSet(viewsets.ReadOnlyModelViewSet):
+class PermissionViewSet(QueryProfileMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for permissions (read-only)"""
     queryset = Permission.objects.all()
     serializer_class = PermissionSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['content_type']),
+    }
     
     @action(detail=False, methods=['get'])
     def categorized(self, request):
@@ -129,3 +145,10 @@ class PermissionViewSet(viewsets.ReadOnlyModelViewSet):
             })
         
         return Response(categorized)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Hit/miss counters of the cached read endpoints, shared by all workers"""
+    return Response(caching.cache_stats())
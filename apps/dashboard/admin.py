@@ -1,3 +1,17 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DailySalesRollup, StockValuationSnapshot
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'zone', 'revenue', 'sales_count', 'paid_amount', 'updated_at')
+    list_filter = ('zone',)
+    date_hierarchy = 'date'
+
+
+@admin.register(StockValuationSnapshot)
+class StockValuationSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('date', 'zone', 'category', 'quantity', 'selling_value', 'purchase_value', 'stock_count')
+    list_filter = ('zone', 'category')
+    date_hierarchy = 'date'
@@ -0,0 +1,69 @@
+"""
+Receivables / payables aging
+Buckets outstanding sale and supply amounts per partner in one grouped query
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.inventory.models import StockSupply
+from apps.sales.models import Sale
+
+
+# (name, minimum age in days, maximum age in days)
+AGING_BUCKETS = [
+    ('days_0_30', None, 30),
+    ('days_31_60', 31, 60),
+    ('days_61_90', 61, 90),
+    ('days_over_90', 91, None),
+]
+
+AGING_SOURCES = {
+    'client': (Sale, 'client'),
+    'supplier': (StockSupply, 'supplier'),
+}
+
+AGING_ORDERING = {
+    'exposure': 'total_outstanding',
+    'name': 'partner_name',
+    'documents': 'document_count',
+    **{name: name for name, _, _ in AGING_BUCKETS},
+}
+
+
+def aging_report(partner_type, as_of, ordering='-exposure'):
+    """
+    Return a values() queryset with one row per partner that has something
+    outstanding: partner_id, partner_name, document_count, total_outstanding
+    and one column per aging bucket. The outstanding amount of a document is
+    total_amount - paid_amount; cancelled documents are ignored.
+    """
+    model, partner = AGING_SOURCES[partner_type]
+    amount = DecimalField(max_digits=15, decimal_places=2)
+    zero = Value(Decimal('0.00'), output_field=amount)
+
+    buckets = {}
+    for name, min_age, max_age in AGING_BUCKETS:
+        condition = Q()
+        if min_age is not None:
+            condition &= Q(date__lte=as_of - timedelta(days=min_age))
+        if max_age is not None:
+            condition &= Q(date__gte=as_of - timedelta(days=max_age))
+        buckets[name] = Coalesce(Sum('outstanding', filter=condition), zero)
+
+    descending = ordering.startswith('-')
+    order_field = AGING_ORDERING.get(ordering.lstrip('-'), 'total_outstanding')
+
+    return model.objects.exclude(status='cancelled').annotate(
+        outstanding=ExpressionWrapper(F('total_amount') - F('paid_amount'), output_field=amount)
+    ).filter(outstanding__gt=0, date__lte=as_of).values(
+        partner_id=F(f'{partner}_id'),
+        partner_name=F(f'{partner}__name'),
+    ).annotate(
+        document_count=Count('id'),
+        total_outstanding=Coalesce(Sum('outstanding'), zero),
+        **buckets,
+    ).order_by(f"{'-' if descending else ''}{order_field}", 'partner_id')
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard.rollups import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollup (DailySalesRollup) from the Sale table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='date_to', help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        try:
+            date_from = self._parse_date(options['date_from'])
+            date_to = self._parse_date(options['date_to'])
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+
+        count = rebuild_daily_sales(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily sales rollup rows"))
+
+    def _parse_date(self, value):
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
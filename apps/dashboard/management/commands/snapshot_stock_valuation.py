@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dashboard.valuation import take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Snapshot the stock valuation per zone and category (StockValuationSnapshot); schedule it daily"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Snapshot date (YYYY-MM-DD, default: today); a past date is refused")
+
+    def handle(self, *args, **options):
+        try:
+            day = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else None
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+
+        try:
+            count = take_snapshot(day)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} stock valuation rows"))
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:09
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def populate_rollup(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    DailySalesRollup = apps.get_model('dashboard', 'DailySalesRollup')
+    rows = Sale.objects.exclude(status='cancelled').values('date', 'zone_id').annotate(
+        revenue=Sum('total_amount'),
+        sales_count=Count('id'),
+        paid_amount=Sum('paid_amount'),
+    ).order_by()
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(**row) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('sales', '0002_remove_extra_quoteitem_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales_rollups', to='core.zone')),
+            ],
+            options={
+                'verbose_name': 'Cumul journalier des ventes',
+                'verbose_name_plural': 'Cumuls journaliers des ventes',
+                'ordering': ['date', 'zone'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'zone'), name='unique_daily_sales_rollup'),
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('app_settings', '0001_initial'),
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockValuationSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('selling_value', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('purchase_value', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('stock_count', models.PositiveIntegerField(default=0)),
+                ('last_stock_card_id', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_valuation_snapshots', to='app_settings.productcategory')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_valuation_snapshots', to='core.zone')),
+            ],
+            options={
+                'verbose_name': 'Valorisation du stock',
+                'verbose_name_plural': 'Valorisations du stock',
+                'ordering': ['date', 'zone'],
+                'indexes': [models.Index(fields=['date'], name='stockvaluation_date_idx')],
+            },
+        ),
+    ]
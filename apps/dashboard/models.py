@@ -1,3 +1,59 @@
 from django.db import models
 
-# Create your models here.
+from apps.core.models import Zone
+
+
+class DailySalesRollup(models.Model):
+    """
+    Totaux journaliers des ventes par zone (hors ventes annulées)
+    """
+    date = models.DateField()
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='daily_sales_rollups')
+    revenue = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    sales_count = models.PositiveIntegerField(default=0)
+    paid_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.date} - {self.zone.name}: {self.revenue}"
+
+    class Meta:
+        verbose_name = "Cumul journalier des ventes"
+        verbose_name_plural = "Cumuls journaliers des ventes"
+        ordering = ['date', 'zone']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'zone'], name='unique_daily_sales_rollup'),
+        ]
+
+
+class StockValuationSnapshot(models.Model):
+    """
+    Valorisation du stock par zone et catégorie à une date
+    """
+    date = models.DateField()
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='stock_valuation_snapshots')
+    category = models.ForeignKey(
+        'app_settings.ProductCategory',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_valuation_snapshots'
+    )
+    quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    selling_value = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    purchase_value = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    stock_count = models.PositiveIntegerField(default=0)
+    # Last StockCard row already reflected in the quantities above
+    last_stock_card_id = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.date} - {self.zone.name}: {self.selling_value}"
+
+    class Meta:
+        verbose_name = "Valorisation du stock"
+        verbose_name_plural = "Valorisations du stock"
+        ordering = ['date', 'zone']
+        indexes = [
+            models.Index(fields=['date'], name='stockvaluation_date_idx'),
+        ]
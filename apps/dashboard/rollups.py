@@ -0,0 +1,98 @@
+"""
+Daily sales rollup
+Keeps DailySalesRollup in step with Sale so dashboards read one row per day and zone
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.sales.models import Sale
+from .models import DailySalesRollup
+
+
+def _rollup_totals(queryset):
+    """Group non-cancelled sales by (date, zone) with the rollup columns"""
+    zero = Value(Decimal('0.00'), output_field=DecimalField())
+    return queryset.exclude(status='cancelled').values('date', 'zone_id').annotate(
+        revenue=Coalesce(Sum('total_amount'), zero),
+        sales_count=Count('id'),
+        paid_amount=Coalesce(Sum('paid_amount'), zero),
+    ).order_by()
+
+
+def refresh_daily_sales(keys):
+    """
+    Recompute the rollup rows for the given (date, zone_id) pairs.
+
+    Only the touched days are re-aggregated, from the sale date index, so the
+    cost of a sale write does not depend on the size of the sales history.
+    Days left with no sales lose their row.
+    """
+    keys = {(day, zone_id) for day, zone_id in keys if day and zone_id}
+    if not keys:
+        return
+
+    touched = Q()
+    for day, zone_id in keys:
+        touched |= Q(date=day, zone_id=zone_id)
+
+    with transaction.atomic():
+        totals = {(row['date'], row['zone_id']): row for row in _rollup_totals(Sale.objects.filter(touched))}
+
+        stale = Q()
+        for day, zone_id in keys - set(totals):
+            stale |= Q(date=day, zone_id=zone_id)
+        if stale:
+            DailySalesRollup.objects.filter(stale).delete()
+
+        if totals:
+            DailySalesRollup.objects.bulk_create(
+                [
+                    DailySalesRollup(
+                        date=row['date'],
+                        zone_id=row['zone_id'],
+                        revenue=row['revenue'],
+                        sales_count=row['sales_count'],
+                        paid_amount=row['paid_amount'],
+                    )
+                    for row in totals.values()
+                ],
+                update_conflicts=True,
+                unique_fields=['date', 'zone'],
+                update_fields=['revenue', 'sales_count', 'paid_amount', 'updated_at'],
+            )
+
+
+def rebuild_daily_sales(date_from=None, date_to=None):
+    """
+    Rebuild the rollup from Sale for a date range (everything by default).
+    Returns the number of rollup rows written.
+    """
+    sales = Sale.objects.all()
+    rollups = DailySalesRollup.objects.all()
+    if date_from:
+        sales = sales.filter(date__gte=date_from)
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        sales = sales.filter(date__lte=date_to)
+        rollups = rollups.filter(date__lte=date_to)
+
+    with transaction.atomic():
+        rollups.delete()
+        rows = DailySalesRollup.objects.bulk_create(
+            [
+                DailySalesRollup(
+                    date=row['date'],
+                    zone_id=row['zone_id'],
+                    revenue=row['revenue'],
+                    sales_count=row['sales_count'],
+                    paid_amount=row['paid_amount'],
+                )
+                for row in _rollup_totals(sales).iterator()
+            ],
+            batch_size=1000,
+        )
+    return len(rows)
@@ -0,0 +1,34 @@
+"""
+Signals for dashboard app
+Keeps the daily sales rollup in step with Sale writes
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.sales.models import Sale
+from .rollups import refresh_daily_sales
+
+
+def _rollup_key(sale):
+    return (Sale._meta.get_field('date').to_python(sale.date), sale.zone_id)
+
+
+@receiver(pre_save, sender=Sale)
+def remember_sale_rollup_key(sender, instance, **kwargs):
+    """Remember the stored day and zone of a sale being updated, in case either changes"""
+    stored = Sale.objects.filter(pk=instance.pk).values_list('date', 'zone_id').first() if instance.pk else None
+    instance._rollup_key = stored
+
+
+@receiver(post_save, sender=Sale)
+def update_sales_rollup_on_save(sender, instance, **kwargs):
+    """Refresh the rollup for the sale's day (and its previous day/zone if moved)"""
+    key = _rollup_key(instance)
+    refresh_daily_sales({key, getattr(instance, '_rollup_key', None) or key})
+
+
+@receiver(post_delete, sender=Sale)
+def update_sales_rollup_on_delete(sender, instance, **kwargs):
+    """Drop a deleted sale from its day's rollup"""
+    refresh_daily_sales({_rollup_key(instance)})
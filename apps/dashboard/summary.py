@@ -0,0 +1,239 @@
+"""
+Dashboard sections
+Builds every dashboard section for one period, sharing the aggregates they have in common
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Max, Prefetch, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
+from apps.app_settings.models import ProductCategory
+from apps.core import reference_data
+from apps.core.models import Zone
+from apps.inventory.models import Product, Stock, StockSupply
+from apps.partners.models import Client, Supplier
+from apps.sales.models import Sale, SaleItem
+from apps.sales.serializers import SaleSerializer
+from .models import DailySalesRollup
+from .valuation import current_valuation
+
+
+SUMMARY_SECTIONS = [
+    'stats', 'inventory', 'low_stock', 'recent_sales', 'top_products',
+    'revenue_trend', 'client_activity', 'pending_payments',
+]
+
+PERIOD_DAYS = {'day': 0, 'week': 7, 'month': 30, 'year': 365}
+
+
+def period_range(period, start_date=None, end_date=None, today=None):
+    """
+    Turn the dashboard period parameters into (date_from, date_to). 'custom'
+    uses start_date/end_date (YYYY-MM-DD, ValueError when malformed); other
+    periods end today, unknown ones count as 'year'.
+    """
+    today = today or datetime.now().date()
+    if period == 'custom' and start_date and end_date:
+        return (
+            datetime.strptime(start_date, '%Y-%m-%d').date(),
+            datetime.strptime(end_date, '%Y-%m-%d').date(),
+        )
+    return today - timedelta(days=PERIOD_DAYS.get(period, 365)), today
+
+
+class DashboardSummary:
+    """
+    Dashboard sections for the period [date_from, date_to].
+
+    Aggregates needed by more than one section (sales per day from the
+    rollup, stock totals) are cached properties, so asking for several
+    sections on one instance reads them once.
+    """
+
+    def __init__(self, date_from, date_to, limit=10):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.limit = limit
+
+    def build(self, sections=SUMMARY_SECTIONS):
+        return {name: getattr(self, name)() for name in sections}
+
+    @cached_property
+    def daily_sales(self):
+        """{date: (revenue, sales count)} over the period, from the daily rollup"""
+        return {
+            row['date']: (row['revenue'], row['count'])
+            for row in DailySalesRollup.objects.filter(
+                date__range=[self.date_from, self.date_to]
+            ).values('date').annotate(
+                revenue=Sum('revenue'), count=Sum('sales_count')
+            ).order_by('date')
+        }
+
+    @cached_property
+    def stock_totals(self):
+        """Stock row count and low stock count in one aggregate"""
+        return Stock.objects.aggregate(
+            total=Count('id'),
+            low=Count('id', filter=Q(
+                quantity__lt=F('product__min_stock_level'), product__min_stock_level__gt=0
+            )),
+        )
+
+    @cached_property
+    def valuation(self):
+        """Latest valuation snapshot plus the movements since, see valuation.current_valuation()"""
+        return current_valuation()
+
+    def stats(self):
+        return {
+            'total_sales': sum(count for _, count in self.daily_sales.values()),
+            'total_revenue': float(sum((revenue for revenue, _ in self.daily_sales.values()), Decimal('0'))),
+            'total_clients': Client.objects.filter(is_active=True).count(),
+            'total_products': Product.objects.filter(is_active=True).count(),
+            'total_suppliers': Supplier.objects.filter(is_active=True).count(),
+            'date_from': str(self.date_from),
+            'date_to': str(self.date_to),
+        }
+
+    def inventory(self):
+        valuation_date, rows = self.valuation
+        by_category = defaultdict(Decimal)
+        by_zone = defaultdict(Decimal)
+        for (zone_id, category_id), totals in rows.items():
+            by_category[category_id] += totals['selling_value']
+            by_zone[zone_id] += totals['selling_value']
+        value = sum(by_zone.values(), Decimal('0'))
+        category_data = sorted(
+            ((category_id, amount) for category_id, amount in by_category.items() if amount > 0),
+            key=lambda item: item[1], reverse=True
+        )[:10]
+        zone_data = sorted(
+            ((zone_id, amount) for zone_id, amount in by_zone.items() if amount > 0),
+            key=lambda item: item[1], reverse=True
+        )
+        return {
+            'total_stock': self.stock_totals['total'],
+            'low_stock_count': self.stock_totals['low'],
+            'inventory_value': float(value),
+            'total_value': float(value),  # Alias for compatibility
+            'valuation_date': str(valuation_date) if valuation_date else None,
+            'category_data': [
+                {
+                    'category': reference_data.reference_name(ProductCategory, category_id, 'Sans catégorie'),
+                    'value': float(amount),
+                }
+                for category_id, amount in category_data
+            ],
+            'zone_data': [
+                {'zone': reference_data.reference_name(Zone, zone_id, 'Sans zone'), 'value': float(amount)}
+                for zone_id, amount in zone_data
+            ],
+        }
+
+    def low_stock(self):
+        low_stock = Stock.objects.filter(
+            quantity__lt=F('product__min_stock_level'),
+            product__min_stock_level__gt=0
+        ).select_related('product', 'product__category', 'zone', 'product__unit').order_by('product__name')
+        return [
+            {
+                'id': stock.id,
+                'product_id': stock.product.id,
+                'name': stock.product.name,
+                'category': stock.product.category.name if stock.product.category else 'Sans catégorie',
+                'quantity': stock.quantity,
+                'current_stock': stock.quantity,
+                'threshold': stock.product.min_stock_level,
+                'min_stock_level': stock.product.min_stock_level,
+                'zone': stock.zone.name if stock.zone else 'Sans zone',
+                'unit': stock.product.unit.symbol if stock.product.unit else '',
+                'unit_symbol': stock.product.unit.symbol if stock.product.unit else '',
+            }
+            for stock in low_stock
+        ]
+
+    def recent_sales(self):
+        sales = Sale.objects.select_related(
+            'client', 'zone'
+        ).prefetch_related(
+            Prefetch('items', queryset=SaleItem.objects.select_related('product'))
+        ).order_by('-date', '-id')[:self.limit]
+        return SaleSerializer(sales, many=True).data
+
+    def top_products(self):
+        items = SaleItem.objects.filter(sale__date__range=[self.date_from, self.date_to])
+        top_products = items.values(
+            'product__id', 'product__name'
+        ).annotate(
+            total_quantity=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('unit_price'))
+        ).order_by('-revenue')[:self.limit]
+        return [
+            {
+                'id': item['product__id'],
+                'name': item['product__name'],
+                'quantity': float(item['total_quantity']),
+                'revenue': float(item['revenue']),
+            }
+            for item in top_products
+        ]
+
+    def revenue_trend(self):
+        days = (self.date_to - self.date_from).days
+        data = []
+        for i in range(days + 1):
+            current_date = self.date_from + timedelta(days=i)
+            revenue, _ = self.daily_sales.get(current_date, (0, 0))
+            data.append({'date': str(current_date), 'amount': float(revenue)})
+        return data
+
+    def client_activity(self):
+        clients_with_sales = Sale.objects.values(
+            'client__id', 'client__name'
+        ).annotate(
+            last_sale_date=Max('date'),
+            total_amount=Sum('total_amount'),
+            sale_count=Count('id')
+        ).order_by('-last_sale_date')[:self.limit]
+        return [
+            {
+                'id': item['client__id'],
+                'name': item['client__name'],
+                'last_sale_date': str(item['last_sale_date']),
+                'total_amount': float(item['total_amount']),
+                'sale_count': item['sale_count'],
+            }
+            for item in clients_with_sales
+        ]
+
+    def pending_payments(self):
+        totals = {}
+        for name, model in (('sales', Sale), ('supplies', StockSupply)):
+            row = model.objects.filter(
+                payment_status__in=['pending', 'partial']
+            ).aggregate(
+                count=Count('id'),
+                total_amount=Coalesce(Sum('total_amount'), Value(0, output_field=DecimalField())),
+                paid_amount=Coalesce(Sum('paid_amount'), Value(0, output_field=DecimalField()))
+            )
+            row['outstanding_amount'] = row['total_amount'] - row['paid_amount']
+            totals[name] = row
+        return {
+            **{
+                name: {
+                    'count': row['count'],
+                    'total_amount': float(row['total_amount']),
+                    'paid_amount': float(row['paid_amount']),
+                    'outstanding_amount': float(row['outstanding_amount']),
+                }
+                for name, row in totals.items()
+            },
+            'total_outstanding': float(
+                totals['sales']['outstanding_amount'] + totals['supplies']['outstanding_amount']
+            ),
+        }
@@ -1,3 +1,426 @@
-from django.test import TestCase
+"""
+Tests for Dashboard app - DailySalesRollup and dashboard endpoints
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+import pytest
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.urls import reverse
+from rest_framework import status
+from decimal import Decimal
+from datetime import date, timedelta
+
+from apps.dashboard.models import DailySalesRollup, StockValuationSnapshot
+from apps.dashboard.valuation import current_valuation, take_snapshot
+from apps.inventory.models import StockSupply
+from apps.sales.models import Sale
+from apps.inventory.movements import StockMovement, apply_movements
+from conftest import (
+    ClientFactory, ProductFactory, SaleFactory, SaleItemFactory, StockFactory, SupplierFactory
+)
+
+
+# ============= DailySalesRollup Tests =============
+
+@pytest.mark.django_db
+class TestDailySalesRollup:
+    """Test that the rollup follows Sale writes"""
+
+    def test_sales_are_summed_per_day_and_zone(self, zone):
+        """Sales on the same day and zone share one rollup row"""
+        SaleFactory(zone=zone, total_amount=Decimal('100.00'), paid_amount=Decimal('40.00'))
+        SaleFactory(zone=zone, total_amount=Decimal('250.00'))
+
+        rollup = DailySalesRollup.objects.get(date=date.today(), zone=zone)
+        assert rollup.revenue == Decimal('350.00')
+        assert rollup.sales_count == 2
+        assert rollup.paid_amount == Decimal('40.00')
+
+    def test_cancelled_and_deleted_sales_leave_the_rollup(self, zone):
+        """Cancelling or deleting a sale removes it from its day"""
+        kept = SaleFactory(zone=zone, total_amount=Decimal('100.00'))
+        cancelled = SaleFactory(zone=zone, total_amount=Decimal('200.00'))
+
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        assert DailySalesRollup.objects.get(zone=zone).revenue == Decimal('100.00')
+
+        kept.delete()
+        assert not DailySalesRollup.objects.filter(zone=zone).exists()
+
+    def test_moving_a_sale_refreshes_both_days(self, zone):
+        """Changing a sale's date updates the old and the new day"""
+        yesterday = date.today() - timedelta(days=1)
+        sale = SaleFactory(zone=zone, total_amount=Decimal('100.00'))
+
+        sale.date = yesterday
+        sale.save()
+
+        assert not DailySalesRollup.objects.filter(date=date.today(), zone=zone).exists()
+        assert DailySalesRollup.objects.get(date=yesterday, zone=zone).revenue == Decimal('100.00')
+
+    def test_rebuild_command(self, zone):
+        """The rebuild command restores rows from the Sale table"""
+        SaleFactory(zone=zone, total_amount=Decimal('100.00'))
+        DailySalesRollup.objects.all().delete()
+
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+
+        assert DailySalesRollup.objects.get(zone=zone).revenue == Decimal('100.00')
+
+
+# ============= Dashboard API Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestDashboardSalesAPI:
+    """Test dashboard endpoints that read the rollup"""
+
+    def test_revenue_trend(self, authenticated_client, zone):
+        """Revenue trend returns one point per day, including empty days"""
+        SaleFactory(zone=zone, total_amount=Decimal('100.00'))
+        SaleFactory(zone=zone, total_amount=Decimal('50.00'), date=date.today() - timedelta(days=2))
+
+        response = authenticated_client.get(reverse('dashboard-revenue-trend'), {'period': 'week'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 8
+        amounts = {point['date']: point['amount'] for point in response.data}
+        assert amounts[str(date.today())] == 100.0
+        assert amounts[str(date.today() - timedelta(days=2))] == 50.0
+        assert amounts[str(date.today() - timedelta(days=1))] == 0
+
+    def test_year_trend_query_count(self, authenticated_client, zone, django_assert_max_num_queries):
+        """A year-long chart is a single rollup query"""
+        for days_ago in range(0, 300, 10):
+            SaleFactory(zone=zone, date=date.today() - timedelta(days=days_ago))
+
+        with django_assert_max_num_queries(4):
+            response = authenticated_client.get(reverse('dashboard-revenue-trend'), {'period': 'year'})
+        assert response.status_code == status.HTTP_200_OK
+        assert sum(point['amount'] for point in response.data) == 30 * 1000.0
+
+    def test_dashboard_stats(self, authenticated_client, zone):
+        """Stats read totals from the rollup"""
+        SaleFactory(zone=zone, total_amount=Decimal('100.00'))
+        SaleFactory(zone=zone, total_amount=Decimal('300.00'))
+
+        response = authenticated_client.get(reverse('dashboard-stats'), {'period': 'day'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['total_sales'] == 2
+        assert response.data['total_revenue'] == 400.0
+
+    def test_cancelled_sales_are_not_counted(self, authenticated_client, zone):
+        """Cancelled sales are left out of every rollup total (the API counted them before the rollup)"""
+        SaleFactory(zone=zone, total_amount=Decimal('100.00'))
+        SaleFactory(zone=zone, total_amount=Decimal('300.00'), status='cancelled')
+
+        stats = authenticated_client.get(reverse('dashboard-stats'), {'period': 'day'}).data
+        summary = authenticated_client.get(reverse('dashboard-summary'), {'period': 'day', 'sections': 'stats'}).data
+        trend = authenticated_client.get(reverse('dashboard-revenue-trend'), {'period': 'week'}).data
+
+        assert (stats['total_sales'], stats['total_revenue']) == (1, 100.0)
+        assert (summary['stats']['total_sales'], summary['stats']['total_revenue']) == (1, 100.0)
+        assert {point['date']: point['amount'] for point in trend}[str(date.today())] == 100.0
+
+    def test_loading_sales_runs_no_rollup_query(self, zone, django_assert_num_queries):
+        """Sales loaded with deferred fields cost no query per row"""
+        SaleFactory.create_batch(3, zone=zone)
+        with django_assert_num_queries(1):
+            assert len(list(Sale.objects.only('id'))) == 3
+
+
+# ============= Aging Report Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestAgingReport:
+    """Test the receivables/payables aging endpoint"""
+
+    def _sale(self, client, zone, days_ago, total, paid='0.00'):
+        return SaleFactory(
+            client=client, zone=zone, date=date.today() - timedelta(days=days_ago),
+            total_amount=Decimal(total), paid_amount=Decimal(paid)
+        )
+
+    def test_client_buckets(self, authenticated_client, zone):
+        """Outstanding sale amounts land in the bucket matching their age"""
+        client = ClientFactory()
+        self._sale(client, zone, 5, '100.00', paid='40.00')
+        self._sale(client, zone, 45, '200.00')
+        self._sale(client, zone, 75, '300.00')
+        self._sale(client, zone, 120, '400.00')
+        self._sale(client, zone, 10, '500.00', paid='500.00')
+
+        response = authenticated_client.get(reverse('dashboard-aging'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 1
+        row = response.data['results'][0]
+        assert row['partner_id'] == client.id
+        assert row['document_count'] == 4
+        assert row['days_0_30'] == 60.0
+        assert row['days_31_60'] == 200.0
+        assert row['days_61_90'] == 300.0
+        assert row['days_over_90'] == 400.0
+        assert row['total_outstanding'] == 960.0
+
+    def test_supplier_buckets(self, authenticated_client, zone):
+        """Payables are read from stock supplies"""
+        supplier = SupplierFactory()
+        StockSupply.objects.create(
+            reference='APR-TEST-001', supplier=supplier, zone=zone, status='received',
+            date=date.today() - timedelta(days=35),
+            total_amount=Decimal('800.00'), paid_amount=Decimal('300.00')
+        )
+
+        response = authenticated_client.get(reverse('dashboard-aging'), {'partner_type': 'supplier'})
+
+        assert response.status_code == status.HTTP_200_OK
+        row = response.data['results'][0]
+        assert row['partner_name'] == supplier.name
+        assert row['days_31_60'] == 500.0
+
+    def test_sorted_by_exposure_and_paginated(self, authenticated_client, zone,
+                                              django_assert_max_num_queries):
+        """Partners come largest exposure first, a page at a time, in constant queries"""
+        for amount in range(1, 31):
+            self._sale(ClientFactory(), zone, amount, f'{amount * 10}.00')
+
+        with django_assert_max_num_queries(4):
+            response = authenticated_client.get(reverse('dashboard-aging'), {'page_size': 10})
+
+        assert response.data['count'] == 30
+        totals = [row['total_outstanding'] for row in response.data['results']]
+        assert totals == sorted(totals, reverse=True)
+        assert totals[0] == 300.0
+        assert len(totals) == 10
+
+        response = authenticated_client.get(reverse('dashboard-aging'), {'ordering': 'exposure'})
+        assert response.data['results'][0]['total_outstanding'] == 10.0
+
+    def test_invalid_partner_type(self, authenticated_client):
+        """Unknown partner types are rejected"""
+        response = authenticated_client.get(reverse('dashboard-aging'), {'partner_type': 'employee'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# ============= Dashboard Summary Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestDashboardSummary:
+    """Test the composite summary endpoint"""
+
+    def test_all_sections_by_default(self, authenticated_client, zone):
+        """Without ?sections every section is returned, matching the single endpoints"""
+        SaleFactory(zone=zone, total_amount=Decimal('100.00'), paid_amount=Decimal('40.00'),
+                    payment_status='partial')
+
+        response = authenticated_client.get(reverse('dashboard-summary'), {'period': 'week'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['period'] == 'week'
+        assert set(response.data) >= {
+            'stats', 'inventory', 'low_stock', 'recent_sales', 'top_products',
+            'revenue_trend', 'client_activity', 'pending_payments',
+        }
+        assert response.data['stats']['total_revenue'] == 100.0
+        assert len(response.data['revenue_trend']) == 8
+        assert response.data['pending_payments']['sales']['outstanding_amount'] == 60.0
+
+    def test_sections_subset(self, authenticated_client, zone):
+        """?sections only computes the requested sections"""
+        SaleFactory(zone=zone)
+
+        response = authenticated_client.get(
+            reverse('dashboard-summary'), {'sections': 'stats,revenue_trend', 'period': 'day'}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'stats' in response.data and 'revenue_trend' in response.data
+        assert 'inventory' not in response.data and 'recent_sales' not in response.data
+        assert response.data['stats']['total_sales'] == 1
+
+    def test_fewer_queries_than_separate_endpoints(self, authenticated_client, zone,
+                                                   django_assert_max_num_queries):
+        """Sections share the rollup and stock aggregates"""
+        for days_ago in range(0, 20):
+            SaleFactory(zone=zone, date=date.today() - timedelta(days=days_ago))
+
+        with django_assert_max_num_queries(14):
+            response = authenticated_client.get(reverse('dashboard-summary'))
+        assert response.status_code == status.HTTP_200_OK
+        assert sum(point['amount'] for point in response.data['revenue_trend']) == 20 * 1000.0
+
+    def test_unknown_section(self, authenticated_client):
+        """Unknown section names are rejected"""
+        response = authenticated_client.get(reverse('dashboard-summary'), {'sections': 'stats,weather'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'weather' in response.data['error']
+
+
+# ============= Stock Valuation Tests =============
+
+@pytest.mark.django_db
+class TestStockValuation:
+    """Test valuation snapshots and the endpoints reading them"""
+
+    def test_snapshot_command(self, product, zone):
+        """The command writes one row per zone and category with both valuations"""
+        StockFactory(product=product, zone=zone, quantity=Decimal('10.00'))
+
+        call_command('snapshot_stock_valuation', stdout=StringIO())
+        call_command('snapshot_stock_valuation', stdout=StringIO())
+
+        snapshot = StockValuationSnapshot.objects.get(date=date.today())
+        assert snapshot.zone == zone
+        assert snapshot.category == product.category
+        assert snapshot.quantity == Decimal('10.00')
+        assert snapshot.selling_value == Decimal('10.00') * product.selling_price
+        assert snapshot.purchase_value == Decimal('10.00') * product.purchase_price
+
+    def test_inventory_reads_snapshot_plus_movements(self, authenticated_client, product, zone):
+        """Movements recorded after the snapshot are added to it"""
+        StockFactory(product=product, zone=zone, quantity=Decimal('10.00'))
+        call_command('snapshot_stock_valuation', stdout=StringIO())
+        apply_movements([StockMovement(product, zone, Decimal('-4.00'), 'sale', 'VNT-1')])
+
+        response = authenticated_client.get(reverse('dashboard-inventory'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['valuation_date'] == str(date.today())
+        assert response.data['inventory_value'] == float(Decimal('6.00') * product.selling_price)
+        assert response.data['zone_data'] == [
+            {'zone': zone.name, 'value': float(Decimal('6.00') * product.selling_price)}
+        ]
+
+    def test_inventory_without_snapshot(self, authenticated_client, product, zone):
+        """Without a snapshot the live stock is valued"""
+        StockFactory(product=product, zone=zone, quantity=Decimal('2.00'))
+
+        response = authenticated_client.get(reverse('dashboard-inventory'))
+
+        assert response.data['valuation_date'] is None
+        assert response.data['category_data'] == [
+            {'category': product.category.name, 'value': float(Decimal('2.00') * product.selling_price)}
+        ]
+
+    def test_history(self, authenticated_client, product, zone):
+        """History returns one point per snapshot date, optionally split by zone"""
+        StockFactory(product=product, zone=zone, quantity=Decimal('10.00'))
+        take_snapshot()
+        StockValuationSnapshot.objects.update(date=date.today() - timedelta(days=1))
+        apply_movements([StockMovement(product, zone, Decimal('5.00'), 'supply', 'APP-1')])
+        call_command('snapshot_stock_valuation', stdout=StringIO())
+
+        response = authenticated_client.get(reverse('dashboard-valuation-history'))
+        assert response.status_code == status.HTTP_200_OK
+        assert [point['quantity'] for point in response.data] == [10.0, 15.0]
+
+        response = authenticated_client.get(reverse('dashboard-valuation-history'), {'group_by': 'zone'})
+        assert response.data[0]['zone'] == zone.name
+
+        response = authenticated_client.get(reverse('dashboard-valuation-history'), {'group_by': 'product'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_past_date_is_refused(self, product, zone):
+        """Current stock is never stored under a past date"""
+        StockFactory(product=product, zone=zone, quantity=Decimal('10.00'))
+
+        with pytest.raises(CommandError, match='past day'):
+            call_command('snapshot_stock_valuation', '--date', str(date.today() - timedelta(days=1)), stdout=StringIO())
+
+        assert not StockValuationSnapshot.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.slow
+class TestStockValuationConcurrency:
+    """Snapshots taken while stock writes are in flight"""
+
+    def test_snapshot_waits_for_uncommitted_cards(self, product, zone):
+        """A card allocated before the snapshot but committed after it is not lost"""
+        StockFactory(product=product, zone=zone, quantity=Decimal('10.00'))
+        other = StockFactory(zone=zone, quantity=Decimal('10.00'))
+        card_written = threading.Event()
+
+        def slow_sale():
+            try:
+                with transaction.atomic():
+                    apply_movements([StockMovement(product, zone, Decimal('-4.00'), 'sale', 'VNT-1')])
+                    card_written.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        def supply_then_snapshot():
+            try:
+                card_written.wait()
+                # Commits first, with a higher card id than the sale
+                apply_movements([StockMovement(other.product, zone, Decimal('1.00'), 'supply', 'APP-1')])
+                take_snapshot()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for future in [pool.submit(slow_sale), pool.submit(supply_then_snapshot)]:
+                future.result()
+
+        _, rows = current_valuation()
+        assert sum(row['quantity'] for row in rows.values()) == Decimal('17.00')
+
+    def test_snapshot_releases_the_write_lock(self, product, zone):
+        """Once the snapshot is written no advisory lock is left to hold stock writes back"""
+        StockFactory(product=product, zone=zone, quantity=Decimal('10.00'))
+
+        take_snapshot()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+            assert cursor.fetchone()[0] == 0
+
+
+# ============= Query Budgets =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+@pytest.mark.slow
+class TestDashboardQueryBudget:
+    """Query counts of the dashboard endpoints do not grow with the data"""
+
+    def _sales(self, n, product, zone, user):
+        sales = SaleFactory.create_batch(n, client=ClientFactory(), zone=zone, created_by=user)
+        for sale in sales:
+            SaleItemFactory(sale=sale, product=product)
+        return sales
+
+    def test_recent_sales(self, query_budget, product, zone, regular_user):
+        query_budget(
+            reverse('dashboard-recent-sales'),
+            lambda n: self._sales(n, product, zone, regular_user),
+            budget=3,
+        )
+
+    def test_top_products_and_client_activity(self, query_budget, product, zone, regular_user):
+        query_budget(
+            reverse('dashboard-summary'),
+            lambda n: self._sales(n, product, zone, regular_user),
+            budget=2,
+            params={'sections': 'top_products,client_activity'},
+        )
+
+    def test_low_stock(self, query_budget, zone, product_category, unit_of_measure):
+        query_budget(
+            reverse('dashboard-low-stock'),
+            lambda n: [
+                StockFactory(product=product, zone=zone, quantity=Decimal('1.00'))
+                for product in ProductFactory.create_batch(n, category=product_category, unit=unit_of_measure)
+            ],
+            budget=1,
+        )
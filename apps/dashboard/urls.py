@@ -18,4 +18,7 @@ urlpatterns = [
     path('revenue-trend/', views.revenue_trend, name='dashboard-revenue-trend'),
     path('client-activity/', views.client_activity, name='dashboard-client-activity'),
     path('pending-payments/', views.pending_payments, name='dashboard-pending-payments'),
+    path('aging/', views.aging, name='dashboard-aging'),
+    path('summary/', views.summary, name='dashboard-summary'),
+    path('valuation-history/', views.valuation_history, name='dashboard-valuation-history'),
 ]
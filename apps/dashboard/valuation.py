@@ -0,0 +1,154 @@
+"""
+Stock valuation
+Snapshots stock value per (date, zone, category) and serves current and historical valuation from them
+"""
+
+from collections import defaultdict
+from datetime import date as date_cls
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.inventory.models import Stock, StockCard
+from apps.inventory.movements import CARD_WRITE_LOCK
+from .models import StockValuationSnapshot
+
+
+VALUATION_FIELDS = ['quantity', 'selling_value', 'purchase_value']
+
+VALUATION_GROUPS = {'zone': 'zone_id', 'category': 'category_id'}
+
+
+def _zero():
+    return Value(Decimal('0.00'), output_field=DecimalField())
+
+
+def _live_rows(**extra):
+    """Stock grouped by (zone, category) with the snapshot columns"""
+    rows = Stock.objects.values(
+        'zone_id', category_id=F('product__category_id')
+    ).annotate(
+        total_quantity=Coalesce(Sum('quantity'), _zero()),
+        selling_value=Coalesce(Sum(F('quantity') * F('product__selling_price')), _zero()),
+        purchase_value=Coalesce(Sum(F('quantity') * F('product__purchase_price')), _zero()),
+        stock_count=Count('id'),
+        **extra
+    ).order_by()
+    for row in rows:
+        row['quantity'] = row.pop('total_quantity')
+        yield row
+
+
+def take_snapshot(day=None):
+    """
+    Write the valuation of every (zone, category) for `day` (default today),
+    replacing any snapshot already taken that day. Return the row count.
+    A past day is rejected with ValueError: only current stock is read.
+
+    The stock totals and the id of the last StockCard row are read from one
+    REPEATABLE READ snapshot. Card ids are allocated in insert order, not
+    commit order, so that snapshot is taken under the exclusive
+    CARD_WRITE_LOCK: it waits for the card writes in flight to commit, and
+    no card left uncommitted below the recorded id is missed by
+    current_valuation(). The lock is released as soon as the snapshot
+    exists, so writes are only held back for that instant. Called inside an
+    outer transaction, whose isolation level is already set, the lock is
+    kept until the totals are read.
+    """
+    today = date_cls.today()
+    day = day or today
+    if day < today:
+        raise ValueError(f"Cannot snapshot the valuation of a past day ({day}): only current stock is known")
+
+    last_card = Subquery(StockCard.objects.order_by('-id').values('id')[:1])
+    outermost = not connection.in_atomic_block
+    locked = _lock_card_writers(True)
+    try:
+        with transaction.atomic():
+            if outermost:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+                    # The first statement fixes the snapshot
+                    cursor.execute('SELECT 1')
+                locked = _lock_card_writers(False)
+            rows = list(_live_rows(last_stock_card_id=Coalesce(last_card, 0)))
+            StockValuationSnapshot.objects.filter(date=day).delete()
+            StockValuationSnapshot.objects.bulk_create(
+                [StockValuationSnapshot(date=day, **row) for row in rows],
+                batch_size=1000,
+            )
+    finally:
+        if locked:
+            _lock_card_writers(False)
+    return len(rows)
+
+
+def _lock_card_writers(lock):
+    """Take (or release) the session-level exclusive CARD_WRITE_LOCK and return whether it is held"""
+    function = 'pg_advisory_lock' if lock else 'pg_advisory_unlock'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {function}(%s)', [CARD_WRITE_LOCK])
+    return lock
+
+
+def current_valuation():
+    """
+    Return (snapshot date, {(zone_id, category_id): {quantity, selling_value,
+    purchase_value}}).
+
+    Reads the latest snapshot and adds the stock cards written since, which
+    costs two small queries however many Stock rows there are. Movements
+    since the snapshot are valued at current prices. Only StockCard rows are
+    replayed: price changes, Stock rows written directly and edited cards
+    show up at the next snapshot. Without any snapshot the live Stock table
+    is aggregated and the date is None.
+    """
+    latest = StockValuationSnapshot.objects.order_by('-date').values('date')[:1]
+    snapshot = list(StockValuationSnapshot.objects.filter(date=Subquery(latest)).values(
+        'date', 'zone_id', 'category_id', 'last_stock_card_id', *VALUATION_FIELDS
+    ))
+    if not snapshot:
+        return None, {
+            (row['zone_id'], row['category_id']): {name: row[name] for name in VALUATION_FIELDS}
+            for row in _live_rows()
+        }
+
+    rows = defaultdict(lambda: dict.fromkeys(VALUATION_FIELDS, Decimal('0.00')))
+    for row in snapshot:
+        totals = rows[(row['zone_id'], row['category_id'])]
+        for name in VALUATION_FIELDS:
+            totals[name] += row[name]
+
+    last_card = max(row['last_stock_card_id'] for row in snapshot)
+    net = F('quantity_in') - F('quantity_out')
+    delta = StockCard.objects.filter(id__gt=last_card).values(
+        'zone_id', category_id=F('product__category_id')
+    ).annotate(
+        quantity=Sum(net),
+        selling_value=Sum(net * F('product__selling_price')),
+        purchase_value=Sum(net * F('product__purchase_price')),
+    ).order_by()
+    for row in delta:
+        totals = rows[(row['zone_id'], row['category_id'])]
+        for name in VALUATION_FIELDS:
+            totals[name] += row[name]
+
+    return snapshot[0]['date'], dict(rows)
+
+
+def snapshot_history(date_from, date_to, zone=None, category=None, group_by=None):
+    """
+    Snapshot totals per date between date_from and date_to, optionally
+    restricted to a zone or category and split by 'zone' or 'category'.
+    """
+    queryset = StockValuationSnapshot.objects.filter(date__range=[date_from, date_to])
+    if zone:
+        queryset = queryset.filter(zone_id=zone)
+    if category:
+        queryset = queryset.filter(category_id=category)
+    keys = ['date'] + ([VALUATION_GROUPS[group_by]] if group_by else [])
+    return queryset.values(*keys).annotate(
+        **{name: Sum(name) for name in VALUATION_FIELDS}
+    ).order_by(*keys)
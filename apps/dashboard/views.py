@@ -4,25 +4,76 @@ Aggregated read-only views for dashboard display
 Consolidates data from multiple domain apps
 """
 
-from decimal import Decimal
-from datetime import datetime, timedelta
-from django.db.models import Sum, Count, F, Q, Value, DecimalField, Max
-from django.db.models.functions import Coalesce
+from datetime import datetime
+from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-# Import models from different domain apps
-from apps.inventory.models import Stock, Product
-from apps.inventory.serializers import StockSerializer
-from apps.sales.models import Sale, SaleItem
-from apps.sales.serializers import SaleSerializer
-from apps.partners.models import Client, Supplier
-from apps.treasury.models import Account
+from apps.app_settings.models import ProductCategory
+from apps.core import reference_data
+from apps.core.caching import cached_response
+from apps.core.models import Zone
+from .aging import AGING_BUCKETS, AGING_SOURCES, aging_report
+from .summary import SUMMARY_SECTIONS, DashboardSummary, period_range
+from .valuation import VALUATION_FIELDS, VALUATION_GROUPS, snapshot_history
+
+
+class AgingPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_response(tags=['sales', 'stock', 'supplies', 'partners'])
+def summary(request):
+    """
+    Get several dashboard sections for one period in a single request
+    Endpoint: /api/dashboard/summary/
+    
+    Query Parameters:
+    - sections: Comma separated subset of stats, inventory, low_stock,
+      recent_sales, top_products, revenue_trend, client_activity,
+      pending_payments (default: all)
+    - period: 'day', 'week', 'month', 'year' or 'custom' (default: 'month')
+    - start_date, end_date: Custom range (YYYY-MM-DD)
+    - limit: Rows in the list sections (default: 10)
+    """
+    sections = request.query_params.get('sections')
+    sections = [name.strip() for name in sections.split(',') if name.strip()] if sections else SUMMARY_SECTIONS
+    unknown = [name for name in sections if name not in SUMMARY_SECTIONS]
+    if unknown:
+        return Response(
+            {'error': f"Unknown sections: {', '.join(unknown)}", 'sections': SUMMARY_SECTIONS},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    period = request.query_params.get('period', 'month')
+    try:
+        date_from, date_to = period_range(
+            period, request.query_params.get('start_date'), request.query_params.get('end_date')
+        )
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        return Response(
+            {'error': 'start_date/end_date must be dates (YYYY-MM-DD) and limit a number'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response({
+        'period': period,
+        'date_from': str(date_from),
+        'date_to': str(date_to),
+        **DashboardSummary(date_from, date_to, limit).build(sections),
+    })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response(tags=['sales', 'stock', 'partners'])
 def dashboard_stats(request):
     """
     Get overall dashboard statistics
@@ -34,57 +85,15 @@ def dashboard_stats(request):
     - end_date: Custom end date (YYYY-MM-DD)
     """
     period = request.query_params.get('period', 'year')
-    start_date = request.query_params.get('start_date')
-    end_date = request.query_params.get('end_date')
-    
-    # Calculate date range
-    today = datetime.now().date()
-    if period == 'custom' and start_date and end_date:
-        date_from = datetime.strptime(start_date, '%Y-%m-%d').date()
-        date_to = datetime.strptime(end_date, '%Y-%m-%d').date()
-    elif period == 'day':
-        date_from = today
-        date_to = today
-    elif period == 'week':
-        date_from = today - timedelta(days=7)
-        date_to = today
-    elif period == 'month':
-        date_from = today - timedelta(days=30)
-        date_to = today
-    else:  # year
-        date_from = today - timedelta(days=365)
-        date_to = today
-    
-    # Get sales statistics
-    sales_queryset = Sale.objects.filter(date__range=[date_from, date_to])
-    
-    # Count of sales
-    total_sales = sales_queryset.count()
-    
-    # Total revenue from sales
-    total_revenue = sales_queryset.aggregate(
-        total=Coalesce(Sum('total_amount'), Value(0, output_field=DecimalField()))
-    )['total']
-    
-    # Get counts
-    total_clients = Client.objects.filter(is_active=True).count()
-    total_products = Product.objects.filter(is_active=True).count()
-    total_suppliers = Supplier.objects.filter(is_active=True).count()
-    
-    return Response({
-        'total_sales': total_sales,
-        'total_revenue': float(total_revenue),
-        'total_clients': total_clients,
-        'total_products': total_products,
-        'total_suppliers': total_suppliers,
-        'period': period,
-        'date_from': str(date_from),
-        'date_to': str(date_to),
-    })
+    date_from, date_to = period_range(
+        period, request.query_params.get('start_date'), request.query_params.get('end_date')
+    )
+    return Response({**DashboardSummary(date_from, date_to).stats(), 'period': period})
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response(tags=['stock'])
 def inventory_stats(request):
     """
     Get inventory statistics for dashboard
@@ -94,89 +103,25 @@ def inventory_stats(request):
     - period: 'day', 'week', 'month', 'year' (default: 'year')
     """
     period = request.query_params.get('period', 'year')
-    
-    # Get low stock count
-    low_stock_count = Stock.objects.filter(
-        quantity__lt=F('product__min_stock_level'),
-        product__min_stock_level__gt=0
-    ).count()
-    
-    # Get total stock count
-    total_stock = Stock.objects.count()
-    
-    # Calculate total inventory value
-    inventory_value = Stock.objects.aggregate(
-        total=Coalesce(
-            Sum(F('quantity') * F('product__selling_price')),
-            Value(0, output_field=DecimalField())
-        )
-    )['total']
-    
-    # Get category breakdown
-    category_data = Stock.objects.values(
-        category_name=F('product__category__name')
-    ).annotate(
-        value=Sum(F('quantity') * F('product__selling_price'))
-    ).filter(value__gt=0).order_by('-value')[:10]
-    
-    # Get zone breakdown
-    zone_data = Stock.objects.values(
-        zone_name=F('zone__name')
-    ).annotate(
-        value=Sum(F('quantity') * F('product__selling_price'))
-    ).filter(value__gt=0).order_by('-value')
-    
-    return Response({
-        'total_stock': total_stock,
-        'low_stock_count': low_stock_count,
-        'inventory_value': float(inventory_value),
-        'total_value': float(inventory_value),  # Alias for compatibility
-        'category_data': [
-            {'category': item['category_name'] or 'Sans catégorie', 'value': float(item['value'])}
-            for item in category_data
-        ],
-        'zone_data': [
-            {'zone': item['zone_name'] or 'Sans zone', 'value': float(item['value'])}
-            for item in zone_data
-        ],
-        'period': period,
-    })
+    date_from, date_to = period_range(period)
+    return Response({**DashboardSummary(date_from, date_to).inventory(), 'period': period})
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response(tags=['stock'])
 def low_stock_products(request):
     """
     Get products with low stock levels for dashboard display
     Endpoint: /api/dashboard/low-stock/
     """
-    low_stock = Stock.objects.filter(
-        quantity__lt=F('product__min_stock_level'),
-        product__min_stock_level__gt=0
-    ).select_related('product', 'product__category', 'zone', 'product__unit').order_by('product__name')
-    
-    # Format response with detailed information
-    data = []
-    for stock in low_stock:
-        data.append({
-            'id': stock.id,
-            'product_id': stock.product.id,
-            'name': stock.product.name,
-            'category': stock.product.category.name if stock.product.category else 'Sans catégorie',
-            'quantity': stock.quantity,
-            'current_stock': stock.quantity,
-            'threshold': stock.product.min_stock_level,
-            'min_stock_level': stock.product.min_stock_level,
-            'zone': stock.zone.name if stock.zone else 'Sans zone',
-            'unit': stock.product.unit.symbol if stock.product.unit else '',
-            'unit_symbol': stock.product.unit.symbol if stock.product.unit else '',
-        })
-    
-    return Response(data)
+    date_from, date_to = period_range('year')
+    return Response(DashboardSummary(date_from, date_to).low_stock())
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response(tags=['sales', 'partners'])
 def recent_sales(request):
     """
     Get recent sales for dashboard display
@@ -186,18 +131,13 @@ def recent_sales(request):
     - limit: Number of sales to return (default: 10)
     """
     limit = int(request.query_params.get('limit', 10))
-    
-    # Get recent sales
-    sales = Sale.objects.select_related(
-        'client', 'zone'
-    ).order_by('-date', '-id')[:limit]
-    
-    serializer = SaleSerializer(sales, many=True)
-    return Response(serializer.data)
+    date_from, date_to = period_range('year')
+    return Response(DashboardSummary(date_from, date_to, limit).recent_sales())
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response(tags=['sales'])
 def top_products(request):
     """
     Get top selling products
@@ -209,42 +149,13 @@ def top_products(request):
     """
     period = request.query_params.get('period', 'month')
     limit = int(request.query_params.get('limit', 10))
-    
-    # Calculate date range
-    today = datetime.now().date()
-    if period == 'day':
-        date_from = today
-    elif period == 'week':
-        date_from = today - timedelta(days=7)
-    elif period == 'month':
-        date_from = today - timedelta(days=30)
-    else:  # year
-        date_from = today - timedelta(days=365)
-    
-    top_products = SaleItem.objects.filter(
-        sale__date__gte=date_from
-    ).values(
-        'product__id', 'product__name'
-    ).annotate(
-        quantity=Sum('quantity'),
-        revenue=Sum(F('quantity') * F('unit_price'))
-    ).order_by('-revenue')[:limit]
-    
-    data = [
-        {
-            'id': item['product__id'],
-            'name': item['product__name'],
-            'quantity': float(item['quantity']),
-            'revenue': float(item['revenue']),
-        }
-        for item in top_products
-    ]
-    
-    return Response(data)
+    date_from, date_to = period_range(period)
+    return Response(DashboardSummary(date_from, date_to, limit).top_products())
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response(tags=['sales'])
 def revenue_trend(request):
     """
     Get revenue trend over time
@@ -254,44 +165,13 @@ def revenue_trend(request):
     - period: 'week', 'month', 'year' (default: 'month')
     """
     period = request.query_params.get('period', 'month')
-    
-    # Calculate date range
-    today = datetime.now().date()
-    if period == 'week':
-        date_from = today - timedelta(days=7)
-        days = 7
-    elif period == 'month':
-        date_from = today - timedelta(days=30)
-        days = 30
-    else:  # year
-        date_from = today - timedelta(days=365)
-        days = 365
-    
-    # Get daily sales
-    daily_sales = Sale.objects.filter(
-        date__range=[date_from, today]
-    ).values('date').annotate(
-        amount=Sum('total_amount')
-    ).order_by('date')
-    
-    # Create a complete dataset with all dates
-    data = []
-    for i in range(days + 1):
-        current_date = date_from + timedelta(days=i)
-        matching_sale = next(
-            (item for item in daily_sales if item['date'] == current_date),
-            None
-        )
-        data.append({
-            'date': str(current_date),
-            'amount': float(matching_sale['amount']) if matching_sale else 0,
-        })
-    
-    return Response(data)
+    date_from, date_to = period_range(period if period in ('week', 'month') else 'year')
+    return Response(DashboardSummary(date_from, date_to).revenue_trend())
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response(tags=['sales', 'partners'])
 def client_activity(request):
     """
     Get recent client activity
@@ -301,74 +181,118 @@ def client_activity(request):
     - limit: Number of clients to return (default: 10)
     """
     limit = int(request.query_params.get('limit', 10))
-    
-    # Get clients with recent sales
-    clients_with_sales = Sale.objects.values(
-        'client__id', 'client__name'
-    ).annotate(
-        last_sale_date=Max('date'),
-        total_amount=Sum('total_amount'),
-        sale_count=Count('id')
-    ).order_by('-last_sale_date')[:limit]
-    
-    data = [
-        {
-            'id': item['client__id'],
-            'name': item['client__name'],
-            'last_sale_date': str(item['last_sale_date']),
-            'total_amount': float(item['total_amount']),
-            'sale_count': item['sale_count'],
-        }
-        for item in clients_with_sales
-    ]
-    
-    return Response(data)
+    date_from, date_to = period_range('year')
+    return Response(DashboardSummary(date_from, date_to, limit).client_activity())
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response(tags=['sales', 'supplies'])
 def pending_payments(request):
     """
     Get summary of pending payments
     Endpoint: /api/dashboard/pending-payments/
     """
-    # Get pending sales
-    pending_sales = Sale.objects.filter(
-        payment_status__in=['pending', 'partial']
-    ).aggregate(
-        count=Count('id'),
-        total_amount=Coalesce(Sum('total_amount'), Value(0, output_field=DecimalField())),
-        paid_amount=Coalesce(Sum('paid_amount'), Value(0, output_field=DecimalField()))
+    date_from, date_to = period_range('year')
+    return Response(DashboardSummary(date_from, date_to).pending_payments())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def valuation_history(request):
+    """
+    Get stock valuation over time from the valuation snapshots
+    Endpoint: /api/dashboard/valuation-history/
+    
+    Query Parameters:
+    - start_date, end_date: Range (YYYY-MM-DD, default: the last 365 days)
+    - zone: Zone ID
+    - category: Product category ID
+    - group_by: 'zone' or 'category' to split each date (default: totals)
+    """
+    group_by = request.query_params.get('group_by') or None
+    if group_by and group_by not in VALUATION_GROUPS:
+        return Response(
+            {'error': "group_by must be 'zone' or 'category'"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        date_from, date_to = period_range(
+            'custom', request.query_params.get('start_date'), request.query_params.get('end_date')
+        )
+    except ValueError:
+        return Response(
+            {'error': 'start_date/end_date must be dates (YYYY-MM-DD)'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    rows = snapshot_history(
+        date_from, date_to,
+        zone=request.query_params.get('zone'),
+        category=request.query_params.get('category'),
+        group_by=group_by,
     )
+    data = []
+    for row in rows:
+        point = {'date': str(row['date'])}
+        if group_by == 'zone':
+            point['zone_id'] = row['zone_id']
+            point['zone'] = reference_data.reference_name(Zone, row['zone_id'], 'Sans zone')
+        elif group_by == 'category':
+            point['category_id'] = row['category_id']
+            point['category'] = reference_data.reference_name(
+                ProductCategory, row['category_id'], 'Sans catégorie'
+            )
+        point.update({name: float(row[name]) for name in VALUATION_FIELDS})
+        data.append(point)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_response(tags=['sales', 'supplies'])
+def aging(request):
+    """
+    Get receivables (clients) or payables (suppliers) aging by partner
+    Endpoint: /api/dashboard/aging/
     
-    # Calculate outstanding amount
-    outstanding_amount = pending_sales['total_amount'] - pending_sales['paid_amount']
+    Query Parameters:
+    - partner_type: 'client' or 'supplier' (default: 'client')
+    - as_of: Reference date (YYYY-MM-DD, default: today)
+    - ordering: 'exposure', 'name', 'documents', 'days_0_30', 'days_31_60',
+      'days_61_90' or 'days_over_90', prefixed with '-' for descending
+      (default: '-exposure')
+    - page, page_size: Pagination
+    """
+    partner_type = request.query_params.get('partner_type', 'client')
+    if partner_type not in AGING_SOURCES:
+        return Response(
+            {'error': "partner_type must be 'client' or 'supplier'"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    # Get pending supplies
-    from apps.inventory.models import StockSupply
-    pending_supplies = StockSupply.objects.filter(
-        payment_status__in=['pending', 'partial']
-    ).aggregate(
-        count=Count('id'),
-        total_amount=Coalesce(Sum('total_amount'), Value(0, output_field=DecimalField())),
-        paid_amount=Coalesce(Sum('paid_amount'), Value(0, output_field=DecimalField()))
-    )
+    try:
+        as_of_param = request.query_params.get('as_of')
+        as_of = datetime.strptime(as_of_param, '%Y-%m-%d').date() if as_of_param else datetime.now().date()
+    except ValueError:
+        return Response(
+            {'error': 'as_of must be a date (YYYY-MM-DD)'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    # Calculate outstanding supply amount
-    outstanding_supply_amount = pending_supplies['total_amount'] - pending_supplies['paid_amount']
+    rows = aging_report(partner_type, as_of, request.query_params.get('ordering', '-exposure'))
     
-    return Response({
-        'sales': {
-            'count': pending_sales['count'],
-            'total_amount': float(pending_sales['total_amount']),
-            'paid_amount': float(pending_sales['paid_amount']),
-            'outstanding_amount': float(outstanding_amount),
-        },
-        'supplies': {
-            'count': pending_supplies['count'],
-            'total_amount': float(pending_supplies['total_amount']),
-            'paid_amount': float(pending_supplies['paid_amount']),
-            'outstanding_amount': float(outstanding_supply_amount),
-        },
-        'total_outstanding': float(outstanding_amount + outstanding_supply_amount),
-    })
+    paginator = AgingPagination()
+    page = paginator.paginate_queryset(rows, request)
+    data = [
+        {
+            'partner_id': row['partner_id'],
+            'partner_name': row['partner_name'],
+            'document_count': row['document_count'],
+            'total_outstanding': float(row['total_outstanding']),
+            **{name: float(row[name]) for name, _, _ in AGING_BUCKETS},
+        }
+        for row in page
+    ]
+    return paginator.get_paginated_response(data)
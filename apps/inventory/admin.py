@@ -1,8 +1,9 @@
 from django.contrib import admin
+from apps.core import reference_data
 from .models import (
     Product, Stock, StockSupply, StockSupplyItem, StockCard,
     StockTransfer, StockTransferItem, Inventory, InventoryItem, 
-    StockReturn, StockReturnItem
+    StockReturn, StockReturnItem, StockCheckpoint
 )
 
 
@@ -29,11 +30,15 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
-    list_display = ('product', 'zone', 'quantity', 'updated_at')
+    list_display = ('product', 'zone', 'quantity', 'unit_symbol', 'updated_at')
     search_fields = ('product__name', 'zone__name')
     list_filter = ('zone', 'updated_at')
     readonly_fields = ('updated_at',)
     
+    @admin.display(description='Unité')
+    def unit_symbol(self, obj):
+        return reference_data.unit_symbol(obj.product)
+    
     def has_add_permission(self, request):
         # Stock should be created automatically
         return False
@@ -78,17 +83,34 @@ class StockSupplyItemAdmin(admin.ModelAdmin):
 
 @admin.register(StockCard)
 class StockCardAdmin(admin.ModelAdmin):
-    list_display = ('product', 'zone', 'date', 'transaction_type', 'reference', 'quantity_in', 'quantity_out')
+    list_display = ('product', 'zone', 'date', 'transaction_type', 'reference', 'quantity_in', 'quantity_out', 'unit_symbol')
     search_fields = ('product__name', 'zone__name', 'reference', 'notes')
     list_filter = ('transaction_type', 'date', 'zone')
     date_hierarchy = 'date'
     readonly_fields = ('date',)
     
+    @admin.display(description='Unité')
+    def unit_symbol(self, obj):
+        return reference_data.unit_symbol(obj.product)
+    
     def has_add_permission(self, request):
         # Stock cards should be created automatically
         return False
 
 
+@admin.register(StockCheckpoint)
+class StockCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('product', 'zone', 'date', 'quantity', 'updated_at')
+    search_fields = ('product__name', 'zone__name')
+    list_filter = ('date', 'zone')
+    date_hierarchy = 'date'
+    readonly_fields = ('product', 'zone', 'date', 'quantity', 'updated_at')
+
+    def has_add_permission(self, request):
+        # Checkpoints are built by build_stock_checkpoints
+        return False
+
+
 class StockTransferItemInline(admin.TabularInline):
     model = StockTransferItem
     extra = 1
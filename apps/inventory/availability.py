@@ -0,0 +1,82 @@
+"""
+Stock availability
+Checks a whole cart of (product, zone, quantity) lines against Stock in one query
+"""
+
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework import serializers
+
+from apps.core import reference_data
+from apps.core.models import Zone
+
+from .models import Stock
+
+
+StockLine = namedtuple('StockLine', ['product_id', 'zone_id', 'quantity'])
+
+
+def check_availability(lines):
+    """
+    Return one result per line: product_id, zone_id, requested_quantity,
+    current_stock, available and shortfall.
+
+    Lines for the same product and zone draw on the same stock, so their
+    availability and shortfall are computed on the cart total for that pair.
+    Every stock row is read in a single query; a missing row counts as zero.
+    """
+    lines = [
+        StockLine(int(line.product_id), int(line.zone_id), Decimal(str(line.quantity)))
+        for line in lines
+    ]
+    if not lines:
+        return []
+
+    requested = defaultdict(Decimal)
+    for line in lines:
+        requested[(line.product_id, line.zone_id)] += line.quantity
+
+    rows = Q()
+    for product_id, zone_id in requested:
+        rows |= Q(product_id=product_id, zone_id=zone_id)
+    stock = {
+        (product_id, zone_id): (quantity, product_name)
+        for product_id, zone_id, quantity, product_name in Stock.objects.filter(rows).values_list(
+            'product_id', 'zone_id', 'quantity', 'product__name'
+        )
+    }
+
+    results = []
+    for line in lines:
+        key = (line.product_id, line.zone_id)
+        current, product_name = stock.get(key, (Decimal('0.00'), None))
+        shortfall = max(requested[key] - current, Decimal('0.00'))
+        results.append({
+            'product_id': line.product_id,
+            'zone_id': line.zone_id,
+            'product_name': product_name,
+            'zone_name': reference_data.reference_name(Zone, line.zone_id),
+            'requested_quantity': line.quantity,
+            'current_stock': current,
+            'available': shortfall == 0,
+            'shortfall': shortfall,
+        })
+    return results
+
+
+def shortage_error(exc, field='items'):
+    """
+    The 400 for the InsufficientStock of a guarded stock write: one message
+    per short line on `field`. Write paths let apply_movements do the check
+    and raise this instead of reading stock beforehand.
+    """
+    return serializers.ValidationError({field: [
+        _shortage_message(shortage.product.name, shortage.available, shortage.requested - shortage.available)
+        for shortage in exc.shortages
+    ]})
+
+
+def _shortage_message(product_name, available, missing):
+    return f"Insufficient stock for {product_name}: {available} available, {missing} missing"
@@ -0,0 +1,156 @@
+"""
+Stock checkpoints
+Month-end closing quantities per (product, zone) so past stock is summed from the nearest checkpoint
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import StockCard, StockCheckpoint
+
+
+# Postgres advisory lock key serialising checkpoint builds against backdated movements
+CHECKPOINT_LOCK = 0x5354434b
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def last_closed_month_end(today=None):
+    """Last day of the month before `today`: the latest month checkpoints may close"""
+    return (today or timezone.now().date()).replace(day=1) - timedelta(days=1)
+
+
+def _net(queryset, *keys, **expressions):
+    return queryset.values(*keys, **expressions).annotate(net=Sum(F('quantity_in') - F('quantity_out'))).order_by()
+
+
+def build_checkpoints(until=None, rebuild=False):
+    """
+    Write the checkpoints of every closed month up to the month of `until`
+    (default: last month) and return the number of rows written.
+
+    Starts from the latest existing checkpoint and only reads the cards
+    after it, unless `rebuild`, which starts over from the first card.
+    Pairs holding no stock at a month end get no row. Each month's rows are
+    written as soon as they are known.
+
+    Runs in one transaction holding CHECKPOINT_LOCK: a backdated movement
+    either commits before the cards are read, or waits and carries its cards
+    into the checkpoints written here.
+    """
+    until = month_end(min(until or last_closed_month_end(), last_closed_month_end()))
+    written = 0
+
+    with transaction.atomic():
+        _lock_checkpoints(shared=False)
+        if rebuild:
+            StockCheckpoint.objects.all().delete()
+        latest = StockCheckpoint.objects.aggregate(latest=Max('date'))['latest']
+
+        balances = defaultdict(Decimal)
+        cards = StockCard.objects.filter(date__lte=until)
+        if latest:
+            for product_id, zone_id, quantity in StockCheckpoint.objects.filter(date=latest).values_list(
+                'product_id', 'zone_id', 'quantity'
+            ):
+                balances[(product_id, zone_id)] = quantity
+            cards = cards.filter(date__gt=latest)
+
+        monthly = defaultdict(list)
+        for row in _net(cards, 'product_id', 'zone_id', month=TruncMonth('date')):
+            monthly[month_end(row['month'])].append(row)
+
+        day = month_end(latest + timedelta(days=1)) if latest else min(monthly, default=until + timedelta(days=1))
+        while day <= until:
+            for row in monthly.pop(day, []):
+                balances[(row['product_id'], row['zone_id'])] += row['net']
+            rows = StockCheckpoint.objects.bulk_create([
+                StockCheckpoint(product_id=product_id, zone_id=zone_id, date=day, quantity=quantity)
+                for (product_id, zone_id), quantity in balances.items() if quantity
+            ], batch_size=1000)
+            written += len(rows)
+            day = month_end(day + timedelta(days=1))
+    return written
+
+
+def carry_into_checkpoints(cards, today=None, removed=()):
+    """
+    Add cards dated in an already closed month to the checkpoints closed on
+    or after their date, and take `removed` cards (deleted, or the stored
+    version of an edited card) back out. Cards of the current month, the
+    usual case, cost nothing: no checkpoint covers them yet.
+    """
+    date_field = StockCard._meta.get_field('date')
+    month_start = (today or timezone.now().date()).replace(day=1)
+    deltas = defaultdict(Decimal)
+    for sign, group in ((1, cards), (-1, removed)):
+        for card in group:
+            day = date_field.to_python(card.date)
+            if day < month_start:
+                deltas[(card.product_id, card.zone_id, day)] += sign * (card.quantity_in - card.quantity_out)
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    # Shared with other movements, exclusive against a running build_checkpoints()
+    _lock_checkpoints(shared=True)
+    closed = list(StockCheckpoint.objects.filter(
+        date__gte=min(day for _, _, day in deltas)
+    ).values_list('date', flat=True).distinct())
+    for (product_id, zone_id, day), delta in deltas.items():
+        dates = [checkpoint for checkpoint in closed if checkpoint >= day]
+        if not dates:
+            continue
+        StockCheckpoint.objects.bulk_create(
+            [StockCheckpoint(product_id=product_id, zone_id=zone_id, date=checkpoint) for checkpoint in dates],
+            ignore_conflicts=True,
+        )
+        StockCheckpoint.objects.filter(product_id=product_id, zone_id=zone_id, date__in=dates).update(
+            quantity=F('quantity') + delta
+        )
+
+
+def _lock_checkpoints(shared):
+    """Take CHECKPOINT_LOCK until the end of the current transaction"""
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {function}(%s)', [CHECKPOINT_LOCK])
+
+
+def stock_as_of(day, zone=None, product=None):
+    """
+    Return (checkpoint date, {(product_id, zone_id): quantity}) at the end
+    of `day`, optionally for one zone or product.
+
+    Reads the latest checkpoint on or before `day` and the cards dated
+    after it, so a whole zone costs at most one month of cards. Without
+    checkpoints every card up to `day` is summed and the date is None.
+    """
+    filters = {}
+    if zone:
+        filters['zone_id'] = zone
+    if product:
+        filters['product_id'] = product
+
+    checkpoint = StockCheckpoint.objects.filter(date__lte=day).aggregate(latest=Max('date'))['latest']
+    quantities = defaultdict(Decimal)
+    cards = StockCard.objects.filter(date__lte=day, **filters)
+    if checkpoint:
+        for product_id, zone_id, quantity in StockCheckpoint.objects.filter(date=checkpoint, **filters).values_list(
+            'product_id', 'zone_id', 'quantity'
+        ):
+            quantities[(product_id, zone_id)] = quantity
+        cards = cards.filter(date__gt=checkpoint)
+
+    for row in _net(cards, 'product_id', 'zone_id'):
+        quantities[(row['product_id'], row['zone_id'])] += row['net']
+    return checkpoint, {key: quantity for key, quantity in quantities.items() if quantity}
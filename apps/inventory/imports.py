@@ -0,0 +1,262 @@
+"""
+Product catalogue import
+Loads products and opening stock from CSV in validated, bulk-written chunks
+"""
+
+import csv
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.app_settings.models import ProductCategory, UnitOfMeasure
+from apps.core import reference_data
+from apps.core.caching import invalidate_tags
+from apps.core.sequences import reserve_references
+
+from .models import Product, Stock
+from .movements import StockMovement, apply_movements
+
+
+IMPORT_COLUMNS = [
+    'reference', 'name', 'category', 'unit', 'purchase_price', 'selling_price',
+    'min_stock_level', 'is_raw_material', 'description', 'quantity',
+]
+REQUIRED_COLUMNS = ['name']
+DECIMAL_COLUMNS = ['purchase_price', 'selling_price', 'min_stock_level']
+
+OPENING_STOCK_REFERENCE = 'STOCK-INITIAL'
+
+TRUE_VALUES = {'1', 'true', 'yes', 'oui', 'vrai'}
+FALSE_VALUES = {'0', 'false', 'no', 'non', 'faux'}
+
+ImportRow = namedtuple('ImportRow', ['number', 'reference', 'fields', 'quantity'])
+
+ImportResult = namedtuple('ImportResult', ['rows', 'created', 'updated', 'stocked', 'errors'])
+
+
+def _decimal(value, field):
+    """
+    Parse a non-negative number for the DecimalField `field`, rounded to its
+    decimal places as Django does on save. None when it is not a number or
+    has more integer digits than the column holds.
+    """
+    try:
+        number = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        return None
+    if not number.is_finite() or number < 0 or number >= _decimal_limit(field):
+        return None
+    number = number.quantize(Decimal(1).scaleb(-field.decimal_places))
+    return number if number < _decimal_limit(field) else None
+
+
+def _decimal_limit(field):
+    return Decimal(10) ** (field.max_digits - field.decimal_places)
+
+
+def _decimal_error(column, field):
+    return f"{column} must be a positive number below {_decimal_limit(field):,}"
+
+
+def _lookups():
+    """Category and unit lookup tables from the reference data cache"""
+    categories = {
+        category.name.strip().lower(): category
+        for category in reference_data.get_table(ProductCategory).values()
+    }
+    units = {}
+    for unit in reference_data.get_table(UnitOfMeasure).values():
+        units[unit.name.strip().lower()] = unit
+        units[unit.symbol.strip().lower()] = unit
+    return categories, units
+
+
+def parse_row(number, row, categories, units, zone):
+    """
+    Validate one CSV row. Return (ImportRow, []) or (None, errors).
+    Blank optional cells are left out of `fields`, so updating an existing
+    product only overwrites the columns that were filled in.
+    """
+    row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+    errors = []
+    fields = {}
+
+    name = row.get('name', '')
+    if not name:
+        errors.append("name is required")
+    elif len(name) > 100:
+        errors.append("name is longer than 100 characters")
+    else:
+        fields['name'] = name
+
+    reference = row.get('reference') or None
+    if reference and len(reference) > 50:
+        errors.append("reference is longer than 50 characters")
+
+    if row.get('category'):
+        category = categories.get(row['category'].lower())
+        if category is None:
+            errors.append(f"unknown category '{row['category']}'")
+        fields['category'] = category
+    if row.get('unit'):
+        unit = units.get(row['unit'].lower())
+        if unit is None:
+            errors.append(f"unknown unit '{row['unit']}'")
+        fields['unit'] = unit
+
+    for column in DECIMAL_COLUMNS:
+        if row.get(column):
+            field = Product._meta.get_field(column)
+            value = _decimal(row[column], field)
+            if value is None:
+                errors.append(_decimal_error(column, field))
+            fields[column] = value
+
+    if row.get('is_raw_material'):
+        flag = row['is_raw_material'].lower()
+        if flag not in TRUE_VALUES | FALSE_VALUES:
+            errors.append("is_raw_material must be true or false")
+        fields['is_raw_material'] = flag in TRUE_VALUES
+    if row.get('description'):
+        fields['description'] = row['description']
+
+    quantity = None
+    if row.get('quantity'):
+        field = Stock._meta.get_field('quantity')
+        quantity = _decimal(row['quantity'], field)
+        if quantity is None:
+            errors.append(_decimal_error('quantity', field))
+        elif zone is None:
+            errors.append("a zone is required to import opening stock")
+
+    if errors:
+        return None, errors
+    return ImportRow(number, reference, fields, quantity), []
+
+
+def import_products(lines, zone=None, user=None, chunk_size=1000, dry_run=False):
+    """
+    Import products, and their opening stock in `zone`, from CSV lines.
+
+    Rows whose reference matches an existing product update it, the others
+    create products; new products without a reference get a block of
+    PROD-xxxx numbers from the sequence allocator, skipping the numbers
+    already in the table or in the file so far. A later row carrying a
+    number handed out earlier in the import is rejected rather than
+    updating that new product. A `quantity` sets the
+    product's stock in `zone`, the difference being recorded as an
+    inventory movement on the stock card, so re-importing a file is
+    harmless. Each chunk costs a fixed number of queries and is written in
+    its own transaction. Invalid rows are skipped and reported as
+    {'row': line number, 'errors': [...]}; with `dry_run` nothing is written.
+    """
+    reader = csv.DictReader(lines)
+    header = [column.strip().lower() for column in reader.fieldnames or []]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        return ImportResult(0, 0, 0, 0, [{'row': 1, 'errors': [f"missing column '{c}'" for c in missing]}])
+
+    categories, units = _lookups()
+    errors = []
+    seen = set()
+    allocated = set()
+    totals = [0, 0, 0]
+    rows = 0
+    chunk = []
+
+    for number, row in enumerate(reader, start=2):
+        rows += 1
+        parsed, row_errors = parse_row(number, row, categories, units, zone)
+        if parsed and parsed.reference:
+            if parsed.reference in seen:
+                row_errors = [f"reference '{parsed.reference}' appears twice in the file"]
+            elif parsed.reference in allocated:
+                row_errors = [f"reference '{parsed.reference}' was given to a product created by an earlier row"]
+            seen.add(parsed.reference)
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+            continue
+        chunk.append(parsed)
+        if len(chunk) >= chunk_size:
+            totals = [a + b for a, b in zip(totals, import_chunk(chunk, zone, user, dry_run, seen, allocated))]
+            chunk = []
+    if chunk:
+        totals = [a + b for a, b in zip(totals, import_chunk(chunk, zone, user, dry_run, seen, allocated))]
+
+    return ImportResult(rows, *totals, errors)
+
+
+def import_chunk(rows, zone, user, dry_run=False, taken=frozenset(), allocated=None):
+    """
+    Write one chunk of validated rows, returning (created, updated, stocked).
+    Allocated references skip those in `taken` and are added to `allocated`.
+    """
+    existing = Product.objects.in_bulk(
+        [row.reference for row in rows if row.reference], field_name='reference'
+    )
+    new_rows = [row for row in rows if row.reference not in existing]
+    stock_rows = [row for row in rows if row.quantity is not None]
+    if dry_run:
+        return len(new_rows), len(rows) - len(new_rows), len(stock_rows)
+
+    with transaction.atomic():
+        unnumbered = [row for row in new_rows if not row.reference]
+        references = _allocate_references(len(unnumbered), taken) if unnumbered else []
+        if allocated is not None:
+            allocated.update(references)
+        references = iter(references)
+        created = Product.objects.bulk_create([
+            Product(reference=row.reference or next(references), created_by=user, **row.fields)
+            for row in new_rows
+        ])
+        products = {row.number: product for row, product in zip(new_rows, created)}
+
+        now = timezone.now()
+        changed = set()
+        for row in rows:
+            product = existing.get(row.reference)
+            if product is None:
+                continue
+            for field, value in row.fields.items():
+                setattr(product, field, value)
+            product.updated_at = now
+            changed.update(row.fields)
+            products[row.number] = product
+        invalidate_tags('stock')
+        if changed:
+            Product.objects.bulk_update(
+                [products[row.number] for row in rows if row.reference in existing],
+                sorted(changed) + ['updated_at'],
+            )
+
+        if stock_rows:
+            current = dict(Stock.objects.select_for_update().filter(
+                zone=zone, product__in=[products[row.number] for row in stock_rows]
+            ).values_list('product_id', 'quantity'))
+            movements = []
+            for row in stock_rows:
+                product = products[row.number]
+                delta = row.quantity - current.get(product.pk, Decimal('0.00'))
+                if delta:
+                    movements.append(StockMovement(
+                        product, zone, delta, 'inventory', OPENING_STOCK_REFERENCE, "Stock initial (import)"
+                    ))
+            apply_movements(movements, allow_negative=True)
+
+    return len(new_rows), len(rows) - len(new_rows), len(stock_rows)
+
+
+def _allocate_references(count, taken):
+    """
+    `count` PROD-xxxx references from the sequence. A number typed into a
+    file or saved by hand is unknown to the sequence: those already in the
+    table or in `taken` are skipped and replaced from the next block.
+    """
+    references = []
+    while len(references) < count:
+        block = reserve_references(Product, 'PROD', count - len(references), width=4, yearly=False)
+        used = taken | set(Product.objects.filter(reference__in=block).values_list('reference', flat=True))
+        references += [reference for reference in block if reference not in used]
+    return references
@@ -0,0 +1,207 @@
+"""
+Product QR labels
+Renders QR codes through a content-addressed disk cache and packs them as a ZIP or a printable sheet
+"""
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import qrcode
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont, TiffImagePlugin
+
+
+# Part of the cache key: bump it when the rendering parameters change
+RENDER_VERSION = 'v1-H-10-4'
+
+# Largest selection a single request may ask for
+MAX_LABELS = 5000
+
+# Fewer misses than this are rendered inline, a pool would cost more than it saves
+POOL_THRESHOLD = 16
+
+# Characters kept in ZIP entry names
+ENTRY_NAME_CHARS = 'A-Za-z0-9._-'
+
+# A4 at 150 dpi
+SHEET_DPI = 150
+SHEET_SIZE = (1240, 1754)
+SHEET_MARGIN = 60
+SHEET_COLUMNS = 4
+SHEET_ROWS = 6
+CAPTION_HEIGHT = 36
+# Sheets larger than this spill from memory to a temporary file
+SHEET_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+# (pid, size) and ProcessPoolExecutor of the render pool, see _render_pool()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_qr_png(data):
+    """Render `data` as a QR code PNG, with the parameters of the single label endpoint"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _cache_path(data):
+    digest = hashlib.sha256(f'{RENDER_VERSION}:{data}'.encode()).hexdigest()
+    return os.path.join(settings.QR_LABEL_CACHE_DIR, digest[:2], f'{digest}.png')
+
+
+def _write(path, content):
+    """Write through a temporary file and rename, so readers never see half a PNG"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(content)
+    os.replace(tmp_path, path)
+
+
+def qr_pngs(references):
+    """
+    Return {reference: PNG bytes}.
+
+    Images live on disk under QR_LABEL_CACHE_DIR, named after a hash of
+    their content, so every worker process shares them and a changed
+    reference simply maps to a new file. Misses are rendered in the
+    process's render pool when there are enough of them to pay for it.
+    """
+    images = {}
+    misses = []
+    for reference in dict.fromkeys(references):
+        try:
+            with open(_cache_path(reference), 'rb') as cached:
+                images[reference] = cached.read()
+        except FileNotFoundError:
+            misses.append(reference)
+
+    workers = settings.QR_LABEL_WORKERS
+    rendered = None
+    if workers > 1 and len(misses) >= POOL_THRESHOLD:
+        try:
+            rendered = list(_render_pool().map(
+                render_qr_png, misses, chunksize=max(1, len(misses) // (workers * 4))
+            ))
+        except BrokenProcessPool:
+            _discard_pool()
+    if rendered is None:
+        rendered = [render_qr_png(reference) for reference in misses]
+
+    for reference, content in zip(misses, rendered):
+        _write(_cache_path(reference), content)
+        images[reference] = content
+    return images
+
+
+def _render_pool():
+    """
+    The render pool of this process, started by the first batch that needs
+    it and reused by every later request, so a web worker pays for its
+    render processes once rather than per request. A forked child starts
+    its own.
+    """
+    global _pool
+    key = (os.getpid(), settings.QR_LABEL_WORKERS)
+    with _pool_lock:
+        if _pool is None or _pool[0] != key:
+            if _pool is not None and _pool[0][0] == key[0]:
+                _pool[1].shutdown(wait=False)
+            _pool = (key, ProcessPoolExecutor(max_workers=key[1]))
+        return _pool[1]
+
+
+def _discard_pool():
+    """Drop a pool whose processes died; the next batch starts a new one"""
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def qr_png(reference):
+    """PNG bytes of a single reference's QR code"""
+    return qr_pngs([reference])[reference]
+
+
+def build_zip(products):
+    """ZIP archive with one `<reference>.png` per product"""
+    images = qr_pngs([product.reference for product in products])
+    buffer = io.BytesIO()
+    names = set()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for reference, content in images.items():
+            archive.writestr(_entry_name(reference, names), content)
+    return buffer.getvalue()
+
+
+def _entry_name(reference, names):
+    """
+    A flat, unique `<reference>.png` entry name: references are free text,
+    and '/' or '..' in one must not become a path when the archive is
+    extracted. Characters outside ENTRY_NAME_CHARS become '_'.
+    """
+    stem = re.sub(rf'[^{ENTRY_NAME_CHARS}]+', '_', os.path.basename(reference)).lstrip('.') or 'label'
+    name, suffix = f'{stem}.png', 1
+    while name in names:
+        suffix += 1
+        name = f'{stem}-{suffix}.png'
+    names.add(name)
+    return name
+
+
+def build_sheet(products, columns=SHEET_COLUMNS, rows=SHEET_ROWS):
+    """
+    Multi-page A4 PDF with the labels tiled `columns` x `rows` per page,
+    captioned with reference and name, in a rewound temporary file.
+
+    Pages are 1-bit and appended one at a time to a temporary multi-page
+    TIFF, which Pillow then converts to PDF frame by frame: one page is in
+    memory at a time whatever the selection size, and the response can
+    stream the file.
+    """
+    images = qr_pngs([product.reference for product in products])
+    font = ImageFont.load_default()
+    tile_width = (SHEET_SIZE[0] - 2 * SHEET_MARGIN) // columns
+    tile_height = (SHEET_SIZE[1] - 2 * SHEET_MARGIN) // rows
+    side = min(tile_width, tile_height - CAPTION_HEIGHT)
+
+    per_page = columns * rows
+    with tempfile.TemporaryFile() as pages:
+        with TiffImagePlugin.AppendingTiffWriter(pages, new=True) as tiff:
+            for start in range(0, max(len(products), 1), per_page):
+                page = Image.new('L', SHEET_SIZE, 255)
+                draw = ImageDraw.Draw(page)
+                for index, product in enumerate(products[start:start + per_page]):
+                    left = SHEET_MARGIN + (index % columns) * tile_width
+                    top = SHEET_MARGIN + (index // columns) * tile_height
+                    with Image.open(io.BytesIO(images[product.reference])) as qr_image:
+                        qr_image = qr_image.convert('L').resize((side, side), Image.Resampling.NEAREST)
+                        page.paste(qr_image, (left + (tile_width - side) // 2, top))
+                    draw.text((left + 8, top + side + 2), product.reference, fill=0, font=font)
+                    draw.text((left + 8, top + side + 16), product.name[:40], fill=0, font=font)
+                page.convert('1', dither=Image.Dither.NONE).save(tiff, 'TIFF', compression='packbits')
+                tiff.newFrame()
+
+        pages.seek(0)
+        output = tempfile.SpooledTemporaryFile(max_size=SHEET_SPOOL_SIZE)
+        with Image.open(pages) as sheet:
+            sheet.save(output, 'PDF', save_all=True, resolution=SHEET_DPI)
+    output.seek(0)
+    return output
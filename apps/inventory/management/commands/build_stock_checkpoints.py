@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.inventory.checkpoints import build_checkpoints
+
+
+class Command(BaseCommand):
+    help = "Write the month-end stock checkpoints (StockCheckpoint) of the closed months; schedule it monthly"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', help="Last month to close (YYYY-MM-DD, default: last month)")
+        parser.add_argument('--rebuild', action='store_true', help="Drop the checkpoints and rebuild them from every stock card")
+
+    def handle(self, *args, **options):
+        try:
+            until = datetime.strptime(options['until'], '%Y-%m-%d').date() if options['until'] else None
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+
+        count = build_checkpoints(until, rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} stock checkpoint rows"))
@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Zone
+from apps.inventory.imports import import_products
+
+
+class Command(BaseCommand):
+    help = "Import products and opening stock from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row (name, reference, category, unit, ..., quantity)")
+        parser.add_argument('--zone', type=int, help="Zone receiving the opening stock (quantity column)")
+        parser.add_argument('--user', help="Username recorded as creator of the products")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows written per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without writing")
+
+    def handle(self, *args, **options):
+        zone = user = None
+        try:
+            if options['zone']:
+                zone = Zone.objects.get(pk=options['zone'])
+            if options['user']:
+                user = User.objects.get(username=options['user'])
+        except (Zone.DoesNotExist, User.DoesNotExist) as exc:
+            raise CommandError(str(exc))
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                result = import_products(
+                    lines, zone=zone, user=user,
+                    chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in result.errors:
+            self.stdout.write(f"  row {error['row']}: {'; '.join(error['errors'])}")
+        summary = (
+            f"{result.rows} rows: {result.created} products created, {result.updated} updated, "
+            f"{result.stocked} opening stock lines, {len(result.errors)} rejected"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run: {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_inventory_stockreturn_stocktransfer_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockcard',
+            index=models.Index(fields=['date', 'id'], name='stockcard_date_id_idx'),
+        ),
+    ]
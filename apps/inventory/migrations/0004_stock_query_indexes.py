@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_stockcard_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockcard',
+            index=models.Index(fields=['product', 'zone', 'date'], name='stockcard_product_zone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksupply',
+            index=models.Index(fields=['supplier', 'payment_status'], name='stocksupply_supplier_pay_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('inventory', '0004_stock_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='inventory.product')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='core.zone')),
+            ],
+            options={
+                'verbose_name': 'Clôture de stock',
+                'verbose_name_plural': 'Clôtures de stock',
+                'ordering': ['date', 'product', 'zone'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(fields=('date', 'product', 'zone'), name='unique_stock_checkpoint'),
+        ),
+    ]
@@ -1,9 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from apps.app_settings.models import ProductCategory, UnitOfMeasure
+from apps.core import reference_data
 from apps.core.models import Zone
+from apps.core.sequences import save_with_reference
 
 
 class Product(models.Model):
@@ -47,11 +49,7 @@ class Product(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.reference:
-            last_product = Product.objects.order_by('id').last()
-            if last_product:
-                self.reference = f"PROD-{last_product.id + 1:04d}"
-            else:
-                self.reference = "PROD-0001"
+            return save_with_reference(self, 'PROD', super().save, *args, width=4, yearly=False, **kwargs)
         super().save(*args, **kwargs)
 
     def generate_reference(self):
@@ -111,13 +109,9 @@ class Stock(models.Model):
     )
     
     def __str__(self):
-        try:
-            unit_obj = UnitOfMeasure.objects.get(id=self.product.unit.id)
-            unit_symbol = unit_obj.symbol
-        except (UnitOfMeasure.DoesNotExist, AttributeError, Exception):
-            unit_symbol = ""
-            
-        return f"{self.product.name} - {self.zone.name} - {self.quantity} {unit_symbol}"
+        unit_symbol = reference_data.unit_symbol(self.product)
+        zone_name = reference_data.reference_name(Zone, self.zone_id, "")
+        return f"{self.product.name} - {zone_name} - {self.quantity} {unit_symbol}"
     
     class Meta:
         db_table = 'gestion_api_stock'
@@ -162,12 +156,7 @@ class SupplyItem(models.Model):
     total_price = models.DecimalField(max_digits=15, decimal_places=2)
     
     def __str__(self):
-        try:
-            unit_obj = UnitOfMeasure.objects.get(id=self.product.unit.id)
-            unit_symbol = unit_obj.symbol
-        except (UnitOfMeasure.DoesNotExist, AttributeError, Exception):
-            unit_symbol = ""
-            
+        unit_symbol = reference_data.unit_symbol(self.product)
         return f"{self.product.name} - {self.quantity} {unit_symbol}"
     
     class Meta:
@@ -241,6 +230,9 @@ class StockSupply(models.Model):
         db_table = 'gestion_api_stocksupply'
         verbose_name = "Approvisionnement"
         verbose_name_plural = "Approvisionnements"
+        indexes = [
+            models.Index(fields=['supplier', 'payment_status'], name='stocksupply_supplier_pay_idx'),
+        ]
 
 
 class StockSupplyItem(models.Model):
@@ -280,12 +272,7 @@ class StockSupplyItem(models.Model):
     )
     
     def __str__(self):
-        try:
-            unit_obj = UnitOfMeasure.objects.get(id=self.product.unit.id)
-            unit_symbol = unit_obj.symbol
-        except (UnitOfMeasure.DoesNotExist, AttributeError, Exception):
-            unit_symbol = ""
-            
+        unit_symbol = reference_data.unit_symbol(self.product)
         return f"{self.product.name} ({self.quantity} {unit_symbol})"
     
     class Meta:
@@ -325,12 +312,62 @@ class StockCard(models.Model):
     
     def __str__(self):
         return f"Fiche {self.product.name} - {self.date} - {self.get_transaction_type_display()}"
+
+    def save(self, *args, **kwargs):
+        """
+        Cards saved one by one (API, admin) are carried into the closed
+        checkpoints, the stored version of an edited card taken back out.
+        apply_movements() bulk-creates its cards and carries them itself.
+        """
+        from .checkpoints import carry_into_checkpoints
+        from .movements import lock_card_writes
+
+        with transaction.atomic():
+            lock_card_writes()
+            stored = StockCard.objects.filter(pk=self.pk).first() if self.pk else None
+            super().save(*args, **kwargs)
+            carry_into_checkpoints([self], removed=[stored] if stored else [])
+
+    def delete(self, *args, **kwargs):
+        from .checkpoints import carry_into_checkpoints
+
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            carry_into_checkpoints([], removed=[self])
+        return result
     
     class Meta:
         db_table = 'gestion_api_stockcard'
         verbose_name = "Fiche de stock"
         verbose_name_plural = "Fiches de stock"
         ordering = ['product', 'zone', '-date']
+        indexes = [
+            models.Index(fields=['date', 'id'], name='stockcard_date_id_idx'),
+            models.Index(fields=['product', 'zone', 'date'], name='stockcard_product_zone_idx'),
+        ]
+
+
+class StockCheckpoint(models.Model):
+    """
+    Quantité en stock d'un produit dans une zone à la clôture d'un mois
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_checkpoints')
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='stock_checkpoints')
+    # Last day of the month the quantity closes
+    date = models.DateField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product.name} - {self.date}: {self.quantity}"
+
+    class Meta:
+        verbose_name = "Clôture de stock"
+        verbose_name_plural = "Clôtures de stock"
+        ordering = ['date', 'product', 'zone']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product', 'zone'], name='unique_stock_checkpoint'),
+        ]
 
 
 class StockTransfer(models.Model):
@@ -370,11 +407,7 @@ class StockTransferItem(models.Model):
     transferred_quantity = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)], default=0)
     
     def __str__(self):
-        try:
-            unit_symbol = self.product.unit.symbol if self.product.unit else ""
-        except (AttributeError, Exception):
-            unit_symbol = ""
-            
+        unit_symbol = reference_data.unit_symbol(self.product)
         return f"{self.product.name} ({self.quantity} {unit_symbol})"
     
     class Meta:
@@ -421,11 +454,7 @@ class InventoryItem(models.Model):
     notes = models.TextField(blank=True)
     
     def __str__(self):
-        try:
-            unit_symbol = self.product.unit.symbol if self.product.unit else ""
-        except (AttributeError, Exception):
-            unit_symbol = ""
-            
+        unit_symbol = reference_data.unit_symbol(self.product)
         return f"{self.product.name} (Attendu: {self.expected_quantity} {unit_symbol}, Réel: {self.actual_quantity} {unit_symbol})"
     
     class Meta:
@@ -475,11 +504,7 @@ class StockReturnItem(models.Model):
     updated_at = models.DateTimeField(auto_now=True, null=True)
     
     def __str__(self):
-        try:
-            unit_symbol = self.product.unit.symbol if self.product.unit else ""
-        except (AttributeError, Exception):
-            unit_symbol = ""
-            
+        unit_symbol = reference_data.unit_symbol(self.product)
         return f"{self.product.name} - {self.quantity} {unit_symbol}"
     
     class Meta:
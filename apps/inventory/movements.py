@@ -0,0 +1,143 @@
+"""
+Stock movements
+Applies quantity changes to Stock with one guarded UPDATE and records the StockCard rows
+"""
+
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.core.caching import invalidate_tags
+
+from .checkpoints import carry_into_checkpoints
+from .models import Stock, StockCard
+
+
+StockMovement = namedtuple(
+    'StockMovement',
+    ['product', 'zone', 'delta', 'transaction_type', 'reference', 'notes', 'date'],
+    defaults=('', None),
+)
+
+
+Shortage = namedtuple('Shortage', ['product', 'zone', 'available', 'requested'])
+
+
+# Postgres advisory lock key: held shared by every transaction writing stock
+# cards, taken exclusively by stock valuation snapshots to let them finish
+CARD_WRITE_LOCK = 0x43415244
+
+
+def lock_card_writes():
+    """Hold the shared CARD_WRITE_LOCK until the current transaction ends"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock_shared(%s)', [CARD_WRITE_LOCK])
+
+
+class InsufficientStock(ValueError):
+    """
+    Raised when movements would take stock rows below zero. `shortages`
+    lists every short row; the first one is also exposed as product, zone,
+    available and requested.
+    """
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        self.product, self.zone, self.available, self.requested = shortages[0]
+        super().__init__(f"Not enough stock for product {self.product}")
+
+
+def apply_movements(movements, allow_negative=False):
+    """
+    Apply stock movements and return the new quantity per (product_id, zone_id)
+    of every row they changed.
+
+    Deltas for the same product and zone are summed and applied in a single
+    UPDATE ... SET quantity = quantity + delta ... RETURNING, so concurrent
+    movements never lose each other's changes and stock is read once, by the
+    write itself. Unless `allow_negative` is set, a decrement only matches
+    rows holding enough stock; if any row does not match, the whole call
+    rolls back with InsufficientStock. Rows an increment (or an allowed
+    decrement) needs are created at zero first; a plain decrement never
+    creates one, a missing row holding no stock. StockCard rows are written
+    in bulk; backdated ones are carried into the closed stock checkpoints.
+    """
+    movements = list(movements)
+    if not movements:
+        return {}
+
+    deltas = defaultdict(Decimal)
+    labels = {}
+    for movement in movements:
+        key = (movement.product.pk, movement.zone.pk)
+        deltas[key] += Decimal(str(movement.delta))
+        labels[key] = (movement.product, movement.zone)
+    changes = {key: delta for key, delta in deltas.items() if delta != 0}
+
+    with transaction.atomic():
+        lock_card_writes()
+        Stock.objects.bulk_create(
+            [Stock(product_id=product_id, zone_id=zone_id, quantity=Decimal('0.00'))
+             for (product_id, zone_id), delta in deltas.items() if delta >= 0 or allow_negative],
+            ignore_conflicts=True,
+        )
+
+        quantities = _update_stock(changes, allow_negative) if changes else {}
+        if len(quantities) != len(changes):
+            _raise_shortages([key for key in changes if key not in quantities], changes, labels)
+
+        today = timezone.now().date()
+        cards = StockCard.objects.bulk_create([
+            StockCard(
+                product=movement.product,
+                zone=movement.zone,
+                date=movement.date or today,
+                transaction_type=movement.transaction_type,
+                reference=movement.reference,
+                quantity_in=max(movement.delta, 0),
+                quantity_out=max(-movement.delta, 0),
+                notes=movement.notes,
+            )
+            for movement in movements
+        ])
+        carry_into_checkpoints(cards)
+        # The UPDATE above sends no signals
+        invalidate_tags('stock')
+
+    return quantities
+
+
+def _update_stock(changes, allow_negative):
+    """Apply {(product_id, zone_id): delta} and return the new quantities of the matched rows"""
+    table = connection.ops.quote_name(Stock._meta.db_table)
+    values = ', '.join(['(%s, %s, %s::numeric)'] * len(changes))
+    params = [timezone.now()]
+    for (product_id, zone_id), delta in changes.items():
+        params += [product_id, zone_id, delta]
+    guard = '' if allow_negative else ' AND (v.delta >= 0 OR s.quantity >= -v.delta)'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} AS s SET quantity = s.quantity + v.delta, updated_at = %s "
+            f"FROM (VALUES {values}) AS v(product_id, zone_id, delta) "
+            f"WHERE s.product_id = v.product_id AND s.zone_id = v.zone_id{guard} "
+            f"RETURNING s.product_id, s.zone_id, s.quantity",
+            params,
+        )
+        return {(product_id, zone_id): quantity for product_id, zone_id, quantity in cursor.fetchall()}
+
+
+def _raise_shortages(keys, changes, labels):
+    rows = Q()
+    for product_id, zone_id in keys:
+        rows |= Q(product_id=product_id, zone_id=zone_id)
+    available = {
+        (product_id, zone_id): quantity
+        for product_id, zone_id, quantity in Stock.objects.filter(rows).values_list('product_id', 'zone_id', 'quantity')
+    }
+    raise InsufficientStock([
+        Shortage(*labels[key], available.get(key, Decimal('0.00')), -changes[key])
+        for key in keys
+    ])
@@ -7,10 +7,17 @@ from .models import (
     Product, Stock, Supply, SupplyItem, StockSupply, StockSupplyItem, StockCard,
     StockTransfer, StockTransferItem, Inventory, InventoryItem, StockReturn, StockReturnItem
 )
+from .availability import shortage_error
+from .movements import InsufficientStock, StockMovement, apply_movements
+from apps.app_settings.models import ProductCategory, UnitOfMeasure
+from apps.core import reference_data
+from apps.core.fieldsets import SparseFieldsMixin
+from apps.core.models import Zone
+from apps.treasury.ledger import LedgerEntry, post_entries
 from apps.treasury.models import Account, AccountStatement
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.SerializerMethodField()
     qr_code_url = serializers.SerializerMethodField()
     unit_name = serializers.SerializerMethodField()
@@ -24,10 +31,10 @@ class ProductSerializer(serializers.ModelSerializer):
         }
     
     def get_category_name(self, obj):
-        return obj.category.name if obj.category else None
+        return reference_data.reference_name(ProductCategory, obj.category_id)
         
     def get_unit_name(self, obj):
-        return obj.unit.name if obj.unit else None
+        return reference_data.reference_name(UnitOfMeasure, obj.unit_id)
         
     def get_qr_code_url(self, obj):
         request = self.context.get('request')
@@ -36,18 +43,30 @@ class ProductSerializer(serializers.ModelSerializer):
         return None
 
 
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
-    zone_name = serializers.CharField(source='zone.name', read_only=True)
-    category_name = serializers.CharField(source='product.category.name', read_only=True)
-    unit_name = serializers.CharField(source='product.unit.name', read_only=True)
-    unit_symbol = serializers.CharField(source='product.unit.symbol', read_only=True)
+    zone_name = serializers.SerializerMethodField()
+    category_name = serializers.SerializerMethodField()
+    unit_name = serializers.SerializerMethodField()
+    unit_symbol = serializers.SerializerMethodField()
 
     class Meta:
         model = Stock
         fields = ['id', 'product', 'product_name', 'zone', 'zone_name', 'quantity', 
                  'category_name', 'unit_name', 'unit_symbol', 'updated_at']
 
+    def get_zone_name(self, obj):
+        return reference_data.reference_name(Zone, obj.zone_id)
+
+    def get_category_name(self, obj):
+        return reference_data.reference_name(ProductCategory, obj.product.category_id)
+
+    def get_unit_name(self, obj):
+        return reference_data.reference_name(UnitOfMeasure, obj.product.unit_id)
+
+    def get_unit_symbol(self, obj):
+        return reference_data.unit_symbol(obj.product) or None
+
 
 class StockSupplyItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -60,12 +79,7 @@ class StockSupplyItemSerializer(serializers.ModelSerializer):
         extra_kwargs = {'supply': {'required': False}}
     
     def get_unit_symbol(self, obj):
-        try:
-            if obj.product and obj.product.unit:
-                return obj.product.unit.symbol
-        except:
-            pass
-        return None
+        return reference_data.unit_symbol(obj.product) or None
 
     def to_representation(self, instance):
         """Custom representation to ensure ID is always included"""
@@ -73,7 +87,7 @@ class StockSupplyItemSerializer(serializers.ModelSerializer):
         return data
 
 
-class StockSupplySerializer(serializers.ModelSerializer):
+class StockSupplySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     supplier_name = serializers.SerializerMethodField()
     zone_name = serializers.SerializerMethodField()
     created_by_name = serializers.SerializerMethodField()
@@ -106,7 +120,7 @@ class StockSupplySerializer(serializers.ModelSerializer):
         return obj.supplier.name if obj.supplier else None
     
     def get_zone_name(self, obj):
-        return obj.zone.name if obj.zone else None
+        return reference_data.reference_name(Zone, obj.zone_id)
     
     def get_created_by_name(self, obj):
         return obj.created_by.username if obj.created_by else None
@@ -176,22 +190,17 @@ class StockSupplySerializer(serializers.ModelSerializer):
 
     def _update_stock_and_create_stockcard(self, supply):
         """Handles stock quantity updates and StockCard creation"""
-        for item in supply.items.all():
-            qty_in = item.received_quantity or item.quantity
-            stock, _ = Stock.objects.get_or_create(product=item.product, zone=supply.zone, defaults={'quantity': 0})
-            stock.quantity += qty_in
-            stock.save()
-
-            StockCard.objects.create(
+        apply_movements(
+            StockMovement(
                 product=item.product,
                 zone=supply.zone,
-                date=timezone.now().date(),
+                delta=item.received_quantity or item.quantity,
                 transaction_type='supply',
                 reference=supply.reference,
-                quantity_in=qty_in,
-                quantity_out=Decimal('0.00'),
-                notes=f"Supply received: {supply.reference}"
+                notes=f"Supply received: {supply.reference}",
             )
+            for item in supply.items.select_related('product')
+        )
 
     def _create_account_statement(self, supply):
         """Creates account statements for supplier and company when supply is received"""
@@ -202,22 +211,15 @@ class StockSupplySerializer(serializers.ModelSerializer):
             reference = f"SUP-{timezone.now().strftime('%Y%m%d')}-{count + 1:04d}"
             
             supplier_account = Account.objects.get(account_type='supplier', supplier=supply.supplier)
-            last_supplier_balance = AccountStatement.objects.filter(account=supplier_account).order_by('-date', '-id').first()
-            supplier_previous_balance = Decimal(last_supplier_balance.balance) if last_supplier_balance else Decimal('0.00')
-            new_supplier_balance = supplier_previous_balance + total_amount
-            
-            AccountStatement.objects.create(
-                account=supplier_account,
-                date=timezone.now().date(),
-                transaction_type='supply',
-                reference=reference,
-                description=f"Supply received {supply.reference} from {supply.supplier.name}",
-                credit=total_amount,
-                debit=0,
-                balance=new_supplier_balance
-            )
-            supplier_account.current_balance = new_supplier_balance
-            supplier_account.save(update_fields=['current_balance'])
+            entries = [
+                LedgerEntry(
+                    account=supplier_account,
+                    transaction_type='supply',
+                    reference=reference,
+                    description=f"Supply received {supply.reference} from {supply.supplier.name}",
+                    credit=total_amount,
+                ),
+            ]
 
             company_account = Account.objects.filter(
                 account_type__in=['cash', 'bank', 'internal'],
@@ -225,27 +227,20 @@ class StockSupplySerializer(serializers.ModelSerializer):
             ).first()
             
             if company_account:
-                last_company_balance = AccountStatement.objects.filter(account=company_account).order_by('-date', '-id').first()
-                company_previous_balance = Decimal(last_company_balance.balance) if last_company_balance else Decimal('0.00')
-                new_company_balance = company_previous_balance - total_amount
-                
-                AccountStatement.objects.create(
+                entries.append(LedgerEntry(
                     account=company_account,
-                    date=timezone.now().date(),
                     transaction_type='supply',
                     reference=reference,
                     description=f"Supply payment {supply.reference} to {supply.supplier.name}",
                     debit=total_amount,
-                    credit=0,
-                    balance=new_company_balance
-                )
-                company_account.current_balance = new_company_balance
-                company_account.save(update_fields=['current_balance'])
+                ))
 
+            post_entries(entries)
 
-class StockCardSerializer(serializers.ModelSerializer):
+
+class StockCardSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
-    zone_name = serializers.CharField(source='zone.name', read_only=True)
+    zone_name = serializers.SerializerMethodField()
     unit_symbol = serializers.SerializerMethodField()
 
     class Meta:
@@ -253,13 +248,11 @@ class StockCardSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_name', 'zone', 'zone_name', 'date', 'transaction_type', 'reference',
                   'quantity_in', 'quantity_out', 'unit_symbol', 'notes']
 
+    def get_zone_name(self, obj):
+        return reference_data.reference_name(Zone, obj.zone_id)
+
     def get_unit_symbol(self, obj):
-        try:
-            if obj.product and obj.product.unit:
-                return obj.product.unit.symbol
-        except:
-            pass
-        return None
+        return reference_data.unit_symbol(obj.product) or None
 
 
 class StockTransferItemSerializer(serializers.ModelSerializer):
@@ -275,15 +268,10 @@ class StockTransferItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['transfer']
     
     def get_unit_symbol(self, obj):
-        try:
-            if obj.product and obj.product.unit:
-                return obj.product.unit.symbol
-        except:
-            pass
-        return None
+        return reference_data.unit_symbol(obj.product) or None
 
 
-class StockTransferSerializer(serializers.ModelSerializer):
+class StockTransferSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer pour les transferts de stock entre zones
     """
@@ -297,7 +285,8 @@ class StockTransferSerializer(serializers.ModelSerializer):
         fields = ['id', 'reference', 'from_zone', 'from_zone_name', 'to_zone', 'to_zone_name', 
                   'date', 'status', 'notes', 'items', 'created_by', 'created_by_username', 'created_at']
         read_only_fields = ['reference', 'created_by', 'created_at']
-    
+
+    @transaction.atomic
     def create(self, validated_data):
         """Create transfer with items"""
         items_data = validated_data.pop('items')
@@ -324,6 +313,7 @@ class StockTransferSerializer(serializers.ModelSerializer):
         
         return transfer
     
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update transfer with items"""
         items_data = validated_data.pop('items', [])
@@ -370,52 +360,38 @@ class StockTransferSerializer(serializers.ModelSerializer):
     
     def _update_stock_and_create_stockcard(self, transfer):
         """Update stock quantities and create stock cards for completed transfers"""
-        from decimal import Decimal
-        
-        for item in transfer.items.all():
+        movements = []
+        for item in transfer.items.select_related('product'):
             quantity = item.transferred_quantity if item.transferred_quantity > 0 else item.quantity
             
             # Decrease stock in source zone
-            source_stock, _ = Stock.objects.get_or_create(
-                product=item.product, 
-                zone=transfer.from_zone, 
-                defaults={'quantity': 0}
-            )
-            source_stock.quantity -= quantity
-            source_stock.save()
-            
-            # Increase stock in destination zone
-            dest_stock, _ = Stock.objects.get_or_create(
-                product=item.product, 
-                zone=transfer.to_zone, 
-                defaults={'quantity': 0}
-            )
-            dest_stock.quantity += quantity
-            dest_stock.save()
-            
-            # Create stock card for source zone (out)
-            StockCard.objects.create(
+            movements.append(StockMovement(
                 product=item.product,
                 zone=transfer.from_zone,
-                date=transfer.date,
+                delta=-quantity,
                 transaction_type='transfer_out',
                 reference=transfer.reference,
-                quantity_in=Decimal('0.00'),
-                quantity_out=quantity,
-                notes=f"Transfer to {transfer.to_zone.name}: {transfer.reference}"
-            )
+                notes=f"Transfer to {transfer.to_zone.name}: {transfer.reference}",
+                date=transfer.date,
+            ))
             
-            # Create stock card for destination zone (in)
-            StockCard.objects.create(
+            # Increase stock in destination zone
+            movements.append(StockMovement(
                 product=item.product,
                 zone=transfer.to_zone,
-                date=transfer.date,
+                delta=quantity,
                 transaction_type='transfer_in',
                 reference=transfer.reference,
-                quantity_in=quantity,
-                quantity_out=Decimal('0.00'),
-                notes=f"Transfer from {transfer.from_zone.name}: {transfer.reference}"
-            )
+                notes=f"Transfer from {transfer.from_zone.name}: {transfer.reference}",
+                date=transfer.date,
+            ))
+        
+        # The guarded UPDATE is the availability check of the outgoing legs,
+        # whether the transfer is created or later updated as completed
+        try:
+            apply_movements(movements)
+        except InsufficientStock as exc:
+            raise shortage_error(exc)
 
 
 class InventoryItemSerializer(serializers.ModelSerializer):
@@ -432,15 +408,10 @@ class InventoryItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['inventory', 'difference']
     
     def get_unit_symbol(self, obj):
-        try:
-            if obj.product and obj.product.unit:
-                return obj.product.unit.symbol
-        except:
-            pass
-        return None
+        return reference_data.unit_symbol(obj.product) or None
 
 
-class InventorySerializer(serializers.ModelSerializer):
+class InventorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer pour les inventaires de stock
     """
@@ -554,50 +525,40 @@ class InventorySerializer(serializers.ModelSerializer):
     
     def _update_stock_and_create_stockcard(self, inventory):
         """Update stock quantities and create stock cards for completed inventories"""
-        from decimal import Decimal
+        items = list(inventory.items.select_related('product'))
         
-        for item in inventory.items.all():
-            # Calculate difference
-            difference = item.actual_quantity - item.expected_quantity
-            item.difference = difference
-            item.save()  # Don't use update_fields to avoid force_update issues with new items
-            
-            # ALWAYS update stock with actual_quantity when inventory is completed
-            # This is the core principle of physical inventory - we trust the physical count
-            stock, _ = Stock.objects.get_or_create(
-                product=item.product,
-                zone=inventory.zone,
-                defaults={'quantity': 0}
+        with transaction.atomic():
+            # Lock the counted rows so the adjustment is computed against the stock it replaces
+            current = dict(
+                Stock.objects.select_for_update().filter(
+                    zone=inventory.zone, product_id__in=[item.product_id for item in items]
+                ).values_list('product_id', 'quantity')
             )
-            stock.quantity = item.actual_quantity
-            stock.save()
+        
+            movements = []
+            for item in items:
+                # Calculate difference
+                item.difference = item.actual_quantity - item.expected_quantity
+                item.save()  # Don't use update_fields to avoid force_update issues with new items
             
-            # Create stock card only if there's a difference
-            if difference != 0:
-                if difference > 0:
-                    # Surplus
-                    StockCard.objects.create(
+                # ALWAYS bring stock to actual_quantity when inventory is completed
+                # This is the core principle of physical inventory - we trust the physical count
+                adjustment = item.actual_quantity - current.get(item.product_id, Decimal('0.00'))
+                if adjustment != 0:
+                    movements.append(StockMovement(
                         product=item.product,
                         zone=inventory.zone,
-                        date=inventory.date,
-                        transaction_type='Sortie Adjustment Inventaire',
+                        delta=adjustment,
+                        transaction_type='inventory',
                         reference=inventory.reference,
-                        quantity_in=difference,
-                        quantity_out=Decimal('0.00'),
-                        notes=f"Inventory adjustment (surplus): {inventory.reference}"
-                    )
-                else:
-                    # Shortage
-                    StockCard.objects.create(
-                        product=item.product,
-                        zone=inventory.zone,
+                        notes=(
+                            f"Inventory adjustment ({'surplus' if adjustment > 0 else 'shortage'}): "
+                            f"{inventory.reference}"
+                        ),
                         date=inventory.date,
-                        transaction_type='Entrée Adjustment Inventaire',
-                        reference=inventory.reference,
-                        quantity_in=Decimal('0.00'),
-                        quantity_out=abs(difference),
-                        notes=f"Inventory adjustment (shortage): {inventory.reference}"
-                    )
+                    ))
+        
+            apply_movements(movements)
 
 
 class StockReturnItemSerializer(serializers.ModelSerializer):
@@ -613,15 +574,10 @@ class StockReturnItemSerializer(serializers.ModelSerializer):
                   'unit_symbol', 'created_at', 'updated_at']
     
     def get_unit_symbol(self, obj):
-        try:
-            if obj.product and obj.product.unit:
-                return obj.product.unit.symbol
-        except:
-            pass
-        return None
+        return reference_data.unit_symbol(obj.product) or None
 
 
-class StockReturnSerializer(serializers.ModelSerializer):
+class StockReturnSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer pour les retours de stock
     """
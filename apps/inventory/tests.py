@@ -1,16 +1,36 @@
 """
 Tests for Inventory app - Product, Stock, StockCard, StockTransfer
 """
+import io
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from PIL.PdfParser import PdfParser
+from django.contrib import admin
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from django.db.models import F, Sum
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
 from rest_framework import status
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
 
+from apps.inventory.checkpoints import build_checkpoints, carry_into_checkpoints, stock_as_of
 from apps.inventory.models import (
-    Product, Stock, StockCard, StockSupply, StockSupplyItem,
+    Product, Stock, StockCard, StockCheckpoint, StockReturn, StockReturnItem, StockSupply, StockSupplyItem,
     StockTransfer, StockTransferItem, Inventory, InventoryItem
 )
+from apps.inventory import labels
+from apps.core.sequences import next_reference
+from apps.inventory.imports import import_products
+from apps.inventory.movements import InsufficientStock, StockMovement, apply_movements
+from apps.inventory.serializers import InventorySerializer
+from conftest import ProductFactory, SaleFactory, StockFactory, SupplierFactory, ZoneFactory
 
 
 # ============= Product Model Tests =============
@@ -361,6 +381,566 @@ class TestStockAPI:
         response = authenticated_client.get(url, {'low_stock': 'true'})
         assert response.status_code == status.HTTP_200_OK
 
+    def test_check_availability_batch(self, authenticated_client, stock, product, zone,
+                                      django_assert_max_num_queries):
+        """Test a whole cart is answered from one stock query"""
+        other = ProductFactory()
+        url = reverse('stock-check-availability-batch')
+        lines = [
+            {'product': product.id, 'quantity': 60},
+            {'product': product.id, 'quantity': 50},
+            {'product': other.id, 'quantity': 1},
+        ]
+        with django_assert_max_num_queries(4):
+            response = authenticated_client.post(url, {'zone': zone.id, 'lines': lines}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['available'] is False
+        first, second, missing = response.data['lines']
+        assert first['current_stock'] == float(stock.quantity)
+        # Both lines draw on the same 100 units
+        assert (first['available'], first['shortfall']) == (False, 10.0)
+        assert second['shortfall'] == 10.0
+        assert (missing['current_stock'], missing['shortfall']) == (0.0, 1.0)
+
+    def test_check_availability_batch_rejects_bad_lines(self, authenticated_client, product):
+        """Test malformed carts are a 400"""
+        url = reverse('stock-check-availability-batch')
+        response = authenticated_client.post(url, {'lines': [{'product': product.id, 'quantity': 1}]}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = authenticated_client.post(url, {'lines': []}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_completed_transfer_requires_source_stock(self, authenticated_client, stock, product, zone):
+        """Test a transfer created as completed is validated against the source zone"""
+        payload = {
+            'from_zone': zone.id, 'to_zone': ZoneFactory().id, 'date': date.today().isoformat(),
+            'status': 'completed', 'items': [{'product': product.id, 'quantity': '150.00'}],
+        }
+        response = authenticated_client.post(reverse('stock-transfer-list'), payload, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'items' in response.data
+
+        payload['items'][0]['quantity'] = '40.00'
+        response = authenticated_client.post(reverse('stock-transfer-list'), payload, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        stock.refresh_from_db()
+        assert stock.quantity == Decimal('60.00')
+
+    def test_transfer_completed_by_update_requires_source_stock(self, authenticated_client, stock, product, zone):
+        """Test completing a pending transfer is checked by the stock write and rolled back when short"""
+        payload = {
+            'from_zone': zone.id, 'to_zone': ZoneFactory().id, 'date': date.today().isoformat(),
+            'status': 'pending', 'items': [{'product': product.id, 'quantity': '150.00'}],
+        }
+        response = authenticated_client.post(reverse('stock-transfer-list'), payload, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+        url = reverse('stock-transfer-detail', args=[response.data['id']])
+        payload.update(status='completed', items=[{'id': response.data['items'][0]['id'], **payload['items'][0]}])
+        response = authenticated_client.put(url, payload, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'items' in response.data
+        stock.refresh_from_db()
+        assert stock.quantity == Decimal('100.00')
+        assert StockTransfer.objects.get().status == 'pending'
+        assert not StockCard.objects.filter(transaction_type__startswith='transfer').exists()
+
+    def test_card_edits_are_carried_into_checkpoints(self, authenticated_client, admin_user, product, zone):
+        """Test cards created, edited or deleted by hand keep the closed checkpoints equal to the card sums"""
+        _card(product, zone, date(2024, 1, 10), Decimal('10.00'))
+        build_checkpoints(until=date(2024, 3, 31))
+
+        response = authenticated_client.post(reverse('stock-card-list'), {
+            'product': product.id, 'zone': zone.id, 'date': '2024-02-10', 'transaction_type': 'supply',
+            'reference': 'ADJ-1', 'quantity_in': '4.00', 'quantity_out': '0.00',
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        url = reverse('stock-card-detail', args=[response.data['id']])
+        response = authenticated_client.patch(url, {'date': '2024-03-05', 'quantity_in': '6.00'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        for day in [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)]:
+            assert stock_as_of(day)[1] == _card_sum(day)
+        assert StockCheckpoint.objects.get(date=date(2024, 3, 31)).quantity == Decimal('16.00')
+
+        card = StockCard.objects.get(reference='ADJ-1')
+        card_admin = admin.site._registry[StockCard]
+        request = RequestFactory().post('/admin/')
+        request.user = admin_user
+        assert card_admin.has_change_permission(request, card) and card_admin.has_delete_permission(request, card)
+        card_admin.delete_model(request, card)
+        assert StockCheckpoint.objects.get(date=date(2024, 3, 31)).quantity == Decimal('10.00')
+
+
+# ============= StockSupply API Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestStockSupplyAPI:
+    """Test StockSupply API endpoints"""
+    
+    def test_outstanding_by_supplier(self, authenticated_client, zone, django_assert_max_num_queries):
+        """Outstanding supplies are grouped per supplier in one query"""
+        suppliers = SupplierFactory.create_batch(5)
+        for index, supplier in enumerate(suppliers):
+            for n in range(2):
+                StockSupply.objects.create(
+                    reference=f'APR-T{index}-{n}', supplier=supplier, zone=zone,
+                    date=date.today(), status='received', payment_status='partially_paid',
+                    total_amount=Decimal('100.00') * (index + 1), paid_amount=Decimal('10.00')
+                )
+        
+        with django_assert_max_num_queries(3):
+            response = authenticated_client.get(reverse('stock-supply-outstanding-by-supplier'))
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [row['supplier_id'] for row in response.data] == [s.id for s in reversed(suppliers)]
+        assert response.data[0]['outstanding_amount'] == Decimal('980.00')
+        assert response.data[0]['supply_count'] == 2
+
+
+# ============= Stock Movement API Tests =============
+
+@pytest.mark.django_db
+class TestApplyMovements:
+    """Test the single stock movement API"""
+    
+    def test_deltas_are_summed_and_missing_rows_created(self, product, zone):
+        """Movements on the same row are summed; unknown rows start at zero"""
+        other = ProductFactory()
+        Stock.objects.create(product=product, zone=zone, quantity=Decimal('10.00'))
+        
+        quantities = apply_movements([
+            StockMovement(product, zone, Decimal('5.00'), 'supply', 'SUP-001'),
+            StockMovement(product, zone, Decimal('-3.00'), 'sale', 'VNT-001'),
+            StockMovement(other, zone, Decimal('7.00'), 'supply', 'SUP-001'),
+        ])
+        
+        assert quantities[(product.id, zone.id)] == Decimal('12.00')
+        assert quantities[(other.id, zone.id)] == Decimal('7.00')
+        assert Stock.objects.get(product=other, zone=zone).quantity == Decimal('7.00')
+        cards = StockCard.objects.filter(zone=zone)
+        assert cards.count() == 3
+        sale_card = cards.get(transaction_type='sale')
+        assert sale_card.quantity_out == Decimal('3.00')
+        assert sale_card.quantity_in == Decimal('0.00')
+    
+    def test_insufficient_stock_rolls_back_every_movement(self, product, zone):
+        """One short row rejects the whole call"""
+        other = ProductFactory()
+        Stock.objects.create(product=product, zone=zone, quantity=Decimal('10.00'))
+        Stock.objects.create(product=other, zone=zone, quantity=Decimal('2.00'))
+        
+        with pytest.raises(InsufficientStock) as excinfo:
+            apply_movements([
+                StockMovement(product, zone, Decimal('-4.00'), 'sale', 'VNT-001'),
+                StockMovement(other, zone, Decimal('-5.00'), 'sale', 'VNT-001'),
+            ])
+        
+        assert excinfo.value.product == other
+        assert excinfo.value.available == Decimal('2.00')
+        assert Stock.objects.get(product=product, zone=zone).quantity == Decimal('10.00')
+        assert Stock.objects.get(product=other, zone=zone).quantity == Decimal('2.00')
+        assert not StockCard.objects.exists()
+    
+    def test_allow_negative(self, product, zone):
+        """Callers may opt out of the non-negative guard"""
+        quantities = apply_movements(
+            [StockMovement(product, zone, Decimal('-4.00'), 'transfer_out', 'TRF-001')],
+            allow_negative=True,
+        )
+        assert quantities[(product.id, zone.id)] == Decimal('-4.00')
+    
+    def test_query_count_does_not_grow_with_movements(self, zone, django_assert_max_num_queries):
+        """Stock is written with a constant number of statements"""
+        products = ProductFactory.create_batch(20)
+        movements = [
+            StockMovement(p, zone, Decimal('1.00'), 'supply', 'SUP-001') for p in products
+        ]
+        with django_assert_max_num_queries(6):
+            apply_movements(movements)
+    
+    def test_inventory_completion_brings_stock_to_count(self, product, zone):
+        """A completed inventory adjusts stock with 'inventory' cards"""
+        Stock.objects.create(product=product, zone=zone, quantity=Decimal('10.00'))
+        inventory = Inventory.objects.create(
+            reference='INV-TEST-0001', zone=zone, date=date.today(), status='completed'
+        )
+        InventoryItem.objects.create(
+            inventory=inventory, product=product,
+            expected_quantity=Decimal('10.00'), actual_quantity=Decimal('8.00')
+        )
+        
+        InventorySerializer()._update_stock_and_create_stockcard(inventory)
+        
+        assert Stock.objects.get(product=product, zone=zone).quantity == Decimal('8.00')
+        card = StockCard.objects.get(product=product, zone=zone)
+        assert card.transaction_type == 'inventory'
+        assert card.quantity_out == Decimal('2.00')
+        assert inventory.items.get().difference == Decimal('-2.00')
+
+
+# ============= Stock Checkpoint Tests =============
+
+def _card(product, zone, day, quantity):
+    return StockCard.objects.create(
+        product=product, zone=zone, date=day, transaction_type='supply' if quantity > 0 else 'sale',
+        reference='CHK-001', quantity_in=max(quantity, 0), quantity_out=max(-quantity, 0),
+    )
+
+
+def _card_sum(day):
+    rows = StockCard.objects.filter(date__lte=day).values('product_id', 'zone_id').annotate(
+        net=Sum(F('quantity_in') - F('quantity_out'))
+    ).order_by()
+    return {(row['product_id'], row['zone_id']): row['net'] for row in rows if row['net']}
+
+
+@pytest.mark.django_db
+class TestStockCheckpoints:
+    """Test month-end stock checkpoints and point-in-time stock"""
+
+    @pytest.fixture
+    def cards(self, product, zone):
+        other = ProductFactory()
+        _card(product, zone, date(2024, 1, 10), Decimal('10.00'))
+        _card(product, zone, date(2024, 2, 5), Decimal('-3.00'))
+        _card(other, zone, date(2024, 2, 29), Decimal('4.00'))
+        # No movement in March
+        _card(product, zone, date(2024, 4, 20), Decimal('5.00'))
+        _card(other, zone, date(2024, 4, 30), Decimal('-4.00'))
+        return product, other
+
+    def test_build_writes_month_end_balances(self, cards, zone):
+        """Every closed month gets its closing quantities, quiet months included"""
+        product, other = cards
+        assert build_checkpoints(until=date(2024, 3, 15)) == 5
+
+        rows = {
+            (row.product_id, row.date): row.quantity
+            for row in StockCheckpoint.objects.filter(zone=zone)
+        }
+        assert rows == {
+            (product.id, date(2024, 1, 31)): Decimal('10.00'),
+            (product.id, date(2024, 2, 29)): Decimal('7.00'),
+            (other.id, date(2024, 2, 29)): Decimal('4.00'),
+            (product.id, date(2024, 3, 31)): Decimal('7.00'),
+            (other.id, date(2024, 3, 31)): Decimal('4.00'),
+        }
+
+    def test_incremental_build_matches_rebuild(self, cards):
+        """Extending from the latest checkpoint gives the same rows as a rebuild"""
+        build_checkpoints(until=date(2024, 2, 1))
+        build_checkpoints(until=date(2024, 5, 31))
+        incremental = set(StockCheckpoint.objects.values_list('product_id', 'zone_id', 'date', 'quantity'))
+
+        build_checkpoints(until=date(2024, 5, 31), rebuild=True)
+        assert set(StockCheckpoint.objects.values_list('product_id', 'zone_id', 'date', 'quantity')) == incremental
+        assert not StockCheckpoint.objects.filter(date__gt=date(2024, 5, 31)).exists()
+
+    def test_stock_as_of_matches_card_sums(self, cards):
+        """Stock on any day equals the sum of every card up to it"""
+        build_checkpoints(until=date(2024, 3, 31))
+        for day in [date(2023, 12, 31), date(2024, 1, 31), date(2024, 2, 15), date(2024, 4, 20), date(2024, 6, 1)]:
+            assert stock_as_of(day)[1] == _card_sum(day)
+
+        checkpoint, quantities = stock_as_of(date(2024, 4, 25), product=cards[0].id)
+        assert checkpoint == date(2024, 3, 31)
+        assert list(quantities.values()) == [Decimal('12.00')]
+
+    def test_backdated_movement_updates_closed_checkpoints(self, cards, zone):
+        """A movement dated in a closed month is carried into the later checkpoints"""
+        product, other = cards
+        build_checkpoints(until=date(2024, 3, 31))
+        newcomer = ProductFactory()
+
+        apply_movements([
+            StockMovement(product, zone, Decimal('-2.00'), 'sale', 'VNT-001', date=date(2024, 2, 10)),
+            StockMovement(newcomer, zone, Decimal('6.00'), 'supply', 'SUP-001', date=date(2024, 3, 2)),
+        ], allow_negative=True)
+
+        assert StockCheckpoint.objects.get(product=product, date=date(2024, 1, 31)).quantity == Decimal('10.00')
+        assert StockCheckpoint.objects.get(product=product, date=date(2024, 3, 31)).quantity == Decimal('5.00')
+        assert StockCheckpoint.objects.get(product=newcomer, date=date(2024, 3, 31)).quantity == Decimal('6.00')
+        assert not StockCheckpoint.objects.filter(product=newcomer, date=date(2024, 2, 29)).exists()
+        for day in [date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]:
+            assert stock_as_of(day)[1] == _card_sum(day)
+
+    def test_current_month_cards_cost_no_query(self, product, zone):
+        """Cards of the running month are covered by no checkpoint"""
+        card = _card(product, zone, date.today(), Decimal('1.00'))
+        with CaptureQueriesContext(connection) as queries:
+            carry_into_checkpoints([card])
+        assert len(queries) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.slow
+class TestStockCheckpointConcurrency:
+    """Checkpoint builds racing backdated movements"""
+
+    def test_build_waits_for_backdated_movement(self, product, zone):
+        """A backdated card still uncommitted when the build starts ends up in the checkpoint"""
+        _card(product, zone, date(2024, 1, 10), Decimal('10.00'))
+        card_written = threading.Event()
+
+        def backdated_sale():
+            try:
+                with transaction.atomic():
+                    apply_movements(
+                        [StockMovement(product, zone, Decimal('-3.00'), 'sale', 'VNT-001', date=date(2024, 1, 20))],
+                        allow_negative=True,
+                    )
+                    card_written.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        def build():
+            try:
+                card_written.wait()
+                build_checkpoints(until=date(2024, 1, 31))
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for future in [pool.submit(backdated_sale), pool.submit(build)]:
+                future.result()
+
+        assert StockCheckpoint.objects.get(product=product, date=date(2024, 1, 31)).quantity == Decimal('7.00')
+
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestStockAsOfAPI:
+    """Test the stock-as-of-date endpoint"""
+
+    def test_stock_as_of(self, authenticated_client, product, zone):
+        """Quantities are returned from the nearest checkpoint"""
+        _card(product, zone, date(2024, 1, 10), Decimal('10.00'))
+        _card(product, zone, date(2024, 2, 5), Decimal('-3.00'))
+        build_checkpoints(until=date(2024, 1, 31))
+
+        response = authenticated_client.get(reverse('stock-as-of'), {'date': '2024-02-10', 'zone': zone.id})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['checkpoint_date'] == date(2024, 1, 31)
+        assert response.data['results'] == [{
+            'product_id': product.id, 'product_name': product.name,
+            'zone_id': zone.id, 'zone_name': zone.name, 'quantity': 7.0,
+        }]
+
+    def test_stock_as_of_requires_a_date(self, authenticated_client):
+        """A missing or invalid date is rejected"""
+        url = reverse('stock-as-of')
+        assert authenticated_client.get(url).status_code == status.HTTP_400_BAD_REQUEST
+        assert authenticated_client.get(url, {'date': '31/03/2024'}).status_code == status.HTTP_400_BAD_REQUEST
+        assert authenticated_client.get(url, {'date': '2024-03-31', 'zone': 'x'}).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_cards_read_do_not_grow_with_history(self, authenticated_client, product, zone):
+        """Only the cards after the checkpoint are read, however long the history"""
+        day = date(2022, 1, 15)
+        while day < date(2024, 3, 1):
+            _card(product, zone, day, Decimal('1.00'))
+            day += timedelta(days=10)
+        build_checkpoints(until=date(2024, 2, 29))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get(reverse('stock-as-of'), {'date': '2024-02-10', 'zone': zone.id})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['checkpoint_date'] == date(2024, 1, 31)
+        assert response.data['results'][0]['quantity'] == float(_card_sum(date(2024, 2, 10))[(product.id, zone.id)])
+        card_queries = [query['sql'] for query in queries if 'gestion_api_stockcard' in query['sql']]
+        assert len(card_queries) == 1
+        assert '2024-01-31' in card_queries[0]
+
+
+# ============= QR Label Tests =============
+
+@pytest.mark.django_db
+class TestQRLabels:
+    """Test the disk-cached QR rendering and the bulk label endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def label_cache(self, settings, tmp_path):
+        settings.QR_LABEL_CACHE_DIR = str(tmp_path)
+        return tmp_path
+
+    def test_renders_are_cached_on_disk(self, label_cache, monkeypatch):
+        """Test a reference is rendered once, then read back from its file"""
+        first = labels.qr_png('PROD-0001')
+        assert first.startswith(b'\x89PNG')
+        assert len(list(label_cache.rglob('*.png'))) == 1
+
+        monkeypatch.setattr(labels, 'render_qr_png', lambda data: pytest.fail("rendered twice"))
+        assert labels.qr_png('PROD-0001') == first
+
+    def test_process_pool_renders_misses(self, label_cache, settings):
+        """Test a large batch of misses goes through the pool and fills the cache"""
+        settings.QR_LABEL_WORKERS = 2
+        references = [f'PROD-{i:04d}' for i in range(labels.POOL_THRESHOLD)]
+        images = labels.qr_pngs(references)
+        assert list(images) == references
+        assert images[references[3]] == labels.render_qr_png(references[3])
+        assert len(list(label_cache.rglob('*.png'))) == len(references)
+
+    def test_render_pool_outlives_the_request(self, settings):
+        """Test batches share one long-lived pool instead of starting one each"""
+        settings.QR_LABEL_WORKERS = 2
+        pool = labels._render_pool()
+        assert labels._render_pool() is pool
+
+    def test_zip_entry_names_are_flat(self, label_cache):
+        """Test references cannot name entries outside the extraction directory"""
+        products = [
+            ProductFactory.build(reference=reference)
+            for reference in ['../../etc/passwd', '/abs/PROD 1', 'PROD 1', '..']
+        ]
+        archive = zipfile.ZipFile(io.BytesIO(labels.build_zip(products)))
+        assert archive.namelist() == ['passwd.png', 'PROD_1.png', 'PROD_1-2.png', 'label.png']
+
+    def test_sheet_pages(self, label_cache):
+        """Test every page of the sheet is written and the PDF reads back"""
+        products = ProductFactory.build_batch(5)
+        sheet = labels.build_sheet(products, columns=2, rows=1)
+        pdf = PdfParser(buf=sheet.read())
+        assert len(pdf.pages) == 3
+        assert pdf.read_indirect(pdf.pages[0])[b'MediaBox'] == [0, 0, 595.2, 841.92]
+
+    def test_zip_and_sheet_endpoint(self, authenticated_client, product, stock, zone):
+        """Test the selection is returned as a ZIP of PNGs or an A4 PDF sheet"""
+        ProductFactory()
+        url = reverse('product-qr-labels')
+
+        response = authenticated_client.get(url, {'zone': zone.id})
+        assert response.status_code == status.HTTP_200_OK
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        assert archive.namelist() == [f'{product.reference}.png']
+
+        response = authenticated_client.get(url, {'ids': str(product.id), 'layout': 'sheet'})
+        assert response['Content-Type'] == 'application/pdf'
+        assert b''.join(response.streaming_content).startswith(b'%PDF')
+
+        assert authenticated_client.get(url, {'layout': 'svg'}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+# ============= Product Import Tests =============
+
+@pytest.mark.django_db
+class TestProductImport:
+    """Test the bulk CSV product and opening stock import"""
+
+    HEADER = "reference,name,category,unit,purchase_price,selling_price,quantity\n"
+
+    def _import(self, body, **kwargs):
+        return import_products(io.StringIO(self.HEADER + body), **kwargs)
+
+    def test_rows_create_products_and_opening_stock(self, zone, product_category, unit_of_measure):
+        """Test new products get PROD references, stock and a stock card"""
+        result = self._import(
+            ",Riz,Electronics,kg,10,12.5,40\n"
+            ",Sucre,,Kilogram,8,9,\n",
+            zone=zone,
+        )
+
+        assert (result.created, result.updated, result.stocked, result.errors) == (2, 0, 1, [])
+        rice = Product.objects.get(name="Riz")
+        assert rice.reference.startswith("PROD-")
+        assert rice.category == product_category
+        assert rice.selling_price == Decimal('12.50')
+        assert Stock.objects.get(product=rice, zone=zone).quantity == Decimal('40.00')
+        card = StockCard.objects.get(product=rice)
+        assert (card.transaction_type, card.quantity_in) == ('inventory', Decimal('40.00'))
+        assert Product.objects.get(name="Sucre").unit == unit_of_measure
+
+    def test_invalid_rows_are_reported_and_skipped(self, zone, product_category):
+        """Test each rejected row is listed with its line number and reasons"""
+        result = self._import(
+            "P-1,Riz,Electronics,,10,12,\n"
+            ",,Unknown,,abc,,\n"
+            "P-1,Riz bis,,,,,\n",
+            zone=zone,
+        )
+
+        assert result.created == 1
+        assert [error['row'] for error in result.errors] == [3, 4]
+        assert "name is required" in result.errors[0]['errors']
+        assert "unknown category 'Unknown'" in result.errors[0]['errors']
+        assert "appears twice" in result.errors[1]['errors'][0]
+
+    def test_numbers_too_large_for_their_column_are_row_errors(self, zone):
+        """Test values the column cannot hold are rejected per row instead of failing the write"""
+        result = self._import(
+            ",Riz,,,1e15,12,\n"
+            ",Sucre,,,1,2,99999999999.999\n"
+            ",Sel,,,1,2.499,5\n",
+            zone=zone,
+        )
+
+        assert result.created == 1
+        assert [error['row'] for error in result.errors] == [2, 3]
+        assert result.errors[0]['errors'] == ["purchase_price must be a positive number below 100,000,000"]
+        assert result.errors[1]['errors'] == ["quantity must be a positive number below 10,000,000,000"]
+        assert Product.objects.get(name="Sel").selling_price == Decimal('2.50')
+
+    def _following_reference(self):
+        """The PROD reference the allocator hands out after the next one"""
+        number = int(next_reference(Product, 'PROD', width=4, yearly=False)[len('PROD-'):])
+        return f"PROD-{number + 1:04d}"
+
+    def test_allocated_references_skip_numbers_in_the_file(self, zone):
+        """Test PROD numbers given in the same chunk are not handed to unnumbered rows"""
+        following = self._following_reference()
+        result = self._import(f",Riz,,,1,2,\n{following},Sucre,,,1,2,\n", zone=zone)
+
+        assert (result.created, result.errors) == (2, [])
+        assert Product.objects.get(reference=following).name == "Sucre"
+        assert Product.objects.get(name="Riz").reference != following
+
+    def test_later_row_cannot_reuse_an_allocated_reference(self, zone):
+        """Test a later chunk naming a number allocated by the import does not update that product"""
+        following = self._following_reference()
+        result = self._import(f",Riz,,,1,2,\n{following},Sucre,,,1,2,\n", zone=zone, chunk_size=1)
+
+        assert Product.objects.get(name="Riz").reference == following
+        assert [error['row'] for error in result.errors] == [3]
+        assert "earlier row" in result.errors[0]['errors'][0]
+        assert not Product.objects.filter(name="Sucre").exists()
+
+    def test_reimport_updates_and_sets_stock(self, product, zone):
+        """Test matching references are updated and quantities set, not added"""
+        body = f"{product.reference},Renamed,,,,,25\n"
+        self._import(body, zone=zone)
+        result = self._import(body, zone=zone)
+
+        assert (result.created, result.updated) == (0, 1)
+        product.refresh_from_db()
+        assert product.name == "Renamed"
+        assert product.purchase_price == Decimal('100.00')
+        assert Stock.objects.get(product=product, zone=zone).quantity == Decimal('25.00')
+        assert StockCard.objects.filter(product=product).count() == 1
+
+    def test_query_count_is_per_chunk(self, zone, django_assert_max_num_queries):
+        """Test importing many rows costs a fixed number of queries per chunk"""
+        body = "".join(f",Produit {i},,,1,2,{i + 1}\n" for i in range(200))
+        with django_assert_max_num_queries(25):
+            result = self._import(body, zone=zone, chunk_size=500)
+        assert result.created == 200
+        assert Stock.objects.filter(zone=zone).count() == 200
+
+    def test_api_and_dry_run(self, authenticated_client, zone):
+        """Test the upload endpoint validates without writing on dry_run"""
+        upload = SimpleUploadedFile("products.csv", (self.HEADER + ",Riz,,,1,2,5\n").encode())
+        response = authenticated_client.post(
+            reverse('product-import-csv'), {'file': upload, 'zone': zone.id, 'dry_run': 'true'},
+            format='multipart'
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['created'] == 1
+        assert not Product.objects.filter(name="Riz").exists()
+
+        response = authenticated_client.post(reverse('product-import-csv'), {}, format='multipart')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
 
 # ============= Integration Tests =============
 
@@ -426,3 +1006,184 @@ class TestStockMovementIntegration:
         # Verify stock cards
         cards = StockCard.objects.filter(product=product, zone=zone)
         assert cards.count() == 3
+
+
+# ============= Query Budgets =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+@pytest.mark.slow
+class TestInventoryQueryBudget:
+    """Query counts of the inventory endpoints do not grow with the data"""
+
+    def _products(self, n, product_category, unit_of_measure):
+        return ProductFactory.create_batch(n, category=product_category, unit=unit_of_measure)
+
+    def test_product_list(self, query_budget, product_category, unit_of_measure):
+        query_budget(
+            reverse('product-list'),
+            lambda n: self._products(n, product_category, unit_of_measure),
+            budget=2,
+        )
+
+    def test_product_detail(self, query_budget, product_category, unit_of_measure):
+        query_budget(
+            lambda rows: reverse('product-detail', args=[rows[-1].pk]),
+            lambda n: self._products(n, product_category, unit_of_measure),
+            budget=1,
+        )
+
+    def test_stock_list(self, query_budget, zone, product_category, unit_of_measure):
+        query_budget(
+            reverse('stock-list'),
+            lambda n: [
+                StockFactory(product=product, zone=zone)
+                for product in self._products(n, product_category, unit_of_measure)
+            ],
+            budget=2,
+        )
+
+    def test_stock_detail(self, query_budget, zone, product_category, unit_of_measure):
+        query_budget(
+            lambda rows: reverse('stock-detail', args=[rows[-1].pk]),
+            lambda n: [
+                StockFactory(product=product, zone=zone)
+                for product in self._products(n, product_category, unit_of_measure)
+            ],
+            budget=1,
+        )
+
+    def test_stock_card_list(self, query_budget, product, zone):
+        query_budget(
+            reverse('stock-card-list'),
+            lambda n: StockCard.objects.bulk_create([
+                StockCard(product=product, zone=zone, date=date.today(), transaction_type='supply',
+                          reference=f'APR-{index}', quantity_in=Decimal('1.00'))
+                for index in range(n)
+            ]),
+            budget=2,
+        )
+
+    def test_stock_card_detail(self, query_budget, product, zone):
+        query_budget(
+            lambda rows: reverse('stock-card-detail', args=[rows[-1].pk]),
+            lambda n: StockCard.objects.bulk_create([
+                StockCard(product=product, zone=zone, date=date.today(), transaction_type='supply',
+                          reference=f'APR-{index}', quantity_in=Decimal('1.00'))
+                for index in range(n)
+            ]),
+            budget=1,
+        )
+
+    def test_stock_supply_list(self, query_budget, supplier_partner, zone, product):
+        def seed(n):
+            for _ in range(n):
+                supply = StockSupply.objects.create(
+                    supplier=supplier_partner, zone=zone, date=date.today(), status='received',
+                    total_amount=Decimal('100.00')
+                )
+                StockSupplyItem.objects.create(
+                    supply=supply, product=product, quantity=Decimal('1.00'),
+                    unit_price=Decimal('100.00'), total_price=Decimal('100.00')
+                )
+
+        query_budget(reverse('stock-supply-list'), seed, budget=3)
+
+    def test_stock_supply_detail(self, query_budget, supplier_partner, zone, product_category, unit_of_measure):
+        supply = StockSupply.objects.create(
+            supplier=supplier_partner, zone=zone, date=date.today(), status='received', total_amount=Decimal('100.00')
+        )
+        query_budget(
+            reverse('stock-supply-detail', args=[supply.pk]),
+            lambda n: StockSupplyItem.objects.bulk_create([
+                StockSupplyItem(supply=supply, product=product, quantity=Decimal('1.00'),
+                                unit_price=Decimal('100.00'), total_price=Decimal('100.00'))
+                for product in self._products(n, product_category, unit_of_measure)
+            ]),
+            budget=2,
+        )
+
+    def test_outstanding_by_supplier(self, query_budget, zone):
+        def seed(n):
+            for supplier in SupplierFactory.create_batch(n):
+                StockSupply.objects.create(
+                    supplier=supplier, zone=zone, date=date.today(), status='received',
+                    total_amount=Decimal('100.00'), paid_amount=Decimal('10.00')
+                )
+
+        query_budget(reverse('stock-supply-outstanding-by-supplier'), seed, budget=1)
+
+    def test_stock_transfer_list(self, query_budget, product):
+        from_zone, to_zone = ZoneFactory(), ZoneFactory()
+
+        def seed(n):
+            for _ in range(n):
+                transfer = StockTransfer.objects.create(
+                    from_zone=from_zone, to_zone=to_zone, date=date.today(), status='pending'
+                )
+                StockTransferItem.objects.create(transfer=transfer, product=product, quantity=Decimal('1.00'))
+
+        query_budget(reverse('stock-transfer-list'), seed, budget=3)
+
+    def test_stock_transfer_detail(self, query_budget, product_category, unit_of_measure):
+        transfer = StockTransfer.objects.create(
+            from_zone=ZoneFactory(), to_zone=ZoneFactory(), date=date.today(), status='pending'
+        )
+        query_budget(
+            reverse('stock-transfer-detail', args=[transfer.pk]),
+            lambda n: StockTransferItem.objects.bulk_create([
+                StockTransferItem(transfer=transfer, product=product, quantity=Decimal('1.00'))
+                for product in self._products(n, product_category, unit_of_measure)
+            ]),
+            budget=2,
+        )
+
+    def test_inventory_list(self, query_budget, zone, product, regular_user):
+        def seed(n):
+            for _ in range(n):
+                inventory = Inventory.objects.create(zone=zone, date=date.today(), created_by=regular_user)
+                InventoryItem.objects.create(inventory=inventory, product=product)
+
+        query_budget(reverse('inventory-list'), seed, budget=3)
+
+    def test_inventory_detail(self, query_budget, zone, product_category, unit_of_measure):
+        inventory = Inventory.objects.create(zone=zone, date=date.today())
+        query_budget(
+            reverse('inventory-detail', args=[inventory.pk]),
+            lambda n: [
+                InventoryItem.objects.create(
+                    inventory=inventory, product=ProductFactory(category=product_category, unit=unit_of_measure)
+                )
+                for _ in range(n)
+            ],
+            budget=2,
+        )
+
+    def test_stock_return_list(self, query_budget, client_partner, zone, product, regular_user):
+        sale = SaleFactory(client=client_partner, zone=zone, created_by=regular_user)
+
+        def seed(n):
+            start = StockReturn.objects.count()
+            for index in range(n):
+                stock_return = StockReturn.objects.create(
+                    reference=f'RET-{start + index}', sale=sale, date=date.today(), reason='Defect',
+                    created_by=regular_user
+                )
+                StockReturnItem.objects.create(stock_return=stock_return, product=product, quantity=Decimal('1.00'))
+
+        query_budget(reverse('stock-return-list'), seed, budget=3)
+
+    def test_stock_return_detail(self, query_budget, client_partner, zone, regular_user,
+                                 product_category, unit_of_measure):
+        stock_return = StockReturn.objects.create(
+            reference='RET-1', sale=SaleFactory(client=client_partner, zone=zone, created_by=regular_user),
+            date=date.today(), reason='Defect', created_by=regular_user
+        )
+        query_budget(
+            reverse('stock-return-detail', args=[stock_return.pk]),
+            lambda n: StockReturnItem.objects.bulk_create([
+                StockReturnItem(stock_return=stock_return, product=product, quantity=Decimal('1.00'))
+                for product in self._products(n, product_category, unit_of_measure)
+            ]),
+            budget=2,
+        )
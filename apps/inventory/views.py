@@ -5,18 +5,17 @@ from rest_framework.permissions import IsAuthenticated
 from django.db.models import F
 from django.utils import timezone
 from django.db import transaction
-from django.core.cache import cache
 from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
-import qrcode
 import io
-from django.http import HttpResponse
+from datetime import datetime
+from django.http import FileResponse, HttpResponse
 from decimal import Decimal
-from django.db.models import Sum, Q
+from django.db.models import Count, Prefetch, Sum, Q
 
 from .models import (
-    Product, Stock, StockSupply, StockCard,
-    StockTransfer, Inventory, StockReturn
+    Product, Stock, StockSupply, StockSupplyItem, StockCard,
+    StockTransfer, StockTransferItem, Inventory, InventoryItem, StockReturn, StockReturnItem
 )
 from .serializers import (
     ProductSerializer,
@@ -27,9 +26,19 @@ from .serializers import (
     InventorySerializer,
     StockReturnSerializer
 )
+from apps.core import reference_data
+from apps.core.caching import cached_response
+from apps.core.exports import DATE_FILTERS, ExportMixin
+from apps.core.models import Zone
+from apps.core.pagination import LedgerPagination
+from apps.core.querysets import QueryProfile, QueryProfileMixin
+from apps.inventory.availability import StockLine, check_availability
+from apps.inventory.checkpoints import stock_as_of
+from apps.inventory import labels
+from apps.inventory.imports import IMPORT_COLUMNS, import_products
 from apps.inventory.models import Product, Stock, StockSupply, StockCard
-from apps.treasury.models import Account, SupplierCashPayment, AccountStatement,SupplierCashPayment
-from apps.partners.models import Supplier
+from apps.treasury.ledger import LedgerEntry, post_entries
+from apps.treasury.models import Account, SupplierCashPayment
 class ProductViewSet(viewsets.ModelViewSet):
     """API endpoint for products"""
     queryset = Product.objects.all().order_by('name')
@@ -42,53 +51,100 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         QR code contains only the product reference for easy scanning.
         The scanner will match this reference to lookup the full product.
-        Uses caching to improve performance.
+        Images come from the on-disk label cache shared by all workers.
         """
-        
         product = self.get_object()
-        cache_key = f'qr_code_product_{product.id}_{product.reference}'
-        
-        # Try to get from cache first
-        cached_qr = cache.get(cache_key)
-        if cached_qr:
-            return HttpResponse(cached_qr, content_type='image/png')
-        
-        # Create QR code with only the product reference
-        # This ensures the scanner can directly match by reference
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,  # Higher error correction for better reliability
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(product.reference)
-        qr.make(fit=True)
-        
-        # Create image
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to buffer
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        qr_image_data = buffer.getvalue()
-        
-        # Cache for 24 hours (QR codes rarely change)
-        cache.set(cache_key, qr_image_data, 60 * 60 * 24)
-        
-        # Return as image response
-        return HttpResponse(qr_image_data, content_type='image/png')
+        return HttpResponse(labels.qr_png(product.reference), content_type='image/png')
+
+    @action(detail=False, methods=['get'])
+    def qr_labels(self, request):
+        """Download QR labels for a selection of products
 
+        Query Parameters:
+        - ids: Comma separated product IDs (optional)
+        - category: Category ID (optional)
+        - zone: Only products stocked in this zone (optional)
+        - layout: 'zip' (one PNG per product, default) or 'sheet' (A4 PDF)
+        """
+        layout = request.query_params.get('layout', 'zip')
+        if layout not in ('zip', 'sheet'):
+            return Response({'error': "layout must be 'zip' or 'sheet'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = Product.objects.filter(is_active=True, reference__isnull=False).order_by('name')
+        try:
+            if request.query_params.get('ids'):
+                products = products.filter(pk__in=[int(pk) for pk in request.query_params['ids'].split(',')])
+            if request.query_params.get('category'):
+                products = products.filter(category_id=int(request.query_params['category']))
+            if request.query_params.get('zone'):
+                products = products.filter(stocks__zone_id=int(request.query_params['zone'])).distinct()
+        except ValueError:
+            return Response({'error': 'ids, category and zone must be numeric'}, status=status.HTTP_400_BAD_REQUEST)
 
-class StockViewSet(viewsets.ModelViewSet):
+        products = list(products.only('id', 'name', 'reference')[:labels.MAX_LABELS + 1])
+        if not products:
+            return Response({'error': 'No product matches this selection'}, status=status.HTTP_404_NOT_FOUND)
+        if len(products) > labels.MAX_LABELS:
+            return Response(
+                {'error': f'At most {labels.MAX_LABELS} labels can be generated at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if layout == 'sheet':
+            response = FileResponse(
+                labels.build_sheet(products), as_attachment=True, filename='qr_labels.pdf',
+                content_type='application/pdf',
+            )
+        else:
+            response = HttpResponse(labels.build_zip(products), content_type='application/zip')
+            response['Content-Disposition'] = 'attachment; filename="qr_labels.zip"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_csv(self, request):
+        """Import products and opening stock from an uploaded CSV file
+
+        Expects a multipart `file` with the columns of IMPORT_COLUMNS, an
+        optional `zone` for the opening stock and `dry_run` to only validate.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'file is required', 'columns': IMPORT_COLUMNS},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        zone = None
+        zone_id = request.data.get('zone')
+        if zone_id:
+            try:
+                zone = Zone.objects.get(pk=zone_id)
+            except (Zone.DoesNotExist, ValueError):
+                return Response({'error': 'Zone not found'}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            result = import_products(lines, zone=zone, user=request.user, dry_run=dry_run)
+        except UnicodeDecodeError:
+            return Response({'error': 'The file must be UTF-8 encoded CSV'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({**result._asdict(), 'dry_run': dry_run})
+
+
+class StockViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for stock"""
-    queryset = Stock.objects.all().order_by('product__name')
+    queryset = Stock.objects.order_by('product__name')
     serializer_class = StockSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['product']),
+        'destroy': QueryProfile(),
+    }
 
     def get_queryset(self):
         """Filter stock by zone if provided"""
-        queryset = Stock.objects.all().order_by('product__name')
+        queryset = super().get_queryset()
         zone_id = self.request.query_params.get('zone', None)
         
         if zone_id is not None:
@@ -103,7 +159,7 @@ class StockViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         """Get products with low stock levels"""
-        low_stock = self.queryset.filter(
+        low_stock = self.get_queryset().filter(
             quantity__lt=F('product__min_stock_level'),
             product__min_stock_level__gt=0
         )
@@ -189,12 +245,129 @@ class StockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['post'])
+    def check_availability_batch(self, request):
+        """
+        Check stock availability for a whole cart with a single stock query
+        Body:
+        - zone: Default zone ID for lines without one (optional)
+        - lines: [{product, quantity, zone}, ...] (required)
+
+        Returns:
+        - available: True when every line can be served
+        - lines: per line availability, current_stock, requested_quantity and
+          shortfall (lines for the same product and zone share the stock)
+        """
+        lines = request.data.get('lines')
+        if not isinstance(lines, list) or not lines:
+            return Response(
+                {'error': 'lines must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        default_zone = request.data.get('zone')
+        try:
+            stock_lines = [
+                StockLine(line['product'], line.get('zone') or default_zone, Decimal(str(line['quantity'])))
+                for line in lines
+            ]
+            results = check_availability(stock_lines)
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            return Response(
+                {'error': 'each line needs a product, a zone and a numeric quantity'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        for result in results:
+            for field in ('requested_quantity', 'current_stock', 'shortfall'):
+                result[field] = float(result[field])
+        return Response({
+            'available': all(result['available'] for result in results),
+            'lines': results,
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_response(tags=['stock'])
+    def as_of(self, request):
+        """
+        Stock quantities at the end of a past day, summed from the nearest
+        month-end checkpoint (see build_stock_checkpoints)
+        Query Parameters:
+        - date: Day (YYYY-MM-DD, required)
+        - zone: Zone ID (optional)
+        - product: Product ID (optional)
 
-class StockSupplyViewSet(viewsets.ModelViewSet):
+        Returns:
+        - date, checkpoint_date: The requested day and the checkpoint used
+          (null when none precedes it)
+        - results: [{product_id, product_name, zone_id, zone_name, quantity}]
+          for every non-zero product and zone
+        """
+        try:
+            day = datetime.strptime(request.query_params.get('date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response(
+                {'error': 'date must be a date (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            zone_id = int(request.query_params['zone']) if request.query_params.get('zone') else None
+            product_id = int(request.query_params['product']) if request.query_params.get('product') else None
+        except ValueError:
+            return Response(
+                {'error': 'zone and product must be IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        checkpoint, quantities = stock_as_of(day, zone=zone_id, product=product_id)
+        names = dict(Product.objects.filter(
+            pk__in={product for product, _ in quantities}
+        ).values_list('id', 'name')) if quantities else {}
+        results = sorted(
+            (
+                {
+                    'product_id': product,
+                    'product_name': names.get(product),
+                    'zone_id': zone,
+                    'zone_name': reference_data.reference_name(Zone, zone),
+                    'quantity': float(quantity),
+                }
+                for (product, zone), quantity in quantities.items()
+            ),
+            key=lambda row: (row['product_name'] or '', row['zone_id']),
+        )
+        return Response({
+            'date': day,
+            'checkpoint_date': checkpoint,
+            'results': results,
+        })
+
+
+class StockSupplyViewSet(QueryProfileMixin, ExportMixin, viewsets.ModelViewSet):
     """API endpoint for stock supplies"""
-    queryset = StockSupply.objects.all().order_by('-date')
+    queryset = StockSupply.objects.order_by('-date', '-id')
     serializer_class = StockSupplySerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(
+            select_related=['supplier', 'created_by'],
+            prefetch_related=[Prefetch('items', queryset=StockSupplyItem.objects.select_related('product'))],
+        ),
+        'destroy': QueryProfile(),
+        'export': QueryProfile(),
+        'pay_from_account': QueryProfile(select_related=['supplier']),
+    }
+    filter_params = {
+        **DATE_FILTERS,
+        'zone': 'zone_id',
+        'supplier': 'supplier_id',
+        'status': 'status',
+        'payment_status': 'payment_status',
+    }
+    export_fields = (
+        'id', 'reference', 'date', 'supplier_id', 'supplier__name', 'zone_id', 'zone__name',
+        'status', 'payment_status', 'total_amount', 'paid_amount', 'remaining_amount',
+    )
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -219,6 +392,7 @@ class StockSupplyViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @cached_response(tags=['supplies', 'partners'])
     def outstanding_by_supplier(self, request):
         """Get outstanding supplies by supplier"""
         
@@ -228,29 +402,26 @@ class StockSupplyViewSet(viewsets.ModelViewSet):
             Q(payment_status='unpaid') | Q(payment_status='partially_paid')
         )
         
-        # Group by supplier and sum amounts
-        result = []
-        suppliers = Supplier.objects.all()
+        # Group by supplier and sum amounts in a single query
+        rows = supplies.values('supplier_id', 'supplier__name').annotate(
+            total=Sum('total_amount'),
+            paid=Sum('paid_amount'),
+            supply_count=Count('id'),
+        ).annotate(
+            outstanding=F('total') - F('paid')
+        ).filter(outstanding__gt=0).order_by('-outstanding', 'supplier_id')
         
-        for supplier in suppliers:
-            supplier_supplies = supplies.filter(supplier=supplier)
-            if supplier_supplies.exists():
-                total = sum([s.total_amount for s in supplier_supplies])
-                paid = sum([s.paid_amount for s in supplier_supplies])
-                outstanding = total - paid
-                
-                if outstanding > 0:
-                    result.append({
-                        'supplier_id': supplier.id,
-                        'supplier_name': supplier.name,
-                        'total_amount': total,
-                        'paid_amount': paid,
-                        'outstanding_amount': outstanding,
-                        'supply_count': supplier_supplies.count()
-                    })
-        
-        # Sort by outstanding amount descending
-        result.sort(key=lambda x: x['outstanding_amount'], reverse=True)
+        result = [
+            {
+                'supplier_id': row['supplier_id'],
+                'supplier_name': row['supplier__name'],
+                'total_amount': row['total'],
+                'paid_amount': row['paid'],
+                'outstanding_amount': row['outstanding'],
+                'supply_count': row['supply_count']
+            }
+            for row in rows
+        ]
         return Response(result)
 
     @action(detail=True, methods=['post'])
@@ -302,18 +473,6 @@ class StockSupplyViewSet(viewsets.ModelViewSet):
                 # Note: We allow payments even with insufficient balance
                 # This will result in a negative balance for the company account
                 
-                # Get last statement for supplier account
-                last_supplier_statement = AccountStatement.objects.filter(
-                    account=supplier_account
-                ).order_by('-date', '-id').first()
-                previous_supplier_balance = Decimal(str(last_supplier_statement.balance)) if last_supplier_statement else Decimal('0.00')
-                
-                # Get last statement for company account
-                last_company_statement = AccountStatement.objects.filter(
-                    account=company_account
-                ).order_by('-date', '-id').first()
-                previous_company_balance = Decimal(str(last_company_statement.balance)) if last_company_statement else Decimal('0.00')
-                
                 # Create SupplierCashPayment (payment record)
                 payment = SupplierCashPayment.objects.create(
                     reference=reference,
@@ -327,35 +486,23 @@ class StockSupplyViewSet(viewsets.ModelViewSet):
                     created_by=request.user
                 )
                 
-                # Debit supplier account (reduce what we owe)
-                new_supplier_balance = previous_supplier_balance - amount
-                AccountStatement.objects.create(
-                    account=supplier_account,
-                    date=timezone.now().date(),
-                    transaction_type='supply',
-                    reference=reference,
-                    description=f"Paiement approvisionnement {supply.reference} - {supply.supplier.name}",
-                    credit=0,
-                    debit=amount,
-                    balance=new_supplier_balance,
-                )
-                supplier_account.current_balance = new_supplier_balance
-                supplier_account.save(update_fields=['current_balance'])
-                
-                # Debit company account (money going out)
-                new_company_balance = previous_company_balance - amount
-                AccountStatement.objects.create(
-                    account=company_account,
-                    date=timezone.now().date(),
-                    transaction_type='supply',
-                    reference=reference,
-                    description=f"Paiement fournisseur {supply.supplier.name} pour approvisionnement {supply.reference}",
-                    credit=0,
-                    debit=amount,
-                    balance=new_company_balance,
-                )
-                company_account.current_balance = new_company_balance
-                company_account.save(update_fields=['current_balance'])
+                # Debit supplier account (reduce what we owe) and company account (money going out)
+                post_entries([
+                    LedgerEntry(
+                        account=supplier_account,
+                        transaction_type='supply',
+                        reference=reference,
+                        description=f"Paiement approvisionnement {supply.reference} - {supply.supplier.name}",
+                        debit=amount,
+                    ),
+                    LedgerEntry(
+                        account=company_account,
+                        transaction_type='supply',
+                        reference=reference,
+                        description=f"Paiement fournisseur {supply.supplier.name} pour approvisionnement {supply.reference}",
+                        debit=amount,
+                    ),
+                ])
                 
                 # Update supply payment status and amounts
                 supply.refresh_from_db()
@@ -402,38 +549,75 @@ class StockSupplyViewSet(viewsets.ModelViewSet):
                 {'error': f'Error processing payment: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-class StockCardViewSet(viewsets.ModelViewSet):
+class StockCardViewSet(QueryProfileMixin, ExportMixin, viewsets.ModelViewSet):
     """API endpoint for stock cards"""
-    queryset = StockCard.objects.all().order_by('-date')
+    queryset = StockCard.objects.order_by('-date', '-id')
     serializer_class = StockCardSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['product']),
+        'destroy': QueryProfile(),
+        'export': QueryProfile(),
+    }
+    pagination_class = LedgerPagination
+    filter_params = {
+        **DATE_FILTERS,
+        'zone': 'zone_id',
+        'product': 'product_id',
+        'transaction_type': 'transaction_type',
+    }
+    export_fields = (
+        'id', 'date', 'reference', 'transaction_type', 'product_id', 'product__name',
+        'zone_id', 'zone__name', 'quantity_in', 'quantity_out', 'notes',
+    )
 
 
-class StockTransferViewSet(viewsets.ModelViewSet):
+class StockTransferViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for stock transfers between zones"""
-    queryset = StockTransfer.objects.all().order_by('-date')
+    queryset = StockTransfer.objects.order_by('-date')
     serializer_class = StockTransferSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(
+            select_related=['from_zone', 'to_zone', 'created_by'],
+            prefetch_related=[Prefetch('items', queryset=StockTransferItem.objects.select_related('product'))],
+        ),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class InventoryViewSet(viewsets.ModelViewSet):
+class InventoryViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for physical inventories"""
-    queryset = Inventory.objects.prefetch_related('items__product').all().order_by('-date')
+    queryset = Inventory.objects.all().order_by('-date')
     serializer_class = InventorySerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(
+            select_related=['zone', 'created_by'],
+            prefetch_related=[Prefetch('items', queryset=InventoryItem.objects.select_related('product'))],
+        ),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class StockReturnViewSet(viewsets.ModelViewSet):
+class StockReturnViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for stock returns"""
-    queryset = StockReturn.objects.prefetch_related('items__product').all().order_by('-date')
+    queryset = StockReturn.objects.all().order_by('-date')
     serializer_class = StockReturnSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(
+            select_related=['sale', 'created_by'],
+            prefetch_related=[Prefetch('items', queryset=StockReturnItem.objects.select_related('product'))],
+        ),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -1,15 +1,16 @@
 from rest_framework import serializers
 from .models import Client, Supplier, Employee, ClientGroup
+from apps.core.fieldsets import SparseFieldsMixin
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Client
         fields = ['id', 'name', 'contact_person', 'phone', 'email', 'address', 
                   'price_group', 'account', 'is_active']
 
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = ['id', 'name', 'contact_person', 'phone', 'email', 'address', 
@@ -6,7 +6,8 @@ from django.urls import reverse
 from rest_framework import status
 from decimal import Decimal
 
-from apps.partners.models import Client, Supplier
+from apps.partners.models import Client, ClientGroup, Employee, Supplier
+from conftest import ClientFactory, SupplierFactory
 
 
 # ============= Client Model Tests =============
@@ -369,3 +370,47 @@ class TestPartnerIntegration:
         statements = AccountStatement.objects.filter(account=client_account)
         assert statements.count() == 1
         assert client_account.current_balance == Decimal('-5000.00')
+
+
+# ============= Query Budgets =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+@pytest.mark.slow
+class TestPartnersQueryBudget:
+    """Query counts of the partner endpoints do not grow with the data"""
+
+    def _employees(self, n):
+        return Employee.objects.bulk_create([
+            Employee(name=f'Employee {index}', position='Vendeur', phone='620000000', address='Conakry')
+            for index in range(n)
+        ])
+
+    def _client_groups(self, n):
+        return ClientGroup.objects.bulk_create([ClientGroup(name=f'Group {index}') for index in range(n)])
+
+    def test_client_list(self, query_budget):
+        query_budget(reverse('client-list'), ClientFactory.create_batch, budget=2)
+
+    def test_client_detail(self, query_budget):
+        query_budget(lambda rows: reverse('client-detail', args=[rows[-1].pk]), ClientFactory.create_batch, budget=1)
+
+    def test_supplier_list(self, query_budget):
+        query_budget(reverse('supplier-list'), SupplierFactory.create_batch, budget=2)
+
+    def test_supplier_detail(self, query_budget):
+        query_budget(
+            lambda rows: reverse('supplier-detail', args=[rows[-1].pk]), SupplierFactory.create_batch, budget=1
+        )
+
+    def test_employee_list(self, query_budget):
+        query_budget(reverse('employee-list'), self._employees, budget=2)
+
+    def test_employee_detail(self, query_budget):
+        query_budget(lambda rows: reverse('employee-detail', args=[rows[-1].pk]), self._employees, budget=1)
+
+    def test_client_group_list(self, query_budget):
+        query_budget(reverse('clientgroup-list'), self._client_groups, budget=2)
+
+    def test_client_group_detail(self, query_budget):
+        query_budget(lambda rows: reverse('clientgroup-detail', args=[rows[-1].pk]), self._client_groups, budget=1)
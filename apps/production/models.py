@@ -1,6 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator
-from apps.app_settings.models import UnitOfMeasure
+from apps.core import reference_data
 from apps.inventory.models import Product
 from apps.core.models import Zone
 
@@ -51,14 +51,7 @@ class ProductionMaterial(models.Model):
     quantity = models.DecimalField(max_digits=12, decimal_places=2)
     
     def __str__(self):
-        try:
-            unit_obj = UnitOfMeasure.objects.get(id=self.product.unit.id)
-            unit_symbol = unit_obj.symbol
-        except UnitOfMeasure.DoesNotExist:
-            unit_symbol = ""
-        except Exception:
-            unit_symbol = "units"
-            
+        unit_symbol = reference_data.unit_symbol(self.product) or "units"
         return f"{self.product.name} - {self.quantity} {unit_symbol}"
     
     class Meta:
@@ -1,9 +1,10 @@
 from rest_framework import serializers
-from decimal import Decimal
 from django.db import transaction
 
 from .models import Production, ProductionMaterial
-from apps.inventory.models import Stock, StockCard
+from apps.core import reference_data
+from apps.core.fieldsets import SparseFieldsMixin
+from apps.inventory.movements import StockMovement, apply_movements
 
 
 class ProductionMaterialSerializer(serializers.ModelSerializer):
@@ -15,10 +16,10 @@ class ProductionMaterialSerializer(serializers.ModelSerializer):
         fields = ['id', 'production', 'product', 'product_name', 'quantity', 'unit_symbol']
     
     def get_unit_symbol(self, obj):
-        return obj.product.unit.symbol if obj.product and obj.product.unit else ""
+        return reference_data.unit_symbol(obj.product)
 
 
-class ProductionSerializer(serializers.ModelSerializer):
+class ProductionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     zone_name = serializers.CharField(source='zone.name', read_only=True)
     materials = ProductionMaterialSerializer(many=True, read_only=True)
@@ -36,27 +37,15 @@ class ProductionSerializer(serializers.ModelSerializer):
             # Create the production record
             production = Production.objects.create(**validated_data)
             
-            # Get or create stock for this product in this zone
-            stock, created = Stock.objects.get_or_create(
+            # Production increases stock and is tracked on the StockCard
+            apply_movements([StockMovement(
                 product=production.product,
                 zone=production.zone,
-                defaults={'quantity': Decimal('0.00')}
-            )
-            
-            # Update stock quantity (production increases stock)
-            stock.quantity += production.quantity
-            stock.save()
-            
-            # Create StockCard entry to track this production
-            StockCard.objects.create(
-                product=production.product,
-                zone=production.zone,
-                date=production.date,
+                delta=production.quantity,
                 transaction_type='production',
                 reference=production.reference,
-                quantity_in=production.quantity,
-                quantity_out=Decimal('0.00'),
-                notes=f"Production: {production.notes}" if production.notes else "Production"
-            )
+                notes=f"Production: {production.notes}" if production.notes else "Production",
+                date=production.date,
+            )])
             
             return production
@@ -1,3 +1,64 @@
-from django.test import TestCase
+"""
+Tests for Production app - productions and their materials
+"""
+import pytest
+from django.urls import reverse
+from decimal import Decimal
+from datetime import date
 
-# Create your tests here.
+from apps.production.models import Production, ProductionMaterial
+from conftest import ProductFactory
+
+
+# ============= Query Budgets =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+@pytest.mark.slow
+class TestProductionQueryBudget:
+    """Query counts of the production endpoints do not grow with the data"""
+
+    def _materials(self, n, production, product_category, unit_of_measure):
+        return ProductionMaterial.objects.bulk_create([
+            ProductionMaterial(production=production, product=material, quantity=Decimal('1.00'))
+            for material in ProductFactory.create_batch(n, category=product_category, unit=unit_of_measure)
+        ])
+
+    def _production(self, product, zone):
+        start = Production.objects.count()
+        return Production.objects.create(
+            reference=f'PRD-{start}', product=product, quantity=Decimal('10.00'), zone=zone, date=date.today()
+        )
+
+    def test_production_list(self, query_budget, product, zone):
+        def seed(n):
+            for _ in range(n):
+                ProductionMaterial.objects.create(
+                    production=self._production(product, zone), product=product, quantity=Decimal('1.00')
+                )
+
+        query_budget(reverse('production-list'), seed, budget=3)
+
+    def test_production_detail(self, query_budget, product, zone, product_category, unit_of_measure):
+        production = self._production(product, zone)
+        query_budget(
+            reverse('production-detail', args=[production.pk]),
+            lambda n: self._materials(n, production, product_category, unit_of_measure),
+            budget=2,
+        )
+
+    def test_production_material_list(self, query_budget, product, zone, product_category, unit_of_measure):
+        production = self._production(product, zone)
+        query_budget(
+            reverse('production-material-list'),
+            lambda n: self._materials(n, production, product_category, unit_of_measure),
+            budget=2,
+        )
+
+    def test_production_material_detail(self, query_budget, product, zone, product_category, unit_of_measure):
+        production = self._production(product, zone)
+        query_budget(
+            lambda rows: reverse('production-material-detail', args=[rows[-1].pk]),
+            lambda n: self._materials(n, production, product_category, unit_of_measure),
+            budget=1,
+        )
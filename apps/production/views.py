@@ -1,20 +1,33 @@
+from django.db.models import Prefetch
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 
+from apps.core.querysets import QueryProfile, QueryProfileMixin
 from .models import Production, ProductionMaterial
 from .serializers import ProductionSerializer, ProductionMaterialSerializer
 
 
-class ProductionViewSet(viewsets.ModelViewSet):
+class ProductionViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for productions"""
     queryset = Production.objects.all().order_by('-date')
     serializer_class = ProductionSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(
+            select_related=['product', 'zone'],
+            prefetch_related=[Prefetch('materials', queryset=ProductionMaterial.objects.select_related('product'))],
+        ),
+        'destroy': QueryProfile(),
+    }
 
 
-class ProductionMaterialViewSet(viewsets.ModelViewSet):
+class ProductionMaterialViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for production materials"""
     queryset = ProductionMaterial.objects.all()
     serializer_class = ProductionMaterialSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['product']),
+        'destroy': QueryProfile(),
+    }
 
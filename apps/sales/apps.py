@@ -5,3 +5,7 @@ class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.sales'
     verbose_name = 'Sales - Orders & Invoicing'
+    
+    def ready(self):
+        """Import signals when app is ready"""
+        import apps.sales.signals  # noqa
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from apps.sales.payments import recalculate_payment_amounts
+
+
+class Command(BaseCommand):
+    help = "Recalculate paid/remaining amounts and payment status of sales from their cash receipts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Show the changes without writing them")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Sales updated per transaction")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        def progress(done, total):
+            self.stdout.write(f"  {done}/{total} sales processed")
+
+        result = recalculate_payment_amounts(
+            chunk_size=options['chunk_size'], dry_run=dry_run, progress=progress
+        )
+
+        if dry_run:
+            for change in result.changes:
+                self.stdout.write(
+                    f"{change.reference}: paid {change.old_paid_amount} -> {change.paid_amount}, "
+                    f"status {change.old_payment_status} -> {change.payment_status}"
+                )
+            self.stdout.write(self.style.WARNING(f"Dry run: {len(result.changes)} sales would be updated"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Payment amounts recalculated for {result.updated} sales"))
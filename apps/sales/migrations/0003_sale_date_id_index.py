@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_remove_extra_quoteitem_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date', 'id'], name='sale_date_id_idx'),
+        ),
+    ]
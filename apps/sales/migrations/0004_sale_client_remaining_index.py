@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_sale_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['client', 'remaining_amount'], name='sale_client_remaining_idx'),
+        ),
+    ]
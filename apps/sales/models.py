@@ -3,10 +3,12 @@ from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
-from apps.app_settings.models import ChargeType, UnitOfMeasure
+from apps.app_settings.models import ChargeType
 from apps.partners.models import Client
 from apps.inventory.models import Product
 from apps.core.models import Zone
+from apps.core import reference_data
+from apps.core.sequences import save_with_reference
 from apps.treasury.models import Account
 
 
@@ -93,51 +95,25 @@ class Sale(models.Model):
         if self.status == 'confirmed':
             self.status = 'payment_pending'
         if not self.pk and not self.reference:
-            from django.db import transaction
-            with transaction.atomic():
-                year = timezone.now().year
-                last_sale = Sale.objects.filter(reference__startswith=f"VNT-{year}-").select_for_update().order_by('-reference').first()
-                if last_sale:
-                    try:
-                        last_number = int(last_sale.reference.split('-')[-1])
-                        next_number = last_number + 1
-                    except (ValueError, IndexError):
-                        count = Sale.objects.filter(reference__startswith=f"VNT-{year}-").count()
-                        next_number = count + 1
-                else:
-                    next_number = 1
-                self.reference = f"VNT-{year}-{next_number:03d}"
-                while Sale.objects.filter(reference=self.reference).exists():
-                    next_number += 1
-                    self.reference = f"VNT-{year}-{next_number:03d}"
+            return save_with_reference(self, 'VNT', super().save, *args, **kwargs)
         super().save(*args, **kwargs)
     
     def delete(self, *args, **kwargs):
         """Handle safe deletion - restore stock and reverse payments"""
-        from apps.inventory.models import Stock, StockCard
-        from apps.treasury.models import AccountStatement, CashReceipt
+        from apps.inventory.movements import StockMovement, apply_movements
         
         # Restore stock for each sale item and create StockCard entries
-        for item in self.items.all():
-            stock, created = Stock.objects.get_or_create(
+        apply_movements(
+            StockMovement(
                 product=item.product,
                 zone=self.zone,
-                defaults={'quantity': 0}
-            )
-            stock.quantity += item.quantity
-            stock.save()
-            
-            # Create StockCard entry for the return
-            StockCard.objects.create(
-                product=item.product,
-                zone=self.zone,
-                date=timezone.now().date(),
+                delta=item.quantity,
                 transaction_type='return',
                 reference=f"RETURN-{self.reference}",
-                quantity_in=item.quantity,
-                quantity_out=0,
-                notes=f"Sale deletion return: {self.reference}"
+                notes=f"Sale deletion return: {self.reference}",
             )
+            for item in self.items.select_related('product')
+        )
         
         # Reverse payments - create reversing AccountStatement entries
         self._reverse_payments()
@@ -147,88 +123,57 @@ class Sale(models.Model):
     
     def _reverse_payments(self):
         """Reverse all payment transactions for this sale"""
-        from apps.treasury.models import AccountStatement, CashReceipt
+        from apps.treasury.ledger import LedgerEntry, post_entries
+        from apps.treasury.models import CashReceipt
         
         # Get all cash receipts for this sale
-        cash_receipts = CashReceipt.objects.filter(sale=self)
+        cash_receipts = CashReceipt.objects.filter(sale=self, account__isnull=False).select_related('account')
+        if not cash_receipts:
+            return
+        
+        # Get the client account
+        try:
+            client_account = Account.objects.get(account_type='client', client=self.client)
+        except Account.DoesNotExist:
+            return
         
+        entries = []
         for receipt in cash_receipts:
-            # Get the client account
-            try:
-                client_account = Account.objects.get(account_type='client', client=self.client)
-            except Account.DoesNotExist:
-                continue
-            
-            # Get the company account
-            company_account = receipt.account
-            
-            # Get last statements for both accounts
-            last_client_statement = AccountStatement.objects.filter(
-                account=client_account
-            ).order_by('-date', '-id').first()
-            client_balance = last_client_statement.balance if last_client_statement else Decimal('0.00')
-            
-            last_company_statement = AccountStatement.objects.filter(
-                account=company_account
-            ).order_by('-date', '-id').first()
-            company_balance = last_company_statement.balance if last_company_statement else Decimal('0.00')
-            
-            # Create reversing entries
             # Credit client account (reverse the debit)
-            new_client_balance = client_balance + receipt.allocated_amount
-            AccountStatement.objects.create(
+            entries.append(LedgerEntry(
                 account=client_account,
-                date=timezone.now().date(),
                 transaction_type='sale',
                 reference=f"REV-{receipt.reference}",
                 description=f"Annulation paiement vente {self.reference}",
                 credit=receipt.allocated_amount,
-                debit=0,
-                balance=new_client_balance,
-            )
-            client_account.current_balance = new_client_balance
-            client_account.save(update_fields=['current_balance'])
-            
+            ))
             # Debit company account (reverse the credit)
-            new_company_balance = company_balance - receipt.allocated_amount
-            AccountStatement.objects.create(
-                account=company_account,
-                date=timezone.now().date(),
+            entries.append(LedgerEntry(
+                account=receipt.account,
                 transaction_type='sale',
                 reference=f"REV-{receipt.reference}",
                 description=f"Annulation encaissement vente {self.reference}",
-                credit=0,
                 debit=receipt.allocated_amount,
-                balance=new_company_balance,
-            )
-            company_account.current_balance = new_company_balance
-            company_account.save(update_fields=['current_balance'])
+            ))
+        
+        post_entries(entries)
     
     def _handle_cancellation(self):
         """Handle sale cancellation - restore stock and reverse payments"""
-        from apps.inventory.models import Stock, StockCard
+        from apps.inventory.movements import StockMovement, apply_movements
         
         # Restore stock for each sale item and create StockCard entries
-        for item in self.items.all():
-            stock, created = Stock.objects.get_or_create(
+        apply_movements(
+            StockMovement(
                 product=item.product,
                 zone=self.zone,
-                defaults={'quantity': 0}
-            )
-            stock.quantity += item.quantity
-            stock.save()
-            
-            # Create StockCard entry for the cancellation return
-            StockCard.objects.create(
-                product=item.product,
-                zone=self.zone,
-                date=timezone.now().date(),
+                delta=item.quantity,
                 transaction_type='return',
                 reference=f"CANCEL-{self.reference}",
-                quantity_in=item.quantity,
-                quantity_out=0,
-                notes=f"Sale cancellation: {self.reference}"
+                notes=f"Sale cancellation: {self.reference}",
             )
+            for item in self.items.select_related('product')
+        )
         
         # Reverse payments
         self._reverse_payments()
@@ -237,6 +182,10 @@ class Sale(models.Model):
         db_table = 'gestion_api_sale'
         verbose_name = "Vente"
         verbose_name_plural = "Ventes"
+        indexes = [
+            models.Index(fields=['date', 'id'], name='sale_date_id_idx'),
+            models.Index(fields=['client', 'remaining_amount'], name='sale_client_remaining_idx'),
+        ]
 
 
 class SaleItem(models.Model):
@@ -255,12 +204,7 @@ class SaleItem(models.Model):
     total_price = models.DecimalField(max_digits=15, decimal_places=2)
     
     def __str__(self):
-        try:
-            unit_obj = UnitOfMeasure.objects.get(id=self.product.unit.id)
-            unit_symbol = unit_obj.symbol
-        except (UnitOfMeasure.DoesNotExist, AttributeError, Exception):
-            unit_symbol = ""
-            
+        unit_symbol = reference_data.unit_symbol(self.product)
         return f"{self.product.name} - {self.quantity} {unit_symbol}"
     
     class Meta:
@@ -323,12 +267,7 @@ class DeliveryNoteItem(models.Model):
     quantity = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     
     def __str__(self):
-        try:
-            unit_obj = UnitOfMeasure.objects.get(id=self.product.unit.id)
-            unit_symbol = unit_obj.symbol
-        except (UnitOfMeasure.DoesNotExist, AttributeError, Exception):
-            unit_symbol = ""
-            
+        unit_symbol = reference_data.unit_symbol(self.product)
         return f"{self.product.name} ({self.quantity} {unit_symbol})"
     
     class Meta:
@@ -427,28 +366,7 @@ class Quote(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.pk and not self.reference:
-            from django.db import transaction
-            
-            with transaction.atomic():
-                year = timezone.now().year
-                last_quote = Quote.objects.filter(reference__startswith=f"DEV-{year}-").select_for_update().order_by('-reference').first()
-                
-                if last_quote:
-                    try:
-                        last_number = int(last_quote.reference.split('-')[-1])
-                        next_number = last_number + 1
-                    except (ValueError, IndexError):
-                        count = Quote.objects.filter(reference__startswith=f"DEV-{year}-").count()
-                        next_number = count + 1
-                else:
-                    next_number = 1
-                
-                self.reference = f"DEV-{year}-{next_number:03d}"
-                
-                while Quote.objects.filter(reference=self.reference).exists():
-                    next_number += 1
-                    self.reference = f"DEV-{year}-{next_number:03d}"
-        
+            return save_with_reference(self, 'DEV', super().save, *args, **kwargs)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -478,12 +396,7 @@ class QuoteItem(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        try:
-            unit_obj = UnitOfMeasure.objects.get(id=self.product.unit.id)
-            unit_symbol = unit_obj.symbol
-        except (UnitOfMeasure.DoesNotExist, AttributeError, Exception):
-            unit_symbol = ""
-            
+        unit_symbol = reference_data.unit_symbol(self.product)
         return f"{self.quote.reference} - {self.product.name} ({self.quantity} {unit_symbol})"
     
     class Meta:
@@ -0,0 +1,113 @@
+"""
+Sale payment amounts
+Recomputes Sale.paid_amount from cash receipts in set-based chunks
+"""
+
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.core.caching import invalidate_tags
+
+from .models import Sale
+
+
+PaymentChange = namedtuple(
+    'PaymentChange',
+    ['sale_id', 'reference', 'old_paid_amount', 'paid_amount', 'old_payment_status', 'payment_status'],
+)
+
+RecalculationResult = namedtuple('RecalculationResult', ['checked', 'updated', 'changes'])
+
+
+def payment_status_for(total_amount, paid_amount):
+    """Payment status of a sale given its total and the amount received"""
+    if paid_amount >= total_amount:
+        return 'paid'
+    if paid_amount > 0:
+        return 'partially_paid'
+    return 'unpaid'
+
+
+def sales_with_stale_payments():
+    """
+    Sales whose paid or remaining amount disagrees with their cash receipts,
+    annotated with `receipts_total`, the paid amount they should have.
+    """
+    from apps.treasury.models import CashReceipt
+
+    amount = DecimalField(max_digits=15, decimal_places=2)
+    receipts_total = Subquery(
+        CashReceipt.objects.filter(sale=OuterRef('pk')).order_by().values('sale').annotate(
+            total=Sum('allocated_amount')
+        ).values('total')[:1],
+        output_field=amount,
+    )
+    return Sale.objects.annotate(
+        receipts_total=Coalesce(receipts_total, Value(Decimal('0.00'), output_field=amount))
+    ).exclude(
+        Q(paid_amount=F('receipts_total')) & Q(remaining_amount=F('total_amount') - F('receipts_total'))
+    )
+
+
+def recalculate_payment_amounts(chunk_size=500, dry_run=False, progress=None):
+    """
+    Bring paid_amount, remaining_amount and payment_status of every sale in
+    line with its cash receipts.
+
+    Stale sales are found with a single Subquery annotation and rewritten
+    chunk by chunk with bulk_update, walking the primary key so each chunk
+    is a short transaction. bulk_update skips Sale signals, so the daily
+    sales rollup and the report cache are refreshed here for the touched
+    days. With `dry_run` nothing is written and the returned changes are
+    the diff that would be applied. `progress(done, total)` is called after
+    every chunk.
+    """
+    from apps.dashboard.rollups import refresh_daily_sales
+    from .reports import invalidate_sales_reports
+
+    stale = sales_with_stale_payments().only(
+        'id', 'reference', 'date', 'zone_id', 'total_amount', 'paid_amount',
+        'remaining_amount', 'payment_status',
+    ).order_by('pk')
+    total = stale.count()
+
+    changes = []
+    checked = 0
+    last_pk = 0
+    while True:
+        chunk = list(stale.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        checked += len(chunk)
+
+        now = timezone.now()
+        for sale in chunk:
+            new_status = payment_status_for(sale.total_amount, sale.receipts_total)
+            changes.append(PaymentChange(
+                sale.pk, sale.reference, sale.paid_amount, sale.receipts_total,
+                sale.payment_status, new_status,
+            ))
+            sale.paid_amount = sale.receipts_total
+            sale.remaining_amount = sale.total_amount - sale.receipts_total
+            sale.payment_status = new_status
+            sale.updated_at = now
+
+        if not dry_run:
+            with transaction.atomic():
+                Sale.objects.bulk_update(
+                    chunk, ['paid_amount', 'remaining_amount', 'payment_status', 'updated_at']
+                )
+                refresh_daily_sales({(sale.date, sale.zone_id) for sale in chunk})
+                invalidate_sales_reports()
+                invalidate_tags('sales')
+
+        if progress:
+            progress(checked, total)
+
+    return RecalculationResult(checked, 0 if dry_run else len(changes), changes)
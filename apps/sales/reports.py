@@ -0,0 +1,125 @@
+"""
+Sales report engine
+Builds the sales report from grouped queries and caches it per period
+"""
+
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from apps.core.caching import bump_version, get_version
+
+from .models import SaleItem
+
+
+MONTHS = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
+
+REPORT_CACHE_TIMEOUT = 60 * 15
+REPORT_VERSION_KEY = 'sales_report_version'
+
+
+def resolve_report_period(period, start_date_param=None, end_date_param=None, today=None):
+    """Turn the report query parameters into a (start_date, end_date) pair"""
+    today = today or datetime.now().date()
+    if period == 'month':
+        return date(today.year, today.month, 1), today
+    if period == 'quarter':
+        current_quarter = (today.month - 1) // 3 + 1
+        start_date = date(today.year, 3 * current_quarter - 2, 1)
+        if current_quarter < 4:
+            end_date = date(today.year, 3 * (current_quarter + 1) - 2, 1) - timedelta(days=1)
+        else:
+            end_date = date(today.year, 12, 31)
+        return start_date, end_date
+    if period == 'semester':
+        if today.month <= 6:
+            return date(today.year, 1, 1), date(today.year, 6, 30)
+        return date(today.year, 7, 1), date(today.year, 12, 31)
+    if period == 'custom':
+        try:
+            if start_date_param and end_date_param:
+                return (
+                    datetime.strptime(start_date_param, '%Y-%m-%d').date(),
+                    datetime.strptime(end_date_param, '%Y-%m-%d').date(),
+                )
+        except (ValueError, TypeError):
+            pass
+        return today - timedelta(days=30), today
+    # 'year' and anything unknown
+    return date(today.year, 1, 1), date(today.year, 12, 31)
+
+
+def build_sales_report(start_date, end_date):
+    """
+    Build the report in three grouped queries, whatever the number of
+    months, categories or products: the monthly series for the start year
+    (from the daily rollup), revenue per category and the top 5 products.
+    Cancelled sales are left out everywhere, as in the rollup.
+    """
+    from apps.dashboard.models import DailySalesRollup
+
+    monthly_totals = {
+        row['month'].month: row['total']
+        for row in DailySalesRollup.objects.filter(date__year=start_date.year).annotate(
+            month=TruncMonth('date')
+        ).values('month').annotate(total=Sum('revenue')).order_by()
+    }
+    monthly_data = [
+        {'month': MONTHS[month - 1], 'amount': float(monthly_totals.get(month, 0))}
+        for month in range(1, 13)
+    ]
+
+    items = SaleItem.objects.filter(
+        sale__date__gte=start_date,
+        sale__date__lte=end_date,
+    ).exclude(sale__status='cancelled')
+
+    category_rows = items.filter(product__category__isnull=False).values(
+        'product__category__name'
+    ).annotate(total=Sum('total_price')).filter(total__gt=0).order_by('product__category__name')
+    category_data = [
+        {'category': row['product__category__name'], 'amount': float(row['total'])}
+        for row in category_rows
+    ]
+
+    top_rows = items.values('product__id', 'product__name').annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum('total_price'),
+    ).order_by('-total_revenue')[:5]
+    top_products = [
+        {
+            'name': row['product__name'],
+            'quantity': float(row['total_quantity']),
+            'revenue': float(row['total_revenue']),
+        }
+        for row in top_rows
+    ]
+
+    return {
+        'monthly_data': monthly_data,
+        'category_data': category_data,
+        'top_products': top_products,
+    }
+
+
+def get_sales_report(period, start_date_param=None, end_date_param=None):
+    """Return the report for the requested period, from cache when possible"""
+    start_date, end_date = resolve_report_period(period, start_date_param, end_date_param)
+    version = get_version(REPORT_VERSION_KEY)
+    cache_key = f'sales_report:{version}:{period}:{start_date}:{end_date}'
+    report = cache.get(cache_key)
+    if report is None:
+        report = build_sales_report(start_date, end_date)
+        cache.set(cache_key, report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+def invalidate_sales_reports():
+    """
+    Retire every cached report once the current transaction commits, so a
+    report built mid-transaction cannot outlive the change it missed.
+    """
+    transaction.on_commit(lambda: bump_version(REPORT_VERSION_KEY))
@@ -1,11 +1,14 @@
 from rest_framework import serializers
-from decimal import Decimal
+from django.db import transaction
 
 from .models import (
     Sale, SaleItem, DeliveryNote, DeliveryNoteItem, Invoice, Quote, QuoteItem, 
     SaleCharge, ChargeType
 )
-from apps.inventory.models import Stock, StockCard
+from apps.core import reference_data
+from apps.core.fieldsets import SparseFieldsMixin
+from apps.inventory.availability import shortage_error
+from apps.inventory.movements import InsufficientStock, StockMovement, apply_movements
 from apps.partners.models import Client
 
 
@@ -20,7 +23,7 @@ class SaleItemSerializer(serializers.ModelSerializer):
         extra_kwargs = {'sale': {'required': False}}
 
 
-class SaleSerializer(serializers.ModelSerializer):
+class SaleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = SaleItemSerializer(many=True)
     reference = serializers.CharField(required=False)
 
@@ -32,35 +35,33 @@ class SaleSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        sale = Sale.objects.create(**validated_data)
 
-        # Create SaleItem records and reduce stock
-        for item_data in items_data:
-            item = SaleItem.objects.create(sale=sale, **item_data)
-
-            stock, created = Stock.objects.get_or_create(
-                product=item.product,
-                zone=sale.zone,
-                defaults={'quantity': 0}
-            )
-
-            # Reduce stock (ensure it doesn't go negative)
-            if stock.quantity < item.quantity:
-                raise ValueError(f"Not enough stock for product {item.product}")
-            stock.quantity -= item.quantity
-            stock.save()
-            
-            # Create Stock Card entry for the sale
-            StockCard.objects.create(
-                product=item.product,
-                zone=sale.zone,
-                date=sale.date,
-                transaction_type='sale',
-                reference=sale.reference,
-                quantity_in=0,
-                quantity_out=item.quantity,
-                notes=f"Sale: {sale.reference}"
-            )
+        with transaction.atomic():
+            sale = Sale.objects.create(**validated_data)
+            items = []
+            for item_data in items_data:
+                item_data.pop('sale', None)
+                items.append(SaleItem(sale=sale, **item_data))
+
+            SaleItem.objects.bulk_create(items)
+
+            # Reduce stock: the guarded UPDATE is the availability check, so
+            # stock is read once, by the write
+            try:
+                apply_movements(
+                    StockMovement(
+                        product=item.product,
+                        zone=sale.zone,
+                        delta=-item.quantity,
+                        transaction_type='sale',
+                        reference=sale.reference,
+                        notes=f"Sale: {sale.reference}",
+                        date=sale.date,
+                    )
+                    for item in items
+                )
+            except InsufficientStock as exc:
+                raise shortage_error(exc)
 
         return sale
 
@@ -102,19 +103,13 @@ class DeliveryNoteItemSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = DeliveryNoteItem
-        fields = ['id', 'delivery_note', 'product', 'product_name', 'quantity', 
-                  'unit_price', 'total_price', 'unit_symbol']
+        fields = ['id', 'delivery_note', 'product', 'product_name', 'quantity', 'unit_symbol']
     
     def get_unit_symbol(self, obj):
-        try:
-            if obj.product and obj.product.unit:
-                return obj.product.unit.symbol
-        except:
-            pass
-        return None
+        return reference_data.unit_symbol(obj.product) or None
 
 
-class DeliveryNoteSerializer(serializers.ModelSerializer):
+class DeliveryNoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = DeliveryNoteItemSerializer(many=True, read_only=True)
     
     class Meta:
@@ -134,7 +129,7 @@ class SaleChargeSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client_name = serializers.SerializerMethodField()
     sale_reference = serializers.SerializerMethodField()
 
@@ -186,7 +181,7 @@ class QuoteItemSerializer(serializers.ModelSerializer):
                   'discount_percentage', 'total_price']
 
 
-class QuoteSerializer(serializers.ModelSerializer):
+class QuoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = QuoteItemSerializer(many=True)
     reference = serializers.CharField(required=False, allow_blank=True)
 
@@ -0,0 +1,19 @@
+"""
+Signals for sales app
+Handles cache invalidation when sales change
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Sale, SaleItem
+from .reports import invalidate_sales_reports
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=SaleItem)
+@receiver(post_delete, sender=SaleItem)
+def invalidate_sales_report_cache(sender, instance, **kwargs):
+    """Drop cached sales reports when a sale or sale line changes"""
+    invalidate_sales_reports()
@@ -1,15 +1,30 @@
 """
 Tests for Sales app - Sale, SaleItem, Invoice, Quote models and APIs
 """
+import time
+
 import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from decimal import Decimal
 from datetime import date, timedelta
 
-from apps.sales.models import Sale, SaleItem, Quote, QuoteItem, Invoice
+from apps.sales.models import DeliveryNote, DeliveryNoteItem, Invoice, Quote, QuoteItem, Sale, SaleCharge, SaleItem
 from apps.inventory.models import Stock, StockCard
+from apps.core.sequences import next_reference
+from apps.sales.payments import recalculate_payment_amounts
+from apps.sales.serializers import SaleSerializer
+from apps.dashboard.models import DailySalesRollup
 from apps.treasury.models import Account, CashReceipt, AccountStatement
+from apps.app_settings.models import ChargeType
+from conftest import (
+    ProductCategoryFactory, ProductFactory, SaleFactory, SaleItemFactory, StockFactory
+)
 
 
 # ============= Sale Model Tests =============
@@ -381,6 +396,32 @@ class TestSalePaymentIntegration:
         assert sale_with_items.payment_status == 'partially_paid'
         assert sale_with_items.remaining_amount == partial_amount
 
+    
+    def test_cancellation_reverses_payments(self, db, sale_with_items, account, payment_method):
+        """Test cancelling a paid sale posts reversing ledger lines on both accounts"""
+        client_account = sale_with_items.client.account
+        client_account.account_type = 'client'
+        client_account.save()
+        client_start = client_account.current_balance
+        company_start = account.current_balance
+        CashReceipt.objects.create(
+            sale=sale_with_items,
+            account=account,
+            client=sale_with_items.client,
+            date=date.today(),
+            amount=Decimal('300.00'),
+            allocated_amount=Decimal('300.00'),
+            payment_method=payment_method
+        )
+        
+        sale_with_items.status = 'cancelled'
+        sale_with_items.save()
+        
+        client_account.refresh_from_db()
+        account.refresh_from_db()
+        assert client_account.current_balance == client_start + Decimal('300.00')
+        assert account.current_balance == company_start - Decimal('300.00')
+        assert AccountStatement.objects.filter(reference__startswith='REV-').count() == 2
 
 @pytest.mark.django_db
 @pytest.mark.integration  
@@ -418,3 +459,389 @@ class TestSaleStockIntegration:
         )
         assert stock_cards.exists()
         assert stock_cards.first().quantity_out == sale_quantity
+
+
+# ============= Batched Sale Creation =============
+
+def _sale_payload(client_partner, zone, lines):
+    """Build a sale payload with one item per (product, quantity) line"""
+    items = [
+        {
+            'product': product.id,
+            'quantity': str(quantity),
+            'unit_price': '150.00',
+            'discount_percentage': '0.00',
+            'total_price': str((quantity * Decimal('150.00')).quantize(Decimal('0.01'))),
+        }
+        for product, quantity in lines
+    ]
+    total = sum(Decimal(item['total_price']) for item in items)
+    return {
+        'client': client_partner.id,
+        'zone': zone.id,
+        'date': date.today().isoformat(),
+        'status': 'draft',
+        'payment_status': 'unpaid',
+        'subtotal': str(total),
+        'total_amount': str(total),
+        'paid_amount': '0.00',
+        'remaining_amount': str(total),
+        'items': items,
+    }
+
+
+@pytest.mark.django_db
+class TestSaleBatchedCreate:
+    """Test the batched write path of SaleSerializer.create"""
+
+    def test_create_reduces_stock_for_every_line(self, client_partner, zone, regular_user):
+        """Test stock and stock cards are written for all lines"""
+        stocks = [StockFactory(zone=zone, quantity=Decimal('50.00')) for _ in range(3)]
+        lines = [(stock.product, Decimal('4.00')) for stock in stocks]
+
+        serializer = SaleSerializer(data=_sale_payload(client_partner, zone, lines))
+        assert serializer.is_valid(), serializer.errors
+        sale = serializer.save(created_by=regular_user)
+
+        assert sale.items.count() == 3
+        for stock in stocks:
+            stock.refresh_from_db()
+            assert stock.quantity == Decimal('46.00')
+        assert StockCard.objects.filter(reference=sale.reference, transaction_type='sale').count() == 3
+
+    def test_repeated_product_lines_are_summed(self, client_partner, zone, product, stock):
+        """Test several lines for one product are checked and deducted together"""
+        lines = [(product, Decimal('30.00')), (product, Decimal('30.00'))]
+        stock.quantity = Decimal('50.00')
+        stock.save()
+
+        serializer = SaleSerializer(data=_sale_payload(client_partner, zone, lines))
+        assert serializer.is_valid(), serializer.errors
+        with pytest.raises(ValidationError) as excinfo:
+            serializer.save()
+        assert "10.00 missing" in excinfo.value.detail['items'][0]
+
+    def test_stock_is_read_once_by_the_write(self, client_partner, zone, regular_user):
+        """Test validation reads no stock and the guarded UPDATE is the only stock statement"""
+        stocks = [StockFactory(zone=zone, quantity=Decimal('50.00')) for _ in range(3)]
+        serializer = SaleSerializer(data=_sale_payload(client_partner, zone, [(s.product, Decimal('4.00')) for s in stocks]))
+
+        with CaptureQueriesContext(connection) as ctx:
+            assert serializer.is_valid(), serializer.errors
+            serializer.save(created_by=regular_user)
+        stock_queries = [q['sql'] for q in ctx.captured_queries if '"gestion_api_stock"' in q['sql']]
+        assert len(stock_queries) == 1
+        assert stock_queries[0].startswith('UPDATE')
+
+    def test_short_sale_is_a_400(self, authenticated_client, client_partner, zone, stock):
+        """Test a shortage found by the write is reported per line like a validation error"""
+        response = authenticated_client.post(
+            reverse('sale-list'),
+            _sale_payload(client_partner, zone, [(stock.product, stock.quantity + 1)]),
+            format='json',
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "1.00 missing" in response.data['items'][0]
+        assert not Sale.objects.filter(client=client_partner).exists()
+
+    def test_stock_sold_after_validation_is_caught(self, client_partner, zone, product, stock):
+        """Test stock taken between validation and save still rolls the sale back"""
+        stock.quantity = Decimal('50.00')
+        stock.save()
+        serializer = SaleSerializer(data=_sale_payload(client_partner, zone, [(product, Decimal('40.00'))]))
+        assert serializer.is_valid(), serializer.errors
+
+        Stock.objects.filter(pk=stock.pk).update(quantity=Decimal('20.00'))
+        with pytest.raises(ValidationError):
+            serializer.save()
+
+        stock.refresh_from_db()
+        assert stock.quantity == Decimal('20.00')
+        assert not Sale.objects.filter(client=client_partner).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.slow
+class TestSaleCreateBenchmark:
+    """Query count and latency of sale creation against line count"""
+
+    LINE_COUNTS = [1, 10, 60]
+
+    def test_write_path_query_count_is_constant(self, client_partner, zone, regular_user):
+        """Test the write path costs the same number of queries for 1 or 60 lines"""
+        next_reference(Sale, 'VNT')  # create the reference sequence outside the measurement
+        results = []
+        for line_count in self.LINE_COUNTS:
+            stocks = [StockFactory(zone=zone, quantity=Decimal('1000.00')) for _ in range(line_count)]
+            lines = [(stock.product, Decimal('1.00')) for stock in stocks]
+            serializer = SaleSerializer(data=_sale_payload(client_partner, zone, lines))
+            assert serializer.is_valid(), serializer.errors
+
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                serializer.save(created_by=regular_user)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            results.append((line_count, len(ctx.captured_queries), elapsed_ms))
+
+        print("\nlines  queries  latency_ms")
+        for line_count, queries, elapsed_ms in results:
+            print(f"{line_count:>5}  {queries:>7}  {elapsed_ms:>10.1f}")
+
+        query_counts = {queries for _, queries, _ in results}
+        assert len(query_counts) == 1
+
+
+# ============= Sales Report =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestSalesReport:
+    """Test the grouped, cached sales report"""
+
+    def test_report_content(self, authenticated_client, zone):
+        """Test monthly series, categories and top products, cancelled sales left out"""
+        sale = SaleFactory(zone=zone, total_amount=Decimal('500.00'))
+        SaleItemFactory(sale=sale, total_price=Decimal('300.00'))
+        SaleItemFactory(sale=sale, total_price=Decimal('200.00'))
+        cancelled = SaleFactory(zone=zone, status='cancelled')
+        SaleItemFactory(sale=cancelled)
+
+        response = authenticated_client.get(reverse('sales-reports'), {'period': 'year'})
+
+        assert response.status_code == status.HTTP_200_OK
+        month = response.data['monthly_data'][date.today().month - 1]
+        assert month['amount'] == 500.0
+        assert sum(row['amount'] for row in response.data['category_data']) == 500.0
+        assert [row['revenue'] for row in response.data['top_products']] == [300.0, 200.0]
+
+    def test_query_count_is_independent_of_categories(self, authenticated_client, zone,
+                                                      django_assert_max_num_queries):
+        """Test the report costs the same whatever the number of categories"""
+        sale = SaleFactory(zone=zone)
+        for _ in range(15):
+            SaleItemFactory(sale=sale, product=ProductFactory(category=ProductCategoryFactory()))
+
+        with django_assert_max_num_queries(6):
+            response = authenticated_client.get(reverse('sales-reports'), {'period': 'year'})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['category_data']) == 15
+
+    def test_report_is_cached_until_sales_change(self, authenticated_client, zone,
+                                                 django_assert_max_num_queries,
+                                                 django_capture_on_commit_callbacks):
+        """Test a repeated report hits the cache and a new sale invalidates it"""
+        url = reverse('sales-reports')
+        SaleFactory(zone=zone, total_amount=Decimal('100.00'))
+        authenticated_client.get(url, {'period': 'year'})
+
+        with django_assert_max_num_queries(3):
+            cached = authenticated_client.get(url, {'period': 'year'})
+        assert cached.data['monthly_data'][date.today().month - 1]['amount'] == 100.0
+
+        with django_capture_on_commit_callbacks(execute=True):
+            SaleFactory(zone=zone, total_amount=Decimal('50.00'))
+
+        fresh = authenticated_client.get(url, {'period': 'year'})
+        assert fresh.data['monthly_data'][date.today().month - 1]['amount'] == 150.0
+
+
+# ============= Payment Recalculation =============
+
+@pytest.mark.django_db
+class TestRecalculatePaymentAmounts:
+    """Test the set-based payment amount recalculation"""
+
+    def _receipt(self, sale, amount):
+        return CashReceipt.objects.create(
+            sale=sale, client=sale.client, date=date.today(),
+            amount=Decimal(amount), allocated_amount=Decimal(amount)
+        )
+
+    def test_stale_sales_are_corrected(self, zone):
+        """Test paid/remaining amounts, status and the rollup follow the receipts"""
+        partial = SaleFactory(zone=zone, total_amount=Decimal('1000.00'))
+        paid = SaleFactory(zone=zone, total_amount=Decimal('500.00'))
+        untouched = SaleFactory(
+            zone=zone, total_amount=Decimal('300.00'), remaining_amount=Decimal('300.00')
+        )
+        self._receipt(partial, '400.00')
+        self._receipt(paid, '200.00')
+        self._receipt(paid, '300.00')
+
+        result = recalculate_payment_amounts(chunk_size=1)
+
+        assert result.updated == 2
+        partial.refresh_from_db()
+        paid.refresh_from_db()
+        untouched.refresh_from_db()
+        assert partial.paid_amount == Decimal('400.00')
+        assert partial.remaining_amount == Decimal('600.00')
+        assert partial.payment_status == 'partially_paid'
+        assert paid.payment_status == 'paid'
+        assert untouched.payment_status == 'unpaid'
+        assert DailySalesRollup.objects.get(zone=zone).paid_amount == Decimal('900.00')
+        assert recalculate_payment_amounts().updated == 0
+
+    def test_dry_run_reports_without_writing(self, zone):
+        """Test a dry run returns the diff and leaves sales alone"""
+        sale = SaleFactory(zone=zone, total_amount=Decimal('1000.00'))
+        self._receipt(sale, '250.00')
+
+        result = recalculate_payment_amounts(dry_run=True)
+
+        assert result.updated == 0
+        assert [(c.reference, c.paid_amount, c.payment_status) for c in result.changes] == [
+            (sale.reference, Decimal('250.00'), 'partially_paid')
+        ]
+        sale.refresh_from_db()
+        assert sale.paid_amount == Decimal('0.00')
+
+    def test_query_count_depends_on_chunks_not_sales(self, zone, django_assert_max_num_queries):
+        """Test one chunk of many sales costs a fixed number of queries"""
+        for sale in SaleFactory.create_batch(40, zone=zone, total_amount=Decimal('100.00')):
+            self._receipt(sale, '100.00')
+
+        with django_assert_max_num_queries(12):
+            result = recalculate_payment_amounts(chunk_size=100)
+        assert result.updated == 40
+
+    def test_command_and_api(self, authenticated_client, zone):
+        """Test the management command dry run and the API trigger"""
+        sale = SaleFactory(zone=zone, total_amount=Decimal('1000.00'))
+        self._receipt(sale, '1000.00')
+
+        out = StringIO()
+        call_command('recalculate_payment_amounts', '--dry-run', stdout=out)
+        assert f"{sale.reference}: paid 0.00 -> 1000.00" in out.getvalue()
+
+        response = authenticated_client.post(reverse('sale-recalculate-payment-amounts'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['sales_updated'] == 1
+        sale.refresh_from_db()
+        assert sale.payment_status == 'paid'
+
+
+# ============= Query Budgets =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+@pytest.mark.slow
+class TestSalesQueryBudget:
+    """Query counts of the sales endpoints do not grow with the data"""
+
+    def test_sale_list(self, query_budget, client_partner, zone, regular_user):
+        query_budget(
+            reverse('sale-list'),
+            lambda n: SaleFactory.create_batch(n, client=client_partner, zone=zone, created_by=regular_user),
+            budget=3,
+        )
+
+    def test_sale_detail(self, query_budget, sale, product):
+        query_budget(
+            reverse('sale-detail', args=[sale.pk]),
+            lambda n: SaleItemFactory.create_batch(n, sale=sale, product=product),
+            budget=2,
+        )
+
+    def test_sales_report(self, query_budget, client_partner, zone, regular_user, product):
+        def seed(n):
+            for sale in SaleFactory.create_batch(n, client=client_partner, zone=zone, created_by=regular_user):
+                SaleItemFactory(sale=sale, product=product)
+
+        query_budget(reverse('sales-reports'), seed, budget=3)
+
+    def test_invoice_list(self, query_budget, client_partner, zone, regular_user):
+        def seed(n):
+            for sale in SaleFactory.create_batch(n, client=client_partner, zone=zone, created_by=regular_user):
+                Invoice.objects.create(
+                    reference=f'FAC-{sale.reference}', sale=sale, date=date.today(), due_date=date.today(),
+                    amount=sale.total_amount, balance=sale.total_amount,
+                )
+
+        query_budget(reverse('invoice-list'), seed, budget=2)
+
+    def test_invoice_detail(self, query_budget, client_partner, zone, regular_user):
+        def seed(n):
+            return [
+                Invoice.objects.create(
+                    reference=f'FAC-{sale.reference}', sale=sale, date=date.today(), due_date=date.today(),
+                    amount=sale.total_amount, balance=sale.total_amount,
+                )
+                for sale in SaleFactory.create_batch(n, client=client_partner, zone=zone, created_by=regular_user)
+            ]
+
+        query_budget(lambda rows: reverse('invoice-detail', args=[rows[-1].pk]), seed, budget=1)
+
+    def test_quote_list(self, query_budget, client_partner, product):
+        def seed(n):
+            for _ in range(n):
+                quote = Quote.objects.create(
+                    client=client_partner, date=date.today(), expiry_date=date.today(),
+                    subtotal=Decimal('100.00'), total_amount=Decimal('100.00')
+                )
+                QuoteItem.objects.create(
+                    quote=quote, product=product, quantity=Decimal('1.00'),
+                    unit_price=Decimal('100.00'), total_price=Decimal('100.00')
+                )
+
+        query_budget(reverse('quote-list'), seed, budget=3)
+
+    def test_quote_detail(self, query_budget, client_partner, product):
+        quote = Quote.objects.create(
+            client=client_partner, date=date.today(), expiry_date=date.today(),
+            subtotal=Decimal('100.00'), total_amount=Decimal('100.00')
+        )
+        query_budget(
+            reverse('quote-detail', args=[quote.pk]),
+            lambda n: QuoteItem.objects.bulk_create([
+                QuoteItem(quote=quote, product=product, quantity=Decimal('1.00'),
+                          unit_price=Decimal('100.00'), total_price=Decimal('100.00'))
+                for _ in range(n)
+            ]),
+            budget=2,
+        )
+
+    def _delivery_note(self, client_partner, zone, regular_user):
+        start = DeliveryNote.objects.count()
+        return DeliveryNote.objects.create(
+            reference=f'BL-{start}', client=client_partner, zone=zone, date=date.today(), status='draft',
+            created_by=regular_user
+        )
+
+    def test_delivery_note_list(self, query_budget, client_partner, zone, regular_user, product):
+        def seed(n):
+            for _ in range(n):
+                note = self._delivery_note(client_partner, zone, regular_user)
+                DeliveryNoteItem.objects.create(delivery_note=note, product=product, quantity=Decimal('1.00'))
+
+        query_budget(reverse('delivery-note-list'), seed, budget=3)
+
+    def test_delivery_note_detail(self, query_budget, client_partner, zone, regular_user, product):
+        note = self._delivery_note(client_partner, zone, regular_user)
+        query_budget(
+            reverse('delivery-note-detail', args=[note.pk]),
+            lambda n: DeliveryNoteItem.objects.bulk_create([
+                DeliveryNoteItem(delivery_note=note, product=product, quantity=Decimal('1.00')) for _ in range(n)
+            ]),
+            budget=2,
+        )
+
+    def test_sale_charge_list(self, query_budget, sale):
+        charge_type = ChargeType.objects.create(name='Livraison')
+        query_budget(
+            reverse('sale-charge-list'),
+            lambda n: SaleCharge.objects.bulk_create([
+                SaleCharge(sale=sale, charge_type=charge_type, amount=Decimal('10.00')) for _ in range(n)
+            ]),
+            budget=2,
+        )
+
+    def test_sale_charge_detail(self, query_budget, sale):
+        charge_type = ChargeType.objects.create(name='Livraison')
+        query_budget(
+            lambda rows: reverse('sale-charge-detail', args=[rows[-1].pk]),
+            lambda n: SaleCharge.objects.bulk_create([
+                SaleCharge(sale=sale, charge_type=charge_type, amount=Decimal('10.00')) for _ in range(n)
+            ]),
+            budget=1,
+        )
@@ -3,13 +3,13 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
-from django.db.models import Sum, Q
+from django.db.models import Prefetch, Sum, Q
 from django.utils import timezone
 from decimal import Decimal
 from datetime import datetime, timedelta, date
 
 from .models import (
-    Sale, SaleItem, DeliveryNote, Invoice, Quote, QuoteItem,
+    Sale, SaleItem, DeliveryNote, DeliveryNoteItem, Invoice, Quote, QuoteItem,
     SaleCharge, ChargeType
 )
 from .serializers import (
@@ -17,16 +17,43 @@ from .serializers import (
     InvoiceSerializer, QuoteSerializer, QuoteItemSerializer,
     SaleChargeSerializer, ChargeTypeSerializer
 )
-from apps.treasury.models import Account, AccountStatement, CashReceipt
+from .payments import recalculate_payment_amounts
+from apps.core.exports import DATE_FILTERS, ExportMixin
+from apps.core.pagination import LedgerPagination
+from apps.core.querysets import QueryProfile, QueryProfileMixin
+from .reports import get_sales_report
+from apps.treasury.ledger import LedgerEntry, post_entries
+from apps.treasury.models import Account, CashReceipt
 from apps.core.models import Zone
 from apps.inventory.models import Stock
 
 
-class SaleViewSet(viewsets.ModelViewSet):
+class SaleViewSet(QueryProfileMixin, ExportMixin, viewsets.ModelViewSet):
     """API endpoint for sales"""
-    queryset = Sale.objects.all().order_by('-date')
+    queryset = Sale.objects.order_by('-date', '-id')
+    query_profiles = {
+        'default': QueryProfile(prefetch_related=[
+            Prefetch('items', queryset=SaleItem.objects.select_related('product')),
+        ]),
+        'destroy': QueryProfile(),
+        'export': QueryProfile(),
+        'pay_from_account': QueryProfile(select_related=['client']),
+    }
     serializer_class = SaleSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LedgerPagination
+    filter_params = {
+        **DATE_FILTERS,
+        'zone': 'zone_id',
+        'client': 'client_id',
+        'status': 'status',
+        'payment_status': 'payment_status',
+    }
+    export_fields = (
+        'id', 'reference', 'date', 'client_id', 'client__name', 'zone_id', 'zone__name',
+        'status', 'payment_status', 'subtotal', 'discount_amount', 'tax_amount',
+        'total_amount', 'paid_amount', 'remaining_amount',
+    )
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -76,18 +103,6 @@ class SaleViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                # Get last statement for client account
-                last_client_statement = AccountStatement.objects.filter(
-                    account=client_account
-                ).order_by('-date', '-id').first()
-                previous_client_balance = Decimal(str(last_client_statement.balance)) if last_client_statement else Decimal('0.00')
-                
-                # Get last statement for company account
-                last_company_statement = AccountStatement.objects.filter(
-                    account=company_account
-                ).order_by('-date', '-id').first()
-                previous_company_balance = Decimal(str(last_company_statement.balance)) if last_company_statement else Decimal('0.00')
-                
                 # Create CashReceipt (payment record)
                 payment = CashReceipt.objects.create(
                     reference=reference,
@@ -101,35 +116,23 @@ class SaleViewSet(viewsets.ModelViewSet):
                     created_by=request.user
                 )
                 
-                # Debit client account
-                new_client_balance = previous_client_balance - amount
-                AccountStatement.objects.create(
-                    account=client_account,
-                    date=timezone.now().date(),
-                    transaction_type='sale',
-                    reference=reference,
-                    description=f"Paiement vente {sale.reference} - {sale.client.name}",
-                    credit=0,
-                    debit=amount,
-                    balance=new_client_balance,
-                )
-                client_account.current_balance = new_client_balance
-                client_account.save(update_fields=['current_balance'])
-                
-                # Credit company account
-                new_company_balance = previous_company_balance + amount
-                AccountStatement.objects.create(
-                    account=company_account,
-                    date=timezone.now().date(),
-                    transaction_type='sale',
-                    reference=reference,
-                    description=f"Paiement reçu de {sale.client.name} pour vente {sale.reference}",
-                    credit=amount,
-                    debit=0,
-                    balance=new_company_balance,
-                )
-                company_account.current_balance = new_company_balance
-                company_account.save(update_fields=['current_balance'])
+                # Debit client account and credit company account
+                post_entries([
+                    LedgerEntry(
+                        account=client_account,
+                        transaction_type='sale',
+                        reference=reference,
+                        description=f"Paiement vente {sale.reference} - {sale.client.name}",
+                        debit=amount,
+                    ),
+                    LedgerEntry(
+                        account=company_account,
+                        transaction_type='sale',
+                        reference=reference,
+                        description=f"Paiement reçu de {sale.client.name} pour vente {sale.reference}",
+                        credit=amount,
+                    ),
+                ])
                 
                 # Update sale payment status and amounts
                 sale.refresh_from_db()
@@ -207,39 +210,33 @@ class SaleViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def recalculate_payment_amounts(self, request):
-        """Recalculate paid amounts for all sales based on cash receipts"""
+        """
+        Recalculate paid amounts for all sales based on cash receipts
+        Pass dry_run=true to get the changes without applying them
+        """
+        dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true')
         try:
-            sales_updated = 0
+            result = recalculate_payment_amounts(dry_run=dry_run)
             
-            for sale in Sale.objects.all():
-                # Calculate total paid amount from cash receipts
-                paid_amount = CashReceipt.objects.filter(sale=sale).aggregate(
-                    total=Sum('allocated_amount')
-                )['total'] or Decimal('0')
-                
-                # Update sale amounts
-                old_paid_amount = sale.paid_amount
-                sale.paid_amount = paid_amount
-                sale.remaining_amount = sale.total_amount - paid_amount
-                
-                # Update payment status
-                if paid_amount >= sale.total_amount:
-                    sale.payment_status = 'paid'
-                elif paid_amount > 0:
-                    sale.payment_status = 'partially_paid'
-                else:
-                    sale.payment_status = 'unpaid'
-                
-                # Only save if there's a change
-                if old_paid_amount != paid_amount:
-                    sale.save()
-                    sales_updated += 1
-            
-            return Response({
+            response = {
                 'success': True,
-                'message': f'Payment amounts recalculated for {sales_updated} sales',
-                'sales_updated': sales_updated
-            })
+                'message': f'Payment amounts recalculated for {result.updated} sales',
+                'sales_updated': result.updated,
+                'dry_run': dry_run,
+            }
+            if dry_run:
+                response['changes'] = [
+                    {
+                        'sale_id': change.sale_id,
+                        'reference': change.reference,
+                        'old_paid_amount': str(change.old_paid_amount),
+                        'paid_amount': str(change.paid_amount),
+                        'old_payment_status': change.old_payment_status,
+                        'payment_status': change.payment_status,
+                    }
+                    for change in result.changes
+                ]
+            return Response(response)
             
         except Exception as e:
             return Response(
@@ -248,9 +245,15 @@ class SaleViewSet(viewsets.ModelViewSet):
             )
 
 
-class DeliveryNoteViewSet(viewsets.ModelViewSet):
+class DeliveryNoteViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for delivery notes"""
     queryset = DeliveryNote.objects.all().order_by('-date')
+    query_profiles = {
+        'default': QueryProfile(prefetch_related=[
+            Prefetch('items', queryset=DeliveryNoteItem.objects.select_related('product')),
+        ]),
+        'destroy': QueryProfile(),
+    }
     serializer_class = DeliveryNoteSerializer
     permission_classes = [IsAuthenticated]
 
@@ -269,16 +272,27 @@ class SaleChargeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+class InvoiceViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for invoices"""
     queryset = Invoice.objects.all().order_by('-date')
+    query_profiles = {
+        'default': QueryProfile(select_related=['sale__client']),
+        'destroy': QueryProfile(),
+    }
     serializer_class = InvoiceSerializer
     permission_classes = [IsAuthenticated]
 
 
-class QuoteViewSet(viewsets.ModelViewSet):
+class QuoteViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for quotes"""
     queryset = Quote.objects.all().order_by('-date')
+    query_profiles = {
+        'default': QueryProfile(prefetch_related=[
+            Prefetch('items', queryset=QuoteItem.objects.select_related('product')),
+        ]),
+        'destroy': QueryProfile(),
+        'convert_to_sale': QueryProfile(prefetch_related=['items']),
+    }
     serializer_class = QuoteSerializer
     permission_classes = [IsAuthenticated]
 
@@ -353,110 +367,10 @@ class QuoteViewSet(viewsets.ModelViewSet):
 @permission_classes([IsAuthenticated])
 def reports_sales(request):
     """Get sales report data"""
-    from apps.inventory.models import ProductCategory
-    
-    period = request.query_params.get('period', 'year')
-    start_date_param = request.query_params.get('start_date')
-    end_date_param = request.query_params.get('end_date')
-    
-    today = datetime.now().date()
-    if period == 'month':
-        start_date = datetime(today.year, today.month, 1).date()
-        end_date = today
-    elif period == 'quarter':
-        current_quarter = (today.month - 1) // 3 + 1
-        start_date = datetime(today.year, 3 * current_quarter - 2, 1).date()
-        if current_quarter < 4:
-            next_quarter_start = datetime(today.year, 3 * (current_quarter + 1) - 2, 1).date()
-            end_date = next_quarter_start - timedelta(days=1)
-        else:
-            end_date = datetime(today.year, 12, 31).date()
-    elif period == 'semester':
-        current_semester = 1 if today.month <= 6 else 2
-        if current_semester == 1:
-            start_date = datetime(today.year, 1, 1).date()
-            end_date = datetime(today.year, 6, 30).date()
-        else:
-            start_date = datetime(today.year, 7, 1).date()
-            end_date = datetime(today.year, 12, 31).date()
-    elif period == 'year':
-        start_date = datetime(today.year, 1, 1).date()
-        end_date = datetime(today.year, 12, 31).date()
-    elif period == 'custom':
-        try:
-            if not start_date_param or not end_date_param:
-                start_date = today - timedelta(days=30)
-                end_date = today
-            else:
-                start_date = datetime.strptime(start_date_param, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
-        except (ValueError, TypeError):
-            start_date = today - timedelta(days=30)
-            end_date = today
-    else:
-        start_date = datetime(today.year, 1, 1).date()
-        end_date = datetime(today.year, 12, 31).date()
-    
-    if not isinstance(start_date, date):
-        start_date = today - timedelta(days=30)
-    if not isinstance(end_date, date):
-        end_date = today
-    
-    monthly_data = []
-    months = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
-    
-    # Get the year to use for monthly data
-    year = start_date.year if isinstance(start_date, date) else datetime.now().year
-    
-    for month in range(1, 13):
-        month_sales = Sale.objects.filter(
-            date__year=year,
-            date__month=month
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        monthly_data.append({
-            'month': months[month-1],
-            'amount': float(month_sales)
-        })
-    
-    category_data = []
-    categories = ProductCategory.objects.all()
-    
-    for category in categories:
-        category_sales = SaleItem.objects.filter(
-            sale__date__gte=start_date,
-            sale__date__lte=end_date,
-            product__category=category
-        ).aggregate(total=Sum('total_price'))['total'] or 0
-        
-        if category_sales > 0:
-            category_data.append({
-                'category': category.name,
-                'amount': float(category_sales)
-            })
-    
-    top_products = []
-    sales_items = SaleItem.objects.filter(
-        sale__date__gte=start_date,
-        sale__date__lte=end_date
-    ).select_related('product').values(
-        'product__id',
-        'product__name'
-    ).annotate(
-        total_quantity=Sum('quantity'),
-        total_revenue=Sum('total_price')
-    ).order_by('-total_revenue')[:5]
-    
-    for item in sales_items:
-        top_products.append({
-            'name': item['product__name'],
-            'quantity': float(item['total_quantity']),
-            'revenue': float(item['total_revenue'])
-        })
-    
-    return Response({
-        'monthly_data': monthly_data,
-        'category_data': category_data,
-        'top_products': top_products
-    })
+    report = get_sales_report(
+        request.query_params.get('period', 'year'),
+        request.query_params.get('start_date'),
+        request.query_params.get('end_date'),
+    )
+    return Response(report)
 
@@ -0,0 +1,69 @@
+"""
+Ledger posting
+Writes AccountStatement lines and keeps Account.current_balance in step
+"""
+
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.caching import invalidate_tags
+
+from .models import Account, AccountStatement
+
+
+LedgerEntry = namedtuple(
+    'LedgerEntry',
+    ['account', 'transaction_type', 'reference', 'debit', 'credit', 'description', 'date'],
+    defaults=(Decimal('0.00'), Decimal('0.00'), '', None),
+)
+
+
+def post_entries(entries):
+    """
+    Post ledger entries atomically and return the created AccountStatement rows.
+
+    Every account touched is locked once (in id order, so concurrent postings
+    cannot deadlock), its running balance is taken from Account.current_balance
+    rather than from the last statement, and all lines go out in a single
+    bulk_create. The `account` objects on the entries get their
+    current_balance refreshed so callers can report the new balances.
+    """
+    entries = list(entries)
+    if not entries:
+        return []
+
+    with transaction.atomic():
+        account_ids = sorted({entry.account.pk for entry in entries})
+        accounts = {
+            account.pk: account
+            for account in Account.objects.select_for_update().filter(pk__in=account_ids).order_by('pk')
+        }
+
+        today = timezone.now().date()
+        statements = []
+        for entry in entries:
+            account = accounts[entry.account.pk]
+            debit = Decimal(str(entry.debit))
+            credit = Decimal(str(entry.credit))
+            account.current_balance = account.current_balance + credit - debit
+            statements.append(AccountStatement(
+                account=account,
+                date=entry.date or today,
+                transaction_type=entry.transaction_type,
+                reference=entry.reference,
+                description=entry.description,
+                debit=debit,
+                credit=credit,
+                balance=account.current_balance,
+            ))
+
+        AccountStatement.objects.bulk_create(statements)
+        Account.objects.bulk_update(list(accounts.values()), ['current_balance'])
+        invalidate_tags('treasury')
+
+    for entry in entries:
+        entry.account.current_balance = accounts[entry.account.pk].current_balance
+    return statements
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treasury', '0003_alter_suppliercashpayment_supply'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accountstatement',
+            index=models.Index(fields=['date', 'id'], name='accountstatement_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treasury', '0004_accountstatement_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accountstatement',
+            index=models.Index(fields=['account', '-date', '-id'], name='accountstatement_account_idx'),
+        ),
+    ]
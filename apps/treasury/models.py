@@ -2,9 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from apps.app_settings.models import Currency, ExpenseCategory, PaymentMethod
-from django.db import transaction
-from django.utils import timezone
-            
+from apps.core.sequences import save_with_reference
+
 
 class Account(models.Model):
     """
@@ -84,31 +83,7 @@ class Expense(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.pk and not self.reference:
-           
-            with transaction.atomic():
-                year = timezone.now().year
-                last_expense = Expense.objects.filter(
-                    reference__startswith=f"DEP-{year}-"
-                ).select_for_update().order_by('-reference').first()
-                
-                if last_expense:
-                    try:
-                        last_number = int(last_expense.reference.split('-')[-1])
-                        next_number = last_number + 1
-                    except (ValueError, IndexError):
-                        count = Expense.objects.filter(
-                            reference__startswith=f"DEP-{year}-"
-                        ).count()
-                        next_number = count + 1
-                else:
-                    next_number = 1
-                
-                self.reference = f"DEP-{year}-{next_number:03d}"
-                
-                while Expense.objects.filter(reference=self.reference).exists():
-                    next_number += 1
-                    self.reference = f"DEP-{year}-{next_number:03d}"
-        
+            return save_with_reference(self, 'DEP', super().save, *args, **kwargs)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -251,31 +226,7 @@ class AccountTransfer(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.pk and not self.reference:
-            
-            with transaction.atomic():
-                year = timezone.now().year
-                last_transfer = AccountTransfer.objects.filter(
-                    reference__startswith=f"VIR-{year}-"
-                ).select_for_update().order_by('-reference').first()
-                
-                if last_transfer:
-                    try:
-                        last_number = int(last_transfer.reference.split('-')[-1])
-                        next_number = last_number + 1
-                    except (ValueError, IndexError):
-                        count = AccountTransfer.objects.filter(
-                            reference__startswith=f"VIR-{year}-"
-                        ).count()
-                        next_number = count + 1
-                else:
-                    next_number = 1
-                
-                self.reference = f"VIR-{year}-{next_number:03d}"
-                
-                while AccountTransfer.objects.filter(reference=self.reference).exists():
-                    next_number += 1
-                    self.reference = f"VIR-{year}-{next_number:03d}"
-        
+            return save_with_reference(self, 'VIR', super().save, *args, **kwargs)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -342,31 +293,7 @@ class CashReceipt(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.pk and not self.reference:
-           
-            with transaction.atomic():
-                year = timezone.now().year
-                last_receipt = CashReceipt.objects.filter(
-                    reference__startswith=f"ENC-{year}-"
-                ).select_for_update().order_by('-reference').first()
-                
-                if last_receipt:
-                    try:
-                        last_number = int(last_receipt.reference.split('-')[-1])
-                        next_number = last_number + 1
-                    except (ValueError, IndexError):
-                        count = CashReceipt.objects.filter(
-                            reference__startswith=f"ENC-{year}-"
-                        ).count()
-                        next_number = count + 1
-                else:
-                    next_number = 1
-                
-                self.reference = f"ENC-{year}-{next_number:03d}"
-                
-                while CashReceipt.objects.filter(reference=self.reference).exists():
-                    next_number += 1
-                    self.reference = f"ENC-{year}-{next_number:03d}"
-        
+            return save_with_reference(self, 'ENC', super().save, *args, **kwargs)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -476,3 +403,7 @@ class AccountStatement(models.Model):
         verbose_name = "Mouvement de compte"
         verbose_name_plural = "Mouvements de compte"
         ordering = ['account', '-date']
+        indexes = [
+            models.Index(fields=['date', 'id'], name='accountstatement_date_id_idx'),
+            models.Index(fields=['account', '-date', '-id'], name='accountstatement_account_idx'),
+        ]
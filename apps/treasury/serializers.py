@@ -1,12 +1,14 @@
+from django.db import models
 from rest_framework import serializers
 from .models import (
     Account, Expense, ClientPayment, SupplierPayment, AccountTransfer,
     CashReceipt, SupplierCashPayment, AccountStatement
 )
 from apps.app_settings.serializers import CurrencySerializer
+from apps.core.fieldsets import SparseFieldsMixin
 
 
-class AccountSerializer(serializers.ModelSerializer):
+class AccountSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     currency_details = CurrencySerializer(source='currency', read_only=True)
     
     class Meta:
@@ -15,7 +17,7 @@ class AccountSerializer(serializers.ModelSerializer):
                  'initial_balance', 'current_balance', 'description', 'is_active']
 
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     account_name = serializers.CharField(source='account.name', read_only=True)
     payment_method_name = serializers.CharField(source='payment_method.name', read_only=True)
@@ -29,7 +31,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
         read_only_fields = ['reference']  # Auto-generated
 
 
-class ClientPaymentSerializer(serializers.ModelSerializer):
+class ClientPaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client_name = serializers.CharField(source='client.name', read_only=True)
     account_name = serializers.CharField(source='account.name', read_only=True)
     payment_method_name = serializers.CharField(source='payment_method.name', read_only=True)
@@ -42,7 +44,7 @@ class ClientPaymentSerializer(serializers.ModelSerializer):
                   'notes', 'created_by', 'created_by_name', 'created_at']
 
 
-class SupplierPaymentSerializer(serializers.ModelSerializer):
+class SupplierPaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     account_name = serializers.CharField(source='account.name', read_only=True)
     payment_method_name = serializers.CharField(source='payment_method.name', read_only=True)
@@ -55,7 +57,7 @@ class SupplierPaymentSerializer(serializers.ModelSerializer):
                   'notes', 'created_by', 'created_by_name', 'created_at']
 
 
-class AccountTransferSerializer(serializers.ModelSerializer):
+class AccountTransferSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     from_account_name = serializers.CharField(source='from_account.name', read_only=True)
     to_account_name = serializers.CharField(source='to_account.name', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
@@ -66,7 +68,7 @@ class AccountTransferSerializer(serializers.ModelSerializer):
         read_only_fields = ['reference']  # Auto-generated
 
 
-class CashReceiptSerializer(serializers.ModelSerializer):
+class CashReceiptSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     account_name = serializers.CharField(source='account.name', read_only=True)
     client_name = serializers.CharField(source='client.name', read_only=True)
     sale_reference = serializers.CharField(source='sale.reference', read_only=True)
@@ -78,7 +80,7 @@ class CashReceiptSerializer(serializers.ModelSerializer):
         read_only_fields = ['reference']  # Auto-generated, should not be provided by client
 
 
-class SupplierCashPaymentSerializer(serializers.ModelSerializer):
+class SupplierCashPaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     supplier_name = serializers.SerializerMethodField()
     account_name = serializers.SerializerMethodField()
     payment_method_name = serializers.SerializerMethodField()
@@ -98,37 +100,70 @@ class SupplierCashPaymentSerializer(serializers.ModelSerializer):
         return obj.payment_method.name if obj.payment_method else None
 
 
-class AccountStatementSerializer(serializers.ModelSerializer):
+def load_cash_receipts(statements):
+    """Map reference -> CashReceipt (with sale and client) for sale-related statements"""
+    references = {
+        statement.reference for statement in statements
+        if statement.transaction_type in ['sale', 'client_payment']
+    }
+    if not references:
+        return {}
+    return {
+        receipt.reference: receipt
+        for receipt in CashReceipt.objects.select_related('sale', 'client').filter(reference__in=references)
+    }
+
+
+class AccountStatementListSerializer(serializers.ListSerializer):
+    """
+    Resolves the cash receipts behind every statement of the list in a
+    single query, instead of one lookup per row in get_sale_details.
+    """
+    
+    def to_representation(self, data):
+        statements = list(data.all() if isinstance(data, models.Manager) else data)
+        if 'sale_details' in self.child.fields:
+            self.child.cash_receipts = load_cash_receipts(statements)
+        try:
+            return super().to_representation(statements)
+        finally:
+            self.child.cash_receipts = None
+
+
+class AccountStatementSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     transaction_type_display = serializers.CharField(source='get_transaction_type_display', read_only=True)
     account_name = serializers.CharField(source='account.name', read_only=True)
     sale_details = serializers.SerializerMethodField()
     
+    # Filled by AccountStatementListSerializer while it renders a list
+    cash_receipts = None
+    
     class Meta:
         model = AccountStatement
         fields = '__all__'
+        list_serializer_class = AccountStatementListSerializer
     
     def get_sale_details(self, obj):
         """Get sale details for sale payment transactions"""
         if obj.transaction_type not in ['sale', 'client_payment']:
             return None
         
-        # Try to find the CashReceipt by reference
-        try:
-            from .models import CashReceipt
-            cash_receipt = CashReceipt.objects.select_related('sale', 'client').get(reference=obj.reference)
-            
-            if cash_receipt.sale:
-                sale = cash_receipt.sale
-                return {
-                    'sale_reference': sale.reference,
-                    'sale_total': float(sale.total_amount),
-                    'sale_paid_amount': float(sale.paid_amount),
-                    'sale_remaining_amount': float(sale.remaining_amount),
-                    'client_name': cash_receipt.client.name if cash_receipt.client else '',
-                    'payment_amount': float(cash_receipt.amount),
-                    'payment_status': 'full' if sale.remaining_amount == 0 else 'partial'
-                }
-        except:
-            pass
+        # Find the CashReceipt by reference
+        if self.cash_receipts is not None:
+            cash_receipt = self.cash_receipts.get(obj.reference)
+        else:
+            cash_receipt = load_cash_receipts([obj]).get(obj.reference)
+        
+        if cash_receipt and cash_receipt.sale:
+            sale = cash_receipt.sale
+            return {
+                'sale_reference': sale.reference,
+                'sale_total': float(sale.total_amount),
+                'sale_paid_amount': float(sale.paid_amount),
+                'sale_remaining_amount': float(sale.remaining_amount or 0),
+                'client_name': cash_receipt.client.name if cash_receipt.client else '',
+                'payment_amount': float(cash_receipt.amount),
+                'payment_status': 'full' if sale.remaining_amount == 0 else 'partial'
+            }
         
         return None
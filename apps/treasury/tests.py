@@ -7,10 +7,12 @@ from rest_framework import status
 from decimal import Decimal
 from datetime import date
 
+from apps.treasury.ledger import LedgerEntry, post_entries
 from apps.treasury.models import (
     Account, CashReceipt, AccountStatement, Expense,
-    AccountTransfer, SupplierCashPayment
+    AccountTransfer, SupplierCashPayment, ClientPayment, SupplierPayment
 )
+from conftest import AccountFactory, ExpenseCategoryFactory, SaleFactory, SupplierFactory
 
 
 # ============= Account Model Tests =============
@@ -459,3 +461,289 @@ class TestTreasuryIntegration:
         account2.refresh_from_db()
         assert account1.current_balance == Decimal('15000.00')
         assert account2.current_balance == Decimal('105000.00')
+
+
+# ============= Ledger Posting Tests =============
+
+@pytest.mark.django_db
+class TestLedgerPosting:
+    """Test the AccountStatement posting engine"""
+
+    def test_paired_entries_update_both_balances(self, db, currency):
+        """Test a debit/credit pair moves both running balances"""
+        client_account = AccountFactory(account_type='client', currency=currency, current_balance=Decimal('500.00'))
+        cash_account = AccountFactory(account_type='cash', currency=currency, current_balance=Decimal('1000.00'))
+
+        statements = post_entries([
+            LedgerEntry(account=client_account, transaction_type='sale', reference='PAY-1', debit=Decimal('200.00')),
+            LedgerEntry(account=cash_account, transaction_type='sale', reference='PAY-1', credit=Decimal('200.00')),
+        ])
+
+        assert [s.balance for s in statements] == [Decimal('300.00'), Decimal('1200.00')]
+        client_account.refresh_from_db()
+        cash_account.refresh_from_db()
+        assert client_account.current_balance == Decimal('300.00')
+        assert cash_account.current_balance == Decimal('1200.00')
+
+    def test_running_balance_within_one_posting(self, account):
+        """Test several lines on the same account chain their balances"""
+        start = account.current_balance
+        statements = post_entries([
+            LedgerEntry(account=account, transaction_type='deposit', reference='A', credit=Decimal('100.00')),
+            LedgerEntry(account=account, transaction_type='expense', reference='B', debit=Decimal('30.00')),
+        ])
+
+        assert statements[0].balance == start + Decimal('100.00')
+        assert statements[1].balance == start + Decimal('70.00')
+        assert account.current_balance == start + Decimal('70.00')
+
+    def test_posting_cost_does_not_grow_with_history(self, account, django_assert_max_num_queries):
+        """Test posting cost is independent of the number of existing statements"""
+        post_entries([
+            LedgerEntry(account=account, transaction_type='deposit', reference=f'OLD-{n}', credit=Decimal('1.00'))
+            for n in range(50)
+        ])
+        # savepoint, lock, bulk insert, balance update, release
+        with django_assert_max_num_queries(5):
+            post_entries([LedgerEntry(account=account, transaction_type='deposit', reference='NEW', credit=Decimal('1.00'))])
+
+    def test_cash_receipt_api_posts_statement(self, admin_client, account, client_partner, payment_method):
+        """Test creating a cash receipt posts a credit line on its account"""
+        start = account.current_balance
+        response = admin_client.post(reverse('cashreceipt-list'), {
+            'account': account.id,
+            'client': client_partner.id,
+            'date': date.today().isoformat(),
+            'amount': '2500.00',
+            'payment_method': payment_method.id,
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+        account.refresh_from_db()
+        assert account.current_balance == start + Decimal('2500.00')
+        statement = AccountStatement.objects.get(account=account, reference=response.data['reference'])
+        assert statement.balance == account.current_balance
+
+
+# ============= AccountStatement API Tests =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+class TestAccountStatementAPI:
+    """Test AccountStatement API endpoints"""
+
+    def _post_sale_payments(self, account, count):
+        for _ in range(count):
+            sale = SaleFactory(total_amount=Decimal('100.00'), remaining_amount=Decimal('0.00'))
+            receipt = CashReceipt.objects.create(
+                account=account, sale=sale, client=sale.client, date=date.today(),
+                amount=Decimal('100.00'), allocated_amount=Decimal('100.00')
+            )
+            post_entries([LedgerEntry(
+                account=account, transaction_type='sale', reference=receipt.reference, credit=Decimal('100.00')
+            )])
+
+    def test_list_includes_sale_details(self, authenticated_client, account):
+        """Test sale payment lines carry their sale details"""
+        self._post_sale_payments(account, 1)
+
+        response = authenticated_client.get(reverse('accountstatement-list'), {'account': account.id})
+
+        assert response.status_code == status.HTTP_200_OK
+        details = response.data['results'][0]['sale_details']
+        assert details['payment_amount'] == 100.0
+        assert details['payment_status'] == 'full'
+
+    def test_list_query_count_is_constant(self, authenticated_client, account, django_assert_num_queries):
+        """Test a page costs the same number of queries for 2 or 20 sale lines"""
+        url = reverse('accountstatement-list')
+        # count, page of statements, cash receipts of the page
+        self._post_sale_payments(account, 2)
+        with django_assert_num_queries(3):
+            authenticated_client.get(url, {'account': account.id})
+
+        self._post_sale_payments(account, 18)
+        with django_assert_num_queries(3):
+            response = authenticated_client.get(url, {'account': account.id})
+        assert all(row['sale_details'] for row in response.data['results'])
+
+
+# ============= Query Budgets =============
+
+@pytest.mark.django_db
+@pytest.mark.api
+@pytest.mark.slow
+class TestTreasuryQueryBudget:
+    """Query counts of the treasury endpoints do not grow with the data"""
+
+    def _receipts(self, n, account, client_partner, zone, user):
+        receipts = []
+        for sale in SaleFactory.create_batch(n, client=client_partner, zone=zone, created_by=user):
+            receipts.append(CashReceipt.objects.create(
+                account=account, sale=sale, client=client_partner, date=date.today(),
+                amount=Decimal('100.00'), allocated_amount=Decimal('100.00')
+            ))
+        return receipts
+
+    def _expenses(self, n, account, payment_method, user):
+        category = ExpenseCategoryFactory()
+        return [
+            Expense.objects.create(
+                category=category, account=account, payment_method=payment_method, date=date.today(),
+                amount=Decimal('10.00'), description='Test', status='paid', created_by=user
+            )
+            for _ in range(n)
+        ]
+
+    def _transfers(self, n, account, user):
+        target = AccountFactory(currency=account.currency)
+        return [
+            AccountTransfer.objects.create(
+                from_account=account, to_account=target, date=date.today(), amount=Decimal('10.00'), created_by=user
+            )
+            for _ in range(n)
+        ]
+
+    def _statements(self, n, account, client_partner, zone, user):
+        post_entries([
+            LedgerEntry(account=account, transaction_type='sale', reference=receipt.reference,
+                        credit=Decimal('100.00'))
+            for receipt in self._receipts(n, account, client_partner, zone, user)
+        ])
+        return list(AccountStatement.objects.filter(account=account).order_by('id'))
+
+    def _client_payments(self, n, account, client_partner, payment_method, user):
+        start = ClientPayment.objects.count()
+        return ClientPayment.objects.bulk_create([
+            ClientPayment(reference=f'RCL-{start + index}', client=client_partner, account=account,
+                          date=date.today(), amount=Decimal('10.00'), payment_method=payment_method,
+                          created_by=user)
+            for index in range(n)
+        ])
+
+    def _supplier_payments(self, n, account, supplier_partner, payment_method, user):
+        start = SupplierPayment.objects.count()
+        return SupplierPayment.objects.bulk_create([
+            SupplierPayment(reference=f'RFR-{start + index}', supplier=supplier_partner, account=account,
+                            date=date.today(), amount=Decimal('10.00'), payment_method=payment_method,
+                            created_by=user)
+            for index in range(n)
+        ])
+
+    def _supplier_cash_payments(self, n, account, payment_method, user):
+        start = SupplierCashPayment.objects.count()
+        return SupplierCashPayment.objects.bulk_create([
+            SupplierCashPayment(reference=f'DEC-{start + index}', account=account, supplier=SupplierFactory(),
+                                date=date.today(), amount=Decimal('10.00'), payment_method=payment_method,
+                                created_by=user)
+            for index in range(n)
+        ])
+
+    def test_account_statement_list(self, query_budget, account, client_partner, zone, regular_user):
+        query_budget(
+            reverse('accountstatement-list'),
+            lambda n: self._statements(n, account, client_partner, zone, regular_user),
+            budget=3,
+            params={'account': account.id},
+        )
+
+    def test_account_statement_detail(self, query_budget, account, client_partner, zone, regular_user):
+        query_budget(
+            lambda rows: reverse('accountstatement-detail', args=[rows[-1].pk]),
+            lambda n: self._statements(n, account, client_partner, zone, regular_user),
+            budget=2,
+        )
+
+    def test_cash_receipt_list(self, query_budget, account, client_partner, zone, regular_user):
+        query_budget(
+            reverse('cashreceipt-list'),
+            lambda n: self._receipts(n, account, client_partner, zone, regular_user),
+            budget=2,
+        )
+
+    def test_cash_receipt_detail(self, query_budget, account, client_partner, zone, regular_user):
+        query_budget(
+            lambda rows: reverse('cashreceipt-detail', args=[rows[-1].pk]),
+            lambda n: self._receipts(n, account, client_partner, zone, regular_user),
+            budget=1,
+        )
+
+    def test_account_list(self, query_budget, currency):
+        query_budget(reverse('account-list'), lambda n: AccountFactory.create_batch(n, currency=currency), budget=2)
+
+    def test_account_detail(self, query_budget, currency):
+        query_budget(
+            lambda rows: reverse('account-detail', args=[rows[-1].pk]),
+            lambda n: AccountFactory.create_batch(n, currency=currency),
+            budget=1,
+        )
+
+    def test_expense_list(self, query_budget, account, payment_method, regular_user):
+        query_budget(
+            reverse('expense-list'),
+            lambda n: self._expenses(n, account, payment_method, regular_user),
+            budget=2,
+        )
+
+    def test_expense_detail(self, query_budget, account, payment_method, regular_user):
+        query_budget(
+            lambda rows: reverse('expense-detail', args=[rows[-1].pk]),
+            lambda n: self._expenses(n, account, payment_method, regular_user),
+            budget=1,
+        )
+
+    def test_account_transfer_list(self, query_budget, account, regular_user):
+        query_budget(
+            reverse('accounttransfer-list'),
+            lambda n: self._transfers(n, account, regular_user),
+            budget=2,
+        )
+
+    def test_account_transfer_detail(self, query_budget, account, regular_user):
+        query_budget(
+            lambda rows: reverse('accounttransfer-detail', args=[rows[-1].pk]),
+            lambda n: self._transfers(n, account, regular_user),
+            budget=1,
+        )
+
+    def test_client_payment_list(self, query_budget, account, client_partner, payment_method, regular_user):
+        query_budget(
+            reverse('clientpayment-list'),
+            lambda n: self._client_payments(n, account, client_partner, payment_method, regular_user),
+            budget=2,
+        )
+
+    def test_client_payment_detail(self, query_budget, account, client_partner, payment_method, regular_user):
+        query_budget(
+            lambda rows: reverse('clientpayment-detail', args=[rows[-1].pk]),
+            lambda n: self._client_payments(n, account, client_partner, payment_method, regular_user),
+            budget=1,
+        )
+
+    def test_supplier_payment_list(self, query_budget, account, supplier_partner, payment_method, regular_user):
+        query_budget(
+            reverse('supplierpayment-list'),
+            lambda n: self._supplier_payments(n, account, supplier_partner, payment_method, regular_user),
+            budget=2,
+        )
+
+    def test_supplier_payment_detail(self, query_budget, account, supplier_partner, payment_method, regular_user):
+        query_budget(
+            lambda rows: reverse('supplierpayment-detail', args=[rows[-1].pk]),
+            lambda n: self._supplier_payments(n, account, supplier_partner, payment_method, regular_user),
+            budget=1,
+        )
+
+    def test_supplier_cash_payment_list(self, query_budget, account, payment_method, regular_user):
+        query_budget(
+            reverse('suppliercashpayment-list'),
+            lambda n: self._supplier_cash_payments(n, account, payment_method, regular_user),
+            budget=2,
+        )
+
+    def test_supplier_cash_payment_detail(self, query_budget, account, payment_method, regular_user):
+        query_budget(
+            lambda rows: reverse('suppliercashpayment-detail', args=[rows[-1].pk]),
+            lambda n: self._supplier_cash_payments(n, account, payment_method, regular_user),
+            budget=1,
+        )
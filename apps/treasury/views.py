@@ -13,13 +13,21 @@ from .serializers import (
     AccountTransferSerializer, CashReceiptSerializer, SupplierCashPaymentSerializer,
     AccountStatementSerializer
 )
+from .ledger import LedgerEntry, post_entries
+from apps.core.exports import DATE_FILTERS, ExportMixin
+from apps.core.pagination import LedgerPagination
+from apps.core.querysets import QueryProfile, QueryProfileMixin
 
 
-class AccountViewSet(viewsets.ModelViewSet):
+class AccountViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for accounts"""
-    queryset = Account.objects.all().order_by('name')
+    queryset = Account.objects.order_by('name')
     serializer_class = AccountSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['currency']),
+        'destroy': QueryProfile(),
+    }
 
     @action(detail=False, methods=['get'])
     def by_type(self, request):
@@ -27,56 +35,76 @@ class AccountViewSet(viewsets.ModelViewSet):
         account_type = request.query_params.get('type')
         if not account_type:
             return Response({'error': 'type parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
-        accounts = self.queryset.filter(account_type=account_type)
+        accounts = self.get_queryset().filter(account_type=account_type)
         serializer = self.get_serializer(accounts, many=True)
         return Response(serializer.data)
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for expenses"""
     queryset = Expense.objects.all().order_by('-date')
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['category', 'account', 'payment_method', 'created_by']),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class ClientPaymentViewSet(viewsets.ModelViewSet):
+class ClientPaymentViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for client payments"""
     queryset = ClientPayment.objects.all().order_by('-date')
     serializer_class = ClientPaymentSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['client', 'account', 'payment_method', 'created_by']),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class SupplierPaymentViewSet(viewsets.ModelViewSet):
+class SupplierPaymentViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for supplier payments"""
     queryset = SupplierPayment.objects.all().order_by('-date')
     serializer_class = SupplierPaymentSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['supplier', 'account', 'payment_method', 'created_by']),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class AccountTransferViewSet(viewsets.ModelViewSet):
+class AccountTransferViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for account transfers"""
     queryset = AccountTransfer.objects.all().order_by('-date')
     serializer_class = AccountTransferSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['from_account', 'to_account', 'created_by']),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class CashReceiptViewSet(viewsets.ModelViewSet):
+class CashReceiptViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for cash receipts"""
-    queryset = CashReceipt.objects.all().order_by('-date')
+    queryset = CashReceipt.objects.order_by('-date')
     serializer_class = CashReceiptSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['account', 'client', 'sale', 'payment_method']),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         # Set allocated_amount to the amount value if not provided
@@ -88,58 +116,54 @@ class CashReceiptViewSet(viewsets.ModelViewSet):
         
         try:
             client_name = cash_receipt.client.name if cash_receipt.client else 'Client non spécifié'
-            # Get the last statement for this account
-            last_statement = AccountStatement.objects.filter(
-                account=cash_receipt.account
-            ).order_by('-date', '-id').first()
-            previous_balance = Decimal(str(last_statement.balance)) if last_statement else Decimal('0.00')
-            # Calculate new balance
-            new_balance = previous_balance + Decimal(str(cash_receipt.amount))
-            # Create AccountStatement entry
-            AccountStatement.objects.create(
-                account=cash_receipt.account,
-                date=cash_receipt.date,
-                reference=cash_receipt.reference,
-                transaction_type='cash_receipt',
-                description=f"Dépôt client: {client_name} - {cash_receipt.description}",
-                credit=cash_receipt.amount,
-                debit=0,
-                balance=new_balance
-            )
-            # Update the account's current_balance
-            account = cash_receipt.account
-            account.current_balance = new_balance
-            account.save(update_fields=['current_balance'])
+            post_entries([
+                LedgerEntry(
+                    account=cash_receipt.account,
+                    date=cash_receipt.date,
+                    reference=cash_receipt.reference,
+                    transaction_type='cash_receipt',
+                    description=f"Dépôt client: {client_name} - {cash_receipt.description}",
+                    credit=cash_receipt.amount,
+                ),
+            ])
         except Exception as e:
             print(f"Error creating AccountStatement for CashReceipt {cash_receipt.id}: {e}")
 
 
-class SupplierCashPaymentViewSet(viewsets.ModelViewSet):
+class SupplierCashPaymentViewSet(QueryProfileMixin, viewsets.ModelViewSet):
     """API endpoint for supplier cash payments"""
     queryset = SupplierCashPayment.objects.all().order_by('-date')
     serializer_class = SupplierCashPaymentSerializer
     permission_classes = [IsAuthenticated]
+    query_profiles = {
+        'default': QueryProfile(select_related=['supplier', 'account', 'payment_method']),
+        'destroy': QueryProfile(),
+    }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class AccountStatementViewSet(viewsets.ModelViewSet):
+class AccountStatementViewSet(QueryProfileMixin, ExportMixin, viewsets.ModelViewSet):
     """API endpoint for account statements"""
-    queryset = AccountStatement.objects.all().order_by('-date')
+    queryset = AccountStatement.objects.order_by('-date', '-id')
     serializer_class = AccountStatementSerializer
     permission_classes = [IsAuthenticated]
-
-    def get_queryset(self):
-        """Filter account statements by account if provided"""
-        queryset = AccountStatement.objects.all().order_by('-date')
-        account_id = self.request.query_params.get('account', None)
-        if account_id is not None:
-            try:
-                queryset = queryset.filter(account_id=account_id)
-            except ValueError:
-                queryset = AccountStatement.objects.none()
-        return queryset
+    query_profiles = {
+        'default': QueryProfile(select_related=['account']),
+        'destroy': QueryProfile(),
+        'export': QueryProfile(),
+    }
+    pagination_class = LedgerPagination
+    filter_params = {
+        **DATE_FILTERS,
+        'account': 'account_id',
+        'transaction_type': 'transaction_type',
+    }
+    export_fields = (
+        'id', 'date', 'account_id', 'account__name', 'reference', 'transaction_type',
+        'description', 'debit', 'credit', 'balance',
+    )
 
     @action(detail=False, methods=['get'])
     def balance(self, request):
@@ -182,7 +206,7 @@ class AccountStatementViewSet(viewsets.ModelViewSet):
             balance = Decimal(str(last_statement.balance)) if last_statement else Decimal('0.00')
             
             # Get account statements
-            statements = AccountStatement.objects.filter(account=account).order_by('-date', '-id')
+            statements = AccountStatement.objects.filter(account=account).select_related('account').order_by('-date', '-id')
             statement_serializer = AccountStatementSerializer(statements, many=True)
             
             response_data = {
@@ -3,6 +3,9 @@ Pytest configuration and shared fixtures for all tests
 """
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from decimal import Decimal
 from datetime import date, timedelta
@@ -10,6 +13,7 @@ import factory
 from factory.django import DjangoModelFactory
 from faker import Faker
 
+from apps.core import reference_data
 from apps.core.models import UserProfile, Zone
 from apps.partners.models import Client, Supplier
 from apps.app_settings.models import (
@@ -209,6 +213,13 @@ class SaleItemFactory(DjangoModelFactory):
 
 # ============= Fixtures =============
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache"""
+    cache.clear()
+    reference_data.clear()
+
+
 @pytest.fixture
 def api_client():
     """DRF API client for testing endpoints"""
@@ -380,3 +391,58 @@ def admin_client(api_client, admin_user):
     """API client authenticated as admin"""
     api_client.force_authenticate(user=admin_user)
     return api_client
+
+
+# ============= Query Budgets =============
+
+# Row counts every endpoint is measured at; the query count must not change between them
+QUERY_BUDGET_SCALES = (5, 500)
+
+
+def _format_queries(queries):
+    return '\n'.join(f"{index}. {query['sql']}" for index, query in enumerate(queries, start=1))
+
+
+@pytest.fixture
+def query_budget(authenticated_client):
+    """
+    Return check(url, seed, budget) for N+1 regression tests.
+
+    For each scale in QUERY_BUDGET_SCALES, seed(n) is called to add rows
+    (n being the rows missing to reach that scale) and `url` is fetched,
+    once to warm process caches and once with an empty response cache under
+    query capture. `url` may be a callable taking the last seed result, for
+    detail endpoints. Requests are made as the regular user unless `user` is
+    given. The test fails, listing the SQL, when the count grows with the
+    data or exceeds `budget`.
+    """
+    def check(url, seed, budget, scales=QUERY_BUDGET_SCALES, params=None, user=None):
+        if user is not None:
+            authenticated_client.force_authenticate(user=user)
+        runs = []
+        seeded = 0
+        for scale in scales:
+            rows = seed(scale - seeded)
+            seeded = scale
+            target = url(rows) if callable(url) else url
+            authenticated_client.get(target, params)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = authenticated_client.get(target, params)
+            assert response.status_code == 200, response.content[:500]
+            runs.append((scale, queries.captured_queries))
+
+        counts = {scale: len(queries) for scale, queries in runs}
+        largest, queries = runs[-1]
+        if len(set(counts.values())) > 1:
+            pytest.fail(
+                f"Query count grows with the data for {target}: {counts}\n"
+                f"Queries at {largest} rows:\n{_format_queries(queries)}"
+            )
+        if len(queries) > budget:
+            pytest.fail(
+                f"{target} runs {len(queries)} queries, budget is {budget}\n{_format_queries(queries)}"
+            )
+        return len(queries)
+
+    return check
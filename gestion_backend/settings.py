@@ -4,6 +4,7 @@ Production-ready configuration using environment variables.
 """
 
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 import environ
@@ -68,6 +69,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.core.middleware.RequestMetricsMiddleware',  # Removes itself unless REQUEST_METRICS_ENABLED
 ]
 
 
@@ -221,6 +223,33 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 os.makedirs(STATIC_ROOT, exist_ok=True)
 os.makedirs(MEDIA_ROOT, exist_ok=True)
 
+# Cache shared by every worker: Redis when REDIS_URL is set, files otherwise
+REDIS_URL = env('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'gestion',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': env('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'gestion_cache')),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Rendered product QR codes, shared on disk by every worker
+QR_LABEL_CACHE_DIR = env('QR_LABEL_CACHE_DIR', default=os.path.join(MEDIA_ROOT, 'qr_labels'))
+QR_LABEL_WORKERS = env.int('QR_LABEL_WORKERS', default=min(4, os.cpu_count() or 1))
+
+# Per-request SQL/cache/view timings (Server-Timing header + 'apps.core.requests' log)
+REQUEST_METRICS_ENABLED = env.bool('REQUEST_METRICS_ENABLED', default=False)
+REQUEST_METRICS_SAMPLE_RATE = env.float('REQUEST_METRICS_SAMPLE_RATE', default=1.0)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -305,5 +334,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'apps.core.requests': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file